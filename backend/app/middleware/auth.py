@@ -1,25 +1,161 @@
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.services.supabase_client import supabase
+from app.services.repository import repository
+from app.services.metrics import auth_duration, timed
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import os
+import threading
+import time
+import jwt
+from dotenv import load_dotenv
+
+load_dotenv()
 
 security = HTTPBearer()
 
-async def verify_token(credentials: HTTPAuthorizationCredentials):
-    """Verify Supabase JWT token"""
+# --- Local JWT verification settings ---
+# HS256 projects sign tokens with the project JWT secret; projects on asymmetric
+# signing keys publish them on the JWKS endpoint instead.
+JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+JWKS_URL = os.environ.get("SUPABASE_JWKS_URL") or (
+    f"{os.environ['SUPABASE_URL'].rstrip('/')}/auth/v1/.well-known/jwks.json"
+    if os.environ.get("SUPABASE_URL") else None
+)
+JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+# "local" verifies signature/expiry in-process, "remote" asks Supabase every time
+AUTH_MODE = os.environ.get("AUTH_MODE") or ("local" if JWT_SECRET else "remote")
+
+TOKEN_CACHE_TTL = float(os.environ.get("AUTH_TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+
+class AuthUser:
+    """Minimal user object built from verified JWT claims (mirrors the fields routers use)"""
+
+    def __init__(self, claims: dict):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+class TokenCache:
+    """Bounded TTL cache of verified users keyed by token hash"""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key: str, user, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            # Never serve a user past the token's own expiry
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+_jwks_client = None
+
+
+def _get_signing_key(token: str):
+    """Resolve the key for a token: the shared secret, or the matching JWKS key"""
+    global _jwks_client
+    if JWT_SECRET:
+        return JWT_SECRET, ["HS256"]
+    if not JWKS_URL:
+        raise jwt.InvalidTokenError("No JWT secret or JWKS URL configured")
+    if _jwks_client is None:
+        # PyJWKClient caches the fetched key set, so this is one fetch per key rotation
+        _jwks_client = jwt.PyJWKClient(JWKS_URL, cache_keys=True)
+    signing_key = _jwks_client.get_signing_key_from_jwt(token)
+    return signing_key.key, ["RS256", "ES256"]
+
+
+def _verify_locally(token: str) -> AuthUser:
+    key, algorithms = _get_signing_key(token)
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+    user = AuthUser(claims)
+    token_cache.set(TokenCache.key(token), user, token_exp=claims["exp"])
+    return user
+
+
+async def _verify_remotely(token: str):
+    # Verify the token with Supabase
+    user = await repository.get_user(token)
+    if user and user.user:
+        return user.user
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+    )
+
+
+async def verify_token(credentials: HTTPAuthorizationCredentials, require_remote: bool = False):
+    """Verify Supabase JWT token
+
+    Tokens are checked locally (signature + expiry) when AUTH_MODE is "local".
+    Pass require_remote=True on revocation-sensitive routes to always ask Supabase,
+    which also catches sessions that were signed out before the token expired.
+    """
     token = credentials.credentials
-    
-    try:
-        # Verify the token with Supabase
-        user = supabase.auth.get_user(token)
-        if user and user.user:
-            return user.user
-        else:
+    mode = "local" if AUTH_MODE == "local" and not require_remote else "remote"
+
+    with timed("auth", auth_duration, mode=mode):
+        try:
+            if mode == "local":
+                cached = token_cache.get(TokenCache.key(token))
+                if cached is not None:
+                    return cached
+                try:
+                    if JWT_SECRET:
+                        return _verify_locally(token)
+                    # JWKS mode may need to (re)fetch the key set over the network
+                    return await repository.run(_verify_locally, token)
+                except jwt.PyJWKClientError as e:
+                    # JWKS endpoint unreachable: degrade to the remote check instead of locking users out
+                    print(f"JWKS lookup failed, falling back to remote auth: {e}")
+
+            return await _verify_remotely(token)
+        except HTTPException:
+            raise
+        except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
+                detail=f"Invalid authentication credentials: {str(e)}",
             )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid authentication credentials: {str(e)}",
-        )
@@ -0,0 +1,60 @@
+from app.services.metrics import (
+    begin_request_timing, http_errors, http_request_duration, http_requests, http_requests_in_flight,
+    request_stage_duration
+)
+import time
+
+# Unmatched paths share one label so scanners can't blow up the series count
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Request counts, latency, in-flight gauge, error counters and a Server-Timing header
+
+    Server-Timing lists the stages (auth, db, llm, markdown, render) recorded up
+    to the moment the response started, plus the total. The route is only known
+    once routing has happened, so the in-flight gauge is per method.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = begin_request_timing()
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        http_requests_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            http_errors.inc(route=_route(scope), type=type(e).__name__)
+            raise
+        finally:
+            route = _route(scope)
+            http_requests_in_flight.dec(method=method)
+            elapsed = time.perf_counter() - timing.started
+            http_requests.inc(method=method, route=route, status=status_code)
+            http_request_duration.observe(elapsed, method=method, route=route)
+            for stage, (seconds, _) in timing.stages.items():
+                request_stage_duration.observe(seconds, route=route, stage=stage)
+            if status_code >= 400:
+                http_errors.inc(route=route, type=f"http_{status_code}")
@@ -0,0 +1,69 @@
+from app.services.repository import begin_request_scope
+
+
+class QueryStats:
+    """Database round trips per endpoint, so a query-count regression shows up in /health and tests"""
+
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, endpoint: str, queries: int):
+        entry = self._endpoints.setdefault(endpoint, {"requests": 0, "queries": 0, "max": 0, "last": 0})
+        entry["requests"] += 1
+        entry["queries"] += queries
+        entry["max"] = max(entry["max"], queries)
+        entry["last"] = queries
+
+    def stats(self) -> dict:
+        return {
+            endpoint: {
+                "requests": entry["requests"],
+                "avg_queries": round(entry["queries"] / entry["requests"], 2),
+                "max_queries": entry["max"],
+                "last_queries": entry["last"],
+            }
+            for endpoint, entry in self._endpoints.items()
+        }
+
+    def clear(self):
+        self._endpoints.clear()
+
+
+def _endpoint(scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else scope['path']}"
+
+
+class RequestScopeMiddleware:
+    """Give each HTTP request its own repository scope (project cache + query counter)
+
+    Adds an X-DB-Queries response header with the round trips made before the
+    response started, and records the final count (including any made while a
+    streaming body was being sent) per endpoint.
+    """
+
+    def __init__(self, app, stats: QueryStats = None):
+        self.app = app
+        self.stats = stats if stats is not None else query_stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_scope = begin_request_scope()
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(request_scope.queries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            self.stats.record(_endpoint(scope), request_scope.queries)
+
+# Global instance
+query_stats = QueryStats()
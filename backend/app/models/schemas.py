@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List, Tuple
 from datetime import datetime
 
 # Project Schemas
@@ -36,6 +36,9 @@ class SectionCreate(BaseModel):
 class SectionUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
+    # Autosave: edits as [start, end, replacement] on the text of base_version
+    delta: Optional[List[Tuple[int, int, str]]] = None
+    base_version: Optional[int] = None
 
 class SectionResponse(BaseModel):
     id: str
@@ -44,24 +47,76 @@ class SectionResponse(BaseModel):
     content: Optional[str]
     order_index: int
     created_at: datetime
+    version: int = 0
     comments: List[CommentResponse] = []
 
+class SectionVersionSummary(BaseModel):
+    version: int
+    kind: str  # 'snapshot' or 'diff'
+    prompt: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class SectionVersion(SectionVersionSummary):
+    content: str
+
+class SectionBulkCreate(BaseModel):
+    sections: List[SectionCreate] = Field(..., min_length=1, max_length=500)
+
+class SectionReorder(BaseModel):
+    section_ids: List[str] = Field(..., min_length=1, max_length=500)  # new order; unlisted sections follow
+
+class ProjectFromOutline(BaseModel):
+    title: str
+    type: str  # 'docx' or 'pptx'
+    topic: Optional[str] = None  # defaults to the title
+    num_sections: Optional[int] = Field(5, ge=1, le=50)
+    outline: Optional[List[str]] = Field(None, max_length=500)  # section titles to use instead of asking the LLM
+    bypass_cache: bool = False
+
+class ProjectWithSectionsResponse(ProjectResponse):
+    sections: List[SectionResponse] = []
+
 # AI Generation Schemas
 class GenerateContentRequest(BaseModel):
     section_id: str
     prompt: Optional[str] = None
+    bypass_cache: bool = False  # force a fresh generation ("regenerate")
 
 class RefineContentRequest(BaseModel):
     section_id: str
     refinement_prompt: str
+    bypass_cache: bool = False
+    # Rewrite only part of the section: a [start, end) character range of its content,
+    # or paragraph (non-blank line) indices; base_version pins the text they refer to
+    span: Optional[Tuple[int, int]] = None
+    paragraphs: Optional[List[int]] = Field(None, min_length=1)
+    base_version: Optional[int] = None
 
 class GenerateOutlineRequest(BaseModel):
     topic: str
     type: str  # 'docx' or 'pptx'
-    num_sections: Optional[int] = 5
+    num_sections: Optional[int] = Field(5, ge=1, le=50)
+    bypass_cache: bool = False
 
 class GenerateOutlineResponse(BaseModel):
     sections: List[str]
 
+class BatchGenerateRequest(BaseModel):
+    only_empty: bool = False  # skip sections that already have content
+    bypass_cache: bool = False
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str  # 'pending', 'running', 'completed', 'failed'
+    total: int
+    completed: int
+    failed: int
+    errors: Dict[str, str] = {}
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
 class FeedbackCreate(BaseModel):
     is_positive: bool
\ No newline at end of file
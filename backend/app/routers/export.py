@@ -1,9 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from fastapi.security import HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from app.middleware.auth import security, verify_token
-from app.services.supabase_client import supabase
-from app.services.doc_gen_service import doc_gen_service
+from app.services.repository import repository
+from app.services.render_pool import EXPORT_DOCX_STREAMING, render_pool
+from app.services.export_cache import export_cache, content_hash, version_hash, etag_matches
+from app.services.artifact_store import artifact_store
+from app.services.template_store import template_store
+from app.services.docx_stream import StreamingDocxWriter
+from app.services.job_service import job_manager, Job
+from app.models.schemas import JobResponse
+from typing import Optional
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+
+# Sections fetched and rendered per step of a streamed export
+EXPORT_STREAM_PAGE_SIZE = int(os.environ.get("EXPORT_STREAM_PAGE_SIZE", "50"))
+# Streamed documents up to this size are also kept in the export cache
+EXPORT_STREAM_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_STREAM_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Section versions (no content) identify a streamed export; pages then load the text
+SECTION_VERSION_COLUMNS = "id, title, order_index, version"
+SECTION_RENDER_COLUMNS = "id, title, content, order_index, version"
 
 router = APIRouter(
     prefix="/export",
@@ -11,45 +37,185 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _export_headers(project: dict, ext: str, etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename={project['title']}.{ext}"
+    }
+
+async def _docx_chunks(project: dict, user_id: str):
+    """The .docx bytes as they are written, one page of sections at a time
+
+    Pages are turned into XML in the render pool, under its queue cap and
+    timeout; only the compression runs here, on a thread (zlib releases the GIL).
+    """
+    writer = StreamingDocxWriter(project["title"])
+    yield await asyncio.to_thread(writer.start)
+    async for page in repository.iter_owned_sections(
+        project["id"], user_id, columns=SECTION_RENDER_COLUMNS, page_size=EXPORT_STREAM_PAGE_SIZE
+    ):
+        xml = await render_pool.render_docx_page(project["title"], page)
+        chunk = await asyncio.to_thread(writer.add_xml, xml)
+        if chunk:
+            yield chunk
+    yield writer.finish()
+
+async def _stream_docx(project: dict, user_id: str, digest: str):
+    """Send the document while it is generated, caching it if it stays small
+
+    Memory stays at about one page of sections however long the document is.
+    Headers are already sent, so a failure part-way can only abort the download.
+    """
+    kept, size = [], 0
+    async for chunk in _docx_chunks(project, user_id):
+        if kept is not None:
+            kept.append(chunk)
+            size += len(chunk)
+            if size > EXPORT_STREAM_CACHE_MAX_BYTES:
+                kept = None
+        yield chunk
+    if kept is not None:
+        export_cache.set(project["id"], digest, b"".join(kept))
+
+def _docx_response(project: dict, versions: list, user_id: str, if_none_match: Optional[str]) -> Response:
+    digest = version_hash(project, versions)  # .docx files don't use the project's .pptx template
+    etag = f'"{digest}"'
+    headers = _export_headers(project, "docx", etag)
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = export_cache.get(digest)
+    if data is not None:
+        return Response(content=data, media_type=MEDIA_TYPES["docx"], headers=headers)
+    render_pool.check_capacity()
+    return StreamingResponse(_stream_docx(project, user_id, digest), media_type=MEDIA_TYPES["docx"], headers=headers)
+
 @router.get("/{project_id}")
 async def export_project(
     project_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Export a project as .docx or .pptx file"""
+    """Export a project as .docx or .pptx file
+
+    Responses carry an ETag derived from the section versions; a matching
+    If-None-Match returns 304, and unchanged projects are served from the
+    render cache instead of being rebuilt, in one round trip either way. Word
+    documents are streamed as they are written (see EXPORT_DOCX_STREAMING).
+    """
     user = await verify_token(credentials)
     
     try:
-        # Get project
-        project_response = supabase.table("projects").select("*").eq("id", project_id).eq("user_id", user.id).execute()
-        
-        if not project_response.data:
+        # Versions only: enough to tag the file, so unchanged projects never load their text
+        versions = await repository.list_owned_sections(project_id, user.id, columns=SECTION_VERSION_COLUMNS)
+        if versions is None:
             raise HTTPException(status_code=404, detail="Project not found")
+        project = await repository.get_project(project_id, user.id)  # loaded by the query above
+        if project["type"] == "docx" and EXPORT_DOCX_STREAMING:
+            return _docx_response(project, versions, user.id, if_none_match)
         
-        project = project_response.data[0]
+        ext = "docx" if project["type"] == "docx" else "pptx"
+        media_type = MEDIA_TYPES[ext]
         
-        # Get sections
-        sections_response = supabase.table("sections").select("*").eq("project_id", project_id).order("order_index").execute()
-        sections = sections_response.data
+        template_version = template_store.version(project_id)
+        digest = version_hash(project, versions, template_version)
+        etag = f'"{digest}"'
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_export_headers(project, ext, etag))
         
-        # Generate document based on type
-        if project["type"] == "docx":
-            file_stream = doc_gen_service.create_docx(project["title"], sections)
-            media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            filename = f"{project['title']}.docx"
-        else:  # pptx
-            file_stream = doc_gen_service.create_pptx(project["title"], sections)
-            media_type = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-            filename = f"{project['title']}.pptx"
+        data = export_cache.get(digest)
+        if data is None:
+            sections = await repository.list_owned_sections(project_id, user.id, columns=SECTION_RENDER_COLUMNS)
+            if sections is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            # Tag what is actually rendered, in case a section changed since the first query
+            digest = version_hash(project, sections, template_version)
+            etag = f'"{digest}"'
+            # Generate document based on type (in the render process pool)
+            template = template_store.local_path(project_id)
+            data = await render_pool.render(project["type"], project["title"], sections, template)
+            export_cache.set(project_id, digest, data)
         
-        return StreamingResponse(
-            file_stream,
-            media_type=media_type,
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return Response(content=data, media_type=media_type, headers=_export_headers(project, ext, etag))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+async def _render_artifact(job: Job, project: dict, sections: list, key: str, ext: str,
+                           template: Optional[str]) -> dict:
+    """Render into the artifact store; the worker process writes the file directly"""
+    if not artifact_store.exists(key):
+        upload_path = artifact_store.new_upload_path(key)
+        try:
+            await render_pool.render_to_file(project["type"], project["title"], sections, upload_path, template)
+            artifact_store.commit(upload_path, key)
+        except BaseException:
+            artifact_store.discard(upload_path)
+            raise
+    job.completed = 1
+    return {
+        "artifact": key,
+        "filename": f"{project['title']}.{ext}",
+        "media_type": MEDIA_TYPES[ext],
+        "etag": f'"{key.rsplit(".", 1)[0]}"'
+    }
+
+@router.post("/{project_id}/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    project_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Render a project in the background; poll GET /export/jobs/{job_id} for the file"""
+    user = await verify_token(credentials)
+
+    try:
+        project = await repository.get_project_with_sections(project_id, user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    sections = project.pop("sections") or []
+    ext = "docx" if project["type"] == "docx" else "pptx"
+    # Content-addressed, so an unchanged project reuses its existing file
+    key = f"{content_hash(project, sections, template_store.version(project_id))}.{ext}"
+    template = template_store.local_path(project_id)
+
+    artifact_store.prune()
+    job = job_manager.create("export", user.id, total=1)
+    job_manager.start(job, lambda job: _render_artifact(job, project, sections, key, ext, template))
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Job status while rendering; the file itself (with Range support) once completed"""
+    user = await verify_token(credentials)
+
+    job = job_manager.get(job_id, user.id)
+    if not job or job.kind != "export":
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status != "completed":
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED if job.status in ("pending", "running") else status.HTTP_200_OK,
+            content=JobResponse(**job.to_dict()).model_dump(mode="json")
+        )
+
+    result = job.result
+    if not artifact_store.exists(result["artifact"]):
+        raise HTTPException(status_code=410, detail="Export file has expired, please start a new export")
+
+    # FileResponse streams from disk (sendfile where the server supports it) and honours Range
+    return FileResponse(
+        artifact_store.local_path(result["artifact"]),
+        media_type=result["media_type"],
+        filename=result["filename"],
+        headers={"ETag": result["etag"]}
+    )
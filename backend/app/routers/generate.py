@@ -1,9 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from app.middleware.auth import security, verify_token
-from app.services.supabase_client import supabase
-from app.services.llm_service import llm_service
-from app.models.schemas import GenerateContentRequest, RefineContentRequest, GenerateOutlineRequest, GenerateOutlineResponse, SectionResponse
+from app.services.repository import repository
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.llm_limiter import BACKGROUND, llm_lane
+from app.services.job_service import job_manager, Job
+from app.services.export_cache import export_cache
+from app.services.rate_limit import rate_limited_user
+from app.services.section_spans import Span, SpanError, resolve_span, splice
+from app.services.project_context import project_digest
+from app.models.schemas import GenerateContentRequest, RefineContentRequest, GenerateOutlineRequest, GenerateOutlineResponse, SectionResponse, BatchGenerateRequest, JobResponse
+from typing import Optional
+import anyio
+import asyncio
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Model calls one project job makes at once (also capped by LLM_MAX_PER_USER_BACKGROUND)
+BATCH_GENERATION_PARALLELISM = int(os.environ.get("BATCH_GENERATION_PARALLELISM", "4"))
 
 router = APIRouter(
     prefix="/generate",
@@ -11,22 +29,109 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+async def _get_owned_section(section_id: str, user) -> dict:
+    """Load a section with its project; ownership is part of the query, so other users' sections are 404"""
+    section = await repository.get_owned_section(section_id, user.id)
+
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+
+    return section
+
+def _refine_span(section: dict, request: RefineContentRequest) -> Optional[Span]:
+    """The part of the section a refine request targets, or None for the whole section"""
+    if request.span is None and request.paragraphs is None:
+        return None
+    version = section.get("version") or 0
+    if request.base_version is not None and request.base_version != version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Section has changed since version {request.base_version} (now at version {version})"
+        )
+    try:
+        return resolve_span(section.get("content") or "", request.span, request.paragraphs)
+    except SpanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _save_refined(section: dict, refined: str, prompt: str, span: Optional[Span]) -> Optional[dict]:
+    """Save a refinement: the whole text (rebased onto newer versions), or the span spliced
+    back as a one-edit delta that only applies to the version the span was read from
+    (None when the section changed meanwhile)"""
+    if span is None:
+        return await repository.save_section_content(section, refined, prompt, rebase=True)
+    content, delta = splice(section["content"], span, refined)
+    return await repository.save_section_content(section, content, prompt, delta=delta)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_and_save(http_request: Request, stream, section: dict, history_prompt: str,
+                           span: Optional[Span] = None) -> StreamingResponse:
+    """Relay an LLM stream as Server-Sent Events and persist the final text when it completes
+
+    Events: `chunk` ({"text": ...}) per cleaned increment, then `done` with the saved
+    section, or `error`. If the client disconnects the upstream call is cancelled and
+    nothing is saved. With a span the chunks are the rewrite of that span only.
+    """
+    try:
+        # Prime the stream so capacity/setup errors become normal HTTP errors
+        await stream.__anext__()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        parts = []
+        try:
+            async for piece in stream:
+                if await http_request.is_disconnected():
+                    return
+                parts.append(piece)
+                yield _sse("chunk", {"text": piece})
+
+            saved = await _save_refined(section, "".join(parts), history_prompt, span)
+            if saved is None:
+                yield _sse("error", {"detail": "Section was changed while it was being refined"})
+                return
+            export_cache.invalidate(section["project_id"])
+            yield _sse("done", saved)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Shielded so the upstream call is still cancelled when this task is being cancelled
+            with anyio.CancelScope(shield=True):
+                await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+            **getattr(http_request.state, "rate_limit_headers", {})
+        }
+    )
+
 @router.post("/outline", response_model=GenerateOutlineResponse)
 async def generate_outline(
     request: GenerateOutlineRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
 ):
     """Generate an AI-suggested outline/structure"""
-    user = await verify_token(credentials)
-    
+
     try:
-        sections = await llm_service.generate_outline(
+        sections = await llm.generate_outline(
             topic=request.topic,
             document_type=request.type,
-            num_sections=request.num_sections or 5
+            num_sections=request.num_sections or 5,
+            user_id=user.id,
+            bypass_cache=request.bypass_cache
         )
-        
+
         return {"sections": sections}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -34,98 +139,256 @@ async def generate_outline(
 async def generate_section_content(
     section_id: str,
     request: GenerateContentRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
 ):
     """Generate content for a specific section"""
-    user = await verify_token(credentials)
-    
+
     try:
-        # Get the section
-        section_response = supabase.table("sections").select("*, projects(*)").eq("id", section_id).execute()
-        
-        if not section_response.data:
-            raise HTTPException(status_code=404, detail="Section not found")
-        
-        section = section_response.data[0]
+        section = await _get_owned_section(section_id, user)
         project = section["projects"]
-        
-        # Verify ownership
-        if project["user_id"] != user.id:
-            raise HTTPException(status_code=403, detail="Not authorized")
-        
+        project_context = await project_digest(project)
+
         # Generate content
-        content = await llm_service.generate_section_content(
+        # Concurrent requests for slides of the same deck share one Gemini call
+        content = await llm.batch_section_content(
+            project_id=section["project_id"],
             section_title=section["title"],
             document_topic=project["title"],
-            document_type=project["type"]
+            document_type=project["type"],
+            user_id=user.id,
+            bypass_cache=request.bypass_cache,
+            project_context=project_context
         )
-        
-        # Save generation history
-        supabase.table("section_history").insert({
-            "section_id": section_id,
-            "prompt": "Initial Generation", 
-            "content": content
-        }).execute()
-
-        # Update section with generated content
-        update_response = supabase.table("sections").update({
-            "content": content
-        }).eq("id", section_id).execute()
-        
-        return update_response.data[0]
+
+        # Update section with generated content and save generation history
+        updated = await repository.save_section_content(section, content, "Initial Generation", rebase=True)
+        export_cache.invalidate(section["project_id"])
+        return updated
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/section/{section_id}/stream")
+async def stream_section_content(
+    section_id: str,
+    request: GenerateContentRequest,
+    http_request: Request,
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Generate content for a section, streamed as Server-Sent Events"""
+
+    try:
+        section = await _get_owned_section(section_id, user)
+        project = section["projects"]
+        project_context = await project_digest(project)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    stream = llm.stream_section_content(
+        section_title=section["title"],
+        document_topic=project["title"],
+        document_type=project["type"],
+        user_id=user.id,
+        bypass_cache=request.bypass_cache,
+        project_context=project_context
+    )
+    return await _stream_and_save(http_request, stream, section, "Initial Generation")
+
 @router.post("/refine/{section_id}", response_model=SectionResponse)
 async def refine_section_content(
     section_id: str,
     request: RefineContentRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
 ):
-    """Refine existing section content based on user instruction"""
-    user = await verify_token(credentials)
-    
+    """Refine existing section content based on user instruction
+
+    With `span` ([start, end) characters) or `paragraphs` (indices of non-blank
+    lines) only that part is rewritten: the model sees it plus a little context,
+    and the result is spliced into the section. Pass `base_version` with the
+    version the offsets refer to; a section changed since then returns 409.
+    """
+
     try:
-        # Get the section
-        section_response = supabase.table("sections").select("*, projects(*)").eq("id", section_id).execute()
-        
-        if not section_response.data:
-            raise HTTPException(status_code=404, detail="Section not found")
-        
-        section = section_response.data[0]
-        project = section["projects"]
-        
-        # Verify ownership
-        if project["user_id"] != user.id:
-            raise HTTPException(status_code=403, detail="Not authorized")
-        
+        section = await _get_owned_section(section_id, user)
+
         current_content = section.get("content") or ""
-        
+
         if not current_content:
             raise HTTPException(status_code=400, detail="Section has no content to refine")
-        
-        # Refine content
-        refined_content = await llm_service.refine_content(
-            current_content=current_content,
-            refinement_instruction=request.refinement_prompt
-        )
-        
-        # Save refinement history
-        supabase.table("section_history").insert({
-            "section_id": section_id,
-            "prompt": request.refinement_prompt,
-            "content": refined_content
-        }).execute()
-
-        # Update section with refined content
-        update_response = supabase.table("sections").update({
-            "content": refined_content
-        }).eq("id", section_id).execute()
-        
-        return update_response.data[0]
+
+        span = _refine_span(section, request)
+        if span is None:
+            refined_content = await llm.refine_content(
+                current_content=current_content,
+                refinement_instruction=request.refinement_prompt,
+                user_id=user.id,
+                bypass_cache=request.bypass_cache
+            )
+        else:
+            refined_content = await llm.refine_span(
+                span.before, span.text, span.after,
+                refinement_instruction=request.refinement_prompt,
+                user_id=user.id,
+                bypass_cache=request.bypass_cache
+            )
+
+        # Update section with refined content and save refinement history
+        try:
+            updated = await _save_refined(section, refined_content, request.refinement_prompt, span)
+        except SpanError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        if not updated:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Section was changed while it was being refined")
+        export_cache.invalidate(section["project_id"])
+        return updated
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/refine/{section_id}/stream")
+async def stream_refine_section_content(
+    section_id: str,
+    request: RefineContentRequest,
+    http_request: Request,
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Refine section content, streamed as Server-Sent Events (accepts a span like the non-streaming route)"""
+
+    try:
+        section = await _get_owned_section(section_id, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    current_content = section.get("content") or ""
+
+    if not current_content:
+        raise HTTPException(status_code=400, detail="Section has no content to refine")
+
+    span = _refine_span(section, request)
+    if span is None:
+        stream = llm.stream_refine_content(
+            current_content=current_content,
+            refinement_instruction=request.refinement_prompt,
+            user_id=user.id,
+            bypass_cache=request.bypass_cache
+        )
+    else:
+        stream = llm.stream_refine_span(
+            span.before, span.text, span.after,
+            refinement_instruction=request.refinement_prompt,
+            user_id=user.id,
+            bypass_cache=request.bypass_cache
+        )
+    return await _stream_and_save(http_request, stream, section, request.refinement_prompt, span)
+
+async def _generate_project_sections(job: Job, llm: LLMService, project: dict, sections: list, user_id: str,
+                                     bypass_cache: bool = False, all_sections: Optional[list] = None) -> dict:
+    """Fan out Gemini calls for every section, then save each result as the section's next version
+
+    Each chunk's results are saved as soon as they arrive, every section on
+    its own, so a section that can't be saved only fails itself. Saves go through
+    the same version check as single-section generation: a section edited
+    while the job ran gets the generated text on top of the edit, which stays
+    in its history.
+
+    Sections of batchable document types go out llm.batch_size() per call, all
+    with the same project digest of `all_sections` (default: `sections`).
+    """
+    project_context = await project_digest(project, all_sections if all_sections is not None else sections)
+    parallelism = max(1, min(BATCH_GENERATION_PARALLELISM, llm.limiter.max_background_per_user))
+    semaphore = asyncio.Semaphore(parallelism)
+    saved = []
+
+    # Evenly sized runs of consecutive sections, e.g. 10 slides at 8 per call -> 5 + 5
+    chunk_count = -(-len(sections) // llm.batch_size(project["type"]))
+    chunk_size = -(-len(sections) // chunk_count) if chunk_count else 1
+    chunks = [sections[i:i + chunk_size] for i in range(0, len(sections), chunk_size)]
+
+    async def generate_chunk(chunk: list):
+        async with semaphore:
+            try:
+                results = await llm.generate_sections_batch(
+                    [section["title"] for section in chunk],
+                    document_topic=project["title"],
+                    document_type=project["type"],
+                    user_id=user_id,
+                    bypass_cache=bypass_cache,
+                    project_context=project_context
+                )
+            except Exception as e:
+                results = [e] * len(chunk)
+        await asyncio.gather(*(save(section, result) for section, result in zip(chunk, results)))
+
+    async def save(section: dict, result):
+        if not isinstance(result, Exception):
+            try:
+                if await repository.save_section_content(section, result, "Initial Generation", rebase=True):
+                    saved.append(section["id"])
+                    job.completed += 1
+                    return
+                result = Exception("Section was deleted")
+            except Exception as e:
+                result = e
+        job.failed += 1
+        job.errors[section["id"]] = str(result)
+
+    # Behind interactive requests in the scheduler, and not tied to the request that started the job
+    with llm_lane(BACKGROUND, detached=True):
+        await asyncio.gather(*(generate_chunk(chunk) for chunk in chunks))
+    if saved:
+        export_cache.invalidate(project["id"])
+
+    order = {section["id"]: index for index, section in enumerate(sections)}
+    return {"generated": sorted(saved, key=order.get), "failed": list(job.errors)}
+
+@router.post("/project/{project_id}", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def generate_project_content(
+    project_id: str,
+    request: BatchGenerateRequest = BatchGenerateRequest(),
+    user=Depends(rate_limited_user),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Start a background job that generates content for every section of a project"""
+
+    try:
+        project = await repository.get_project_with_sections(project_id, user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    all_sections = project.pop("sections") or []
+    sections = all_sections
+    if request.only_empty:
+        sections = [section for section in sections if not section.get("content")]
+
+    job = job_manager.create("generate_project", user.id, total=len(sections))
+    job_manager.start(job, lambda job: _generate_project_sections(
+        job, llm, project, sections, user.id, request.bypass_cache, all_sections
+    ))
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_generation_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Poll the progress of a generation job"""
+    user = await verify_token(credentials)
+
+    job = job_manager.get(job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job.to_dict()
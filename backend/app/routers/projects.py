@@ -1,11 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials
 from app.middleware.auth import security, verify_token
-from app.services.supabase_client import supabase
+from app.services.repository import repository
+from app.services.export_cache import export_cache
+from app.services.template_store import PPTX_TEMPLATE_MAX_BYTES, template_store
+from app.services.pptx_template import TemplateError, validate_template
+from app.services.pagination import (
+    LIST_MAX_LIMIT, PROJECT_FIELDS, SECTION_FIELDS, SECTION_SUMMARY_FIELDS,
+    parse_fields, decode_cursor, paginate, project_rows, listing_response
+)
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.rate_limit import admit_model_request
 from app.models.schemas import ProjectCreate, ProjectResponse, SectionCreate, SectionResponse
-from typing import List
+from app.models.schemas import SectionBulkCreate, SectionReorder, ProjectFromOutline, ProjectWithSectionsResponse
+from app.models.schemas import SectionUpdate, SectionVersion, SectionVersionSummary
+from app.services.section_history import DeltaError, apply_delta
+from typing import List, Optional
+import asyncio
 from app.models.schemas import CommentCreate, FeedbackCreate
 
+# Keyset columns for paging, in listing order
+PROJECT_CURSOR = ("created_at", "id")
+SECTION_CURSOR = ("order_index", "id")
+
 router = APIRouter(
     prefix="/projects",
     tags=["projects"],
@@ -13,15 +30,36 @@ router = APIRouter(
 )
 
 @router.get("", response_model=List[ProjectResponse])
-async def get_projects(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get all projects for authenticated user"""
+async def get_projects(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get projects for authenticated user, newest first
+
+    With `limit`, results are paged by (created_at, id): pass the X-Next-Cursor
+    response header back as `cursor` for the next page. `fields=id,title,status`
+    returns only those columns. Responses carry a weak ETag; a matching
+    If-None-Match returns 304.
+    """
     user = await verify_token(credentials)
+    selected = parse_fields(fields, PROJECT_FIELDS)
+    after = decode_cursor(cursor, PROJECT_CURSOR)
+    
+    # Explicit columns: the listing bypasses response_model, and rows carry internal ones (context_digest)
+    columns = ",".join(PROJECT_FIELDS)
+    if selected is not None:
+        columns = ",".join(dict.fromkeys(selected + list(PROJECT_CURSOR)))
     
     try:
-        response = supabase.table("projects").select("*").eq("user_id", user.id).execute()
-        return response.data
+        rows = await repository.list_projects(user.id, columns, limit + 1 if limit else None, after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    page, next_cursor = paginate(rows, limit, PROJECT_CURSOR)
+    return listing_response(project_rows(page, selected), if_none_match, next_cursor)
 
 @router.post("", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
 async def create_project(
@@ -32,14 +70,43 @@ async def create_project(
     user = await verify_token(credentials)
     
     try:
-        response = supabase.table("projects").insert({
-            "user_id": user.id,
-            "title": project.title,
-            "type": project.type,
-            "status": "draft"
-        }).execute()
+        return await repository.create_project(user.id, project.title, project.type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/from-outline", response_model=ProjectWithSectionsResponse, status_code=status.HTTP_201_CREATED)
+async def create_project_from_outline(
+    request: ProjectFromOutline,
+    http_request: Request,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Create a project and its sections in one call
+
+    Section titles come from `outline` if given, otherwise from the outline
+    generator, which counts against the /generate rate limits and token budget.
+    The LLM runs before anything is written and the project and its sections
+    are written together, so a failure leaves no empty project behind.
+    """
+    user = await verify_token(credentials)
+    if not request.outline:
+        await admit_model_request(http_request, response, user)
+    
+    try:
+        titles = request.outline
+        if not titles:
+            titles = await llm.generate_outline(
+                topic=request.topic or request.title,
+                document_type=request.type,
+                num_sections=request.num_sections or 5,
+                user_id=user.id,
+                bypass_cache=request.bypass_cache
+            )
         
-        return response.data[0]
+        return await repository.create_project_with_sections(user.id, request.title, request.type, titles)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -52,12 +119,12 @@ async def get_project(
     user = await verify_token(credentials)
     
     try:
-        response = supabase.table("projects").select("*").eq("id", project_id).eq("user_id", user.id).execute()
+        project = await repository.get_project(project_id, user.id)
         
-        if not response.data:
+        if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        return response.data[0]
+        return project
     except HTTPException:
         raise
     except Exception as e:
@@ -69,39 +136,112 @@ async def delete_project(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Delete a project"""
-    user = await verify_token(credentials)
+    user = await verify_token(credentials, require_remote=True)
     
     try:
-        response = supabase.table("projects").delete().eq("id", project_id).eq("user_id", user.id).execute()
+        deleted = await repository.delete_project(project_id, user.id)
         
-        if not response.data:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Project not found")
         
+        export_cache.invalidate(project_id)
+        template_store.delete(project_id)
         return None
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.put("/{project_id}/template", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_project_template(
+    project_id: str,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Use a .pptx (sent as the raw request body) as this presentation's slide template
+
+    Its first layout is used for the title slide and its second (title and
+    content) for every section; sample slides in the file are ignored.
+    """
+    user = await verify_token(credentials)
+
+    project = await repository.get_project(project_id, user.id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project["type"] != "pptx":
+        raise HTTPException(status_code=400, detail="Templates can only be set on presentations")
+
+    data = bytearray()
+    async for chunk in request.stream():
+        data.extend(chunk)
+        if len(data) > PPTX_TEMPLATE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Template file is too large")
+    try:
+        # Parsing a deck is CPU work; keep it off the event loop
+        await asyncio.to_thread(validate_template, bytes(data))
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await asyncio.to_thread(template_store.save, project_id, bytes(data))
+    export_cache.invalidate(project_id)
+    return None
+
+@router.delete("/{project_id}/template", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_project_template(
+    project_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Go back to the default slide template"""
+    user = await verify_token(credentials)
+
+    project = await repository.get_project(project_id, user.id)
+    if not project or not template_store.delete(project_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    export_cache.invalidate(project_id)
+    return None
+
 # Section endpoints for a project
 @router.get("/{project_id}/sections", response_model=List[SectionResponse])
 async def get_sections(
     project_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    summary: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Get all sections for a project"""
+    """Get sections for a project in order
+
+    `summary=true` leaves out content bodies and comments; `fields=` picks
+    columns explicitly. Paging (`limit`/`cursor`) and ETags work as for
+    GET /projects, keyed by (order_index, id).
+    """
     user = await verify_token(credentials)
+    selected = parse_fields(fields, SECTION_FIELDS)
+    if selected is None and summary:
+        selected = list(SECTION_SUMMARY_FIELDS)
+    after = decode_cursor(cursor, SECTION_CURSOR)
     
-    # Verify project ownership
-    project = supabase.table("projects").select("*").eq("id", project_id).eq("user_id", user.id).execute()
-    if not project.data:
-        raise HTTPException(status_code=404, detail="Project not found")
+    columns, with_comments = "*", True
+    if selected is not None:
+        with_comments = "comments" in selected
+        columns = ",".join(dict.fromkeys([f for f in selected if f != "comments"] + list(SECTION_CURSOR)))
     
     try:
-        response = supabase.table("sections").select("*, comments(*)").eq("project_id", project_id).order("order_index").execute()
-        return response.data
+        # Ownership check and read in one query
+        sections = await repository.list_owned_sections(
+            project_id, user.id, with_comments=with_comments,
+            columns=columns, limit=limit + 1 if limit else None, after=after
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if sections is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    page, next_cursor = paginate(sections, limit, SECTION_CURSOR)
+    return listing_response(project_rows(page, selected), if_none_match, next_cursor)
 
 @router.post("/{project_id}/sections", response_model=SectionResponse, status_code=status.HTTP_201_CREATED)
 async def create_section(
@@ -112,51 +252,201 @@ async def create_section(
     """Create a new section for a project"""
     user = await verify_token(credentials)
     
-    # Verify project ownership
-    project = supabase.table("projects").select("*").eq("id", project_id).eq("user_id", user.id).execute()
-    if not project.data:
+    try:
+        # Only inserts if the project is the user's
+        created = await repository.create_owned_section(
+            project_id, user.id, section.title, section.content, section.order_index
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not created:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    export_cache.invalidate(project_id)
+    return created
+
+async def _save_section_text(project_id: str, section_id: str, user, section_update: SectionUpdate) -> dict:
+    """Store new section text (full or as a delta) as the section's next version"""
+    section = await repository.get_owned_section(section_id, user.id)
+    if not section or section["project_id"] != project_id:
+        raise HTTPException(status_code=404, detail="Section not found")
+    
+    version = section.get("version") or 0
+    if section_update.base_version is not None and section_update.base_version != version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Section has changed since version {section_update.base_version} (now at version {version})"
+        )
+    
+    delta = None
+    if section_update.delta is not None:
+        if section_update.base_version is None:
+            raise HTTPException(status_code=400, detail="base_version is required with delta")
+        delta = [list(edit) for edit in section_update.delta]
+        try:
+            content = apply_delta(section.get("content") or "", delta)
+        except DeltaError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        content = section_update.content
+    
+    if content == section.get("content"):
+        if section_update.title:
+            return await repository.update_owned_section(section_id, project_id, user.id, {"title": section_update.title})
+        section.pop("projects", None)
+        return section
+    
+    # Without a base_version, full-text saves keep last-write-wins semantics
+    saved = await repository.save_section_content(
+        section, content, "Manual edit", delta=delta, title=section_update.title,
+        rebase=section_update.base_version is None
+    )
+    if not saved:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Section was changed by another save")
+    return saved
+
+@router.patch("/{project_id}/sections/{section_id}", response_model=SectionResponse)
+async def update_section(
+    project_id: str,
+    section_id: str,
+    section_update: SectionUpdate,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Update a section
+
+    Content changes create a new version. Editors can autosave with
+    `{"base_version": n, "delta": [[start, end, text], ...]}` instead of the
+    full text; a stale base_version returns 409.
+    """
+    user = await verify_token(credentials)
+    
     try:
-        response = supabase.table("sections").insert({
-            "project_id": project_id,
-            "title": section.title,
-            "content": section.content,
-            "order_index": section.order_index
-        }).execute()
+        if section_update.content is not None or section_update.delta is not None:
+            updated = await _save_section_text(project_id, section_id, user, section_update)
+        else:
+            update_data = {}
+            if section_update.title:
+                update_data["title"] = section_update.title
+            
+            # Scoped to the section's project and the project's owner
+            updated = await repository.update_owned_section(section_id, project_id, user.id, update_data)
         
-        return response.data[0]
+        if not updated:
+            raise HTTPException(status_code=404, detail="Section not found")
+        
+        export_cache.invalidate(project_id)
+        return updated
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.patch("/{project_id}/sections/{section_id}", response_model=SectionResponse)
-async def update_section(
+@router.get("/{project_id}/sections/{section_id}/history", response_model=List[SectionVersionSummary])
+async def get_section_history(
     project_id: str,
     section_id: str,
-    section_update: SectionCreate,
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
-    """Update a section"""
+    """List a section's stored versions, newest first"""
     user = await verify_token(credentials)
     
-    # Verify project ownership
-    project = supabase.table("projects").select("*").eq("id", project_id).eq("user_id", user.id).execute()
-    if not project.data:
-        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        versions = await repository.list_section_versions(section_id, project_id, user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if versions is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    return versions
+
+@router.get("/{project_id}/sections/{section_id}/history/{version}", response_model=SectionVersion)
+async def get_section_version(
+    project_id: str,
+    section_id: str,
+    version: int,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Rebuild the text of one version (from its nearest snapshot plus diffs)"""
+    user = await verify_token(credentials)
     
     try:
-        update_data = {}
-        if section_update.title:
-            update_data["title"] = section_update.title
-        if section_update.content is not None:
-            update_data["content"] = section_update.content
+        found = await repository.get_section_version(section_id, project_id, user.id, version)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if found is None:
+        raise HTTPException(status_code=404, detail="Version not found (it may have been compacted)")
+    return found
+
+@router.post("/{project_id}/sections:bulk", response_model=List[SectionResponse], status_code=status.HTTP_201_CREATED)
+async def create_sections_bulk(
+    project_id: str,
+    request: SectionBulkCreate,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Create many sections with one ownership check and one batched insert"""
+    user = await verify_token(credentials)
+    
+    try:
+        project = await repository.get_project(project_id, user.id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        created = await repository.create_sections(project_id, [section.model_dump() for section in request.sections])
+        export_cache.invalidate(project_id)
+        return created
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/{project_id}/sections:reorder", response_model=List[SectionResponse])
+async def reorder_sections(
+    project_id: str,
+    request: SectionReorder,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Set the section order in one batched upsert
+
+    `section_ids` lists sections in their new order; sections not listed keep
+    their relative order after them. Returns all sections in the new order.
+    """
+    user = await verify_token(credentials)
+    
+    try:
+        project = await repository.get_project_with_sections(project_id, user.id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
         
-        response = supabase.table("sections").update(update_data).eq("id", section_id).execute()
+        sections = {section["id"]: section for section in project["sections"] or []}
+        unknown = [section_id for section_id in request.section_ids if section_id not in sections]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Sections not in this project: {', '.join(unknown)}")
+        if len(set(request.section_ids)) != len(request.section_ids):
+            raise HTTPException(status_code=400, detail="Duplicate section ids")
         
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Section not found")
+        listed = set(request.section_ids)
+        ordered = request.section_ids + [section_id for section_id in sections if section_id not in listed]
+        changed = [
+            {
+                "id": section_id,
+                "project_id": project_id,
+                "title": sections[section_id]["title"],
+                "order_index": index
+            }
+            for index, section_id in enumerate(ordered)
+            if sections[section_id]["order_index"] != index
+        ]
+        
+        # Upsert only touches the columns sent, so content is left as is
+        await repository.upsert_sections(changed)
+        if changed:
+            export_cache.invalidate(project_id)
         
-        return response.data[0]
+        for index, section_id in enumerate(ordered):
+            sections[section_id]["order_index"] = index
+        return [sections[section_id] for section_id in ordered]
     except HTTPException:
         raise
     except Exception as e:
@@ -176,11 +466,7 @@ async def add_section_feedback(
         # This example assumes a 'section_feedback' table exists or you just log it.
         # If you don't have a table, you can skip the DB call for the demo or create one.
         # Here is a simple implementation creating a record:
-        response = supabase.table("section_feedback").insert({
-            "section_id": section_id,
-            "user_id": user.id,
-            "is_positive": feedback.is_positive
-        }).execute()
+        await repository.add_feedback(section_id, user.id, feedback.is_positive)
         return {"status": "success"}
     except Exception as e:
         # Fail gracefully if table doesn't exist during demo
@@ -196,12 +482,7 @@ async def add_section_comment(
     """Add a user note/comment"""
     user = await verify_token(credentials)
     try:
-        response = supabase.table("comments").insert({
-            "section_id": section_id,
-            "user_id": user.id,
-            "text": comment.text
-        }).execute()
-        return response.data[0]
+        return await repository.add_comment(section_id, user.id, comment.text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -211,14 +492,14 @@ async def delete_comment(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Delete a comment"""
-    user = await verify_token(credentials)
+    user = await verify_token(credentials, require_remote=True)
     
     try:
         # Delete the comment if it belongs to the user
-        response = supabase.table("comments").delete().eq("id", comment_id).eq("user_id", user.id).execute()
+        deleted = await repository.delete_comment(comment_id, user.id)
         
         # Check if anything was actually deleted (optional, but good for debugging)
-        if not response.data:
+        if not deleted:
              # If no data returned, either it didn't exist or it wasn't their comment
              pass
              
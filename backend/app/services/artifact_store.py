@@ -0,0 +1,93 @@
+from importlib import import_module
+import os
+import tempfile
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "local" or "package.module:ClassName" for a custom ArtifactStore subclass
+EXPORT_ARTIFACT_STORE = os.environ.get("EXPORT_ARTIFACT_STORE", "local")
+EXPORT_ARTIFACT_DIR = os.environ.get(
+    "EXPORT_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "nexwrit-exports")
+)
+# Rendered files older than this are deleted
+EXPORT_ARTIFACT_TTL = float(os.environ.get("EXPORT_ARTIFACT_TTL", "86400"))
+
+
+class ArtifactStore:
+    """Where pre-rendered export files live
+
+    Renders are written to a scratch path from new_upload_path() and published
+    with commit(), so readers never see a partial file. local_path() must return
+    a filesystem path that can be served with FileResponse.
+    """
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        raise NotImplementedError
+
+    def new_upload_path(self, key: str) -> str:
+        raise NotImplementedError
+
+    def commit(self, upload_path: str, key: str) -> str:
+        raise NotImplementedError
+
+    def discard(self, upload_path: str):
+        raise NotImplementedError
+
+    def prune(self):
+        """Drop expired artifacts (optional)"""
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Artifacts as files in one directory, named by key"""
+
+    def __init__(self, directory: str = EXPORT_ARTIFACT_DIR, ttl: float = EXPORT_ARTIFACT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def local_path(self, key: str) -> str:
+        # Keys are content hashes + extension; basename() keeps them inside the directory
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def new_upload_path(self, key: str) -> str:
+        return os.path.join(self.directory, f".{uuid.uuid4().hex}.{os.path.basename(key)}.part")
+
+    def commit(self, upload_path: str, key: str) -> str:
+        path = self.local_path(key)
+        os.replace(upload_path, path)
+        return path
+
+    def discard(self, upload_path: str):
+        try:
+            os.remove(upload_path)
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def get_artifact_store() -> ArtifactStore:
+    if EXPORT_ARTIFACT_STORE == "local":
+        return LocalArtifactStore()
+    module_name, _, class_name = EXPORT_ARTIFACT_STORE.partition(":")
+    return getattr(import_module(module_name), class_name)()
+
+# Global instance
+artifact_store = get_artifact_store()
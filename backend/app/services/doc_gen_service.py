@@ -4,34 +4,46 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from pptx import Presentation
 from pptx.util import Inches as PptxInches, Pt as PptxPt
 from io import BytesIO
-import re
+from app.services.markdown_parser import parse_markdown
+from app.services.docx_stream import PLACEHOLDER_STYLE, PLACEHOLDER_TEXT, block_style
 
 class DocGenService:
     def __init__(self):
         pass
 
-    def _clean_markdown(self, text: str) -> str:
-        """
-        Removes Markdown formatting for professional document output.
-        - Removes **bold** markers
-        - Removes ## Headings markers
-        - Cleans up bullet points for DOCX (PPTX handles them separately)
+    def _add_runs(self, paragraph, runs):
+        """Append parsed inline runs to a docx/pptx paragraph, keeping bold/italic"""
+        for run in runs:
+            r = paragraph.add_run()
+            r.text = run.text
+            if run.bold:
+                r.font.bold = True
+            if run.italic:
+                r.font.italic = True
+
+    def _paragraph_adder(self, doc):
+        """Return add(text, style) that applies styles by cached id
+
+        python-docx resolves a style name by scanning every style in the
+        template on each add_paragraph(style=...)/add_heading(), which dominated
+        render time for long documents; ids are looked up once per document.
         """
-        if not text:
-            return ""
-        
-        # Remove bold/italic markers (** or *)
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-        text = re.sub(r'\*(.*?)\*', r'\1', text)      # Italic
-        
-        # Remove Heading markers (### Title)
-        text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
-        
-        return text.strip()
+        style_ids = {}
 
-    def create_docx(self, project_title: str, sections: list) -> BytesIO:
-        """Create a Word document from project data"""
+        def add(text: str = "", style: str = None):
+            p = doc.add_paragraph(text)
+            if style:
+                if style not in style_ids:
+                    style_ids[style] = doc.styles[style].style_id
+                p._p.style = style_ids[style]
+            return p
+
+        return add
+
+    def create_docx(self, project_title: str, sections: list, output=None) -> BytesIO:
+        """Create a Word document from project data (written to `output` path/file if given)"""
         doc = Document()
+        add_paragraph = self._paragraph_adder(doc)
         
         # Add title
         title = doc.add_heading(project_title, 0)
@@ -40,29 +52,25 @@ class DocGenService:
         # Add sections
         for section in sections:
             # Add section heading (Level 1)
-            doc.add_heading(section["title"], 1)
+            add_paragraph(section["title"], "Heading 1")
             
             content = section.get("content")
             if content:
-                # Clean the content before adding
-                clean_content = self._clean_markdown(content)
-                
-                # Split by newlines to preserve paragraphs
-                paragraphs = clean_content.split('\n')
-                for p_text in paragraphs:
-                    if p_text.strip():
-                        # Check if it looks like a list item
-                        if p_text.strip().startswith(('-', '•', '*')):
-                            # Add as a list item style
-                            p = doc.add_paragraph(p_text.strip().lstrip('-•* '), style='List Bullet')
-                        else:
-                            # Regular paragraph
-                            doc.add_paragraph(p_text)
+                for block in parse_markdown(content):
+                    p = add_paragraph(style=block_style(block))
+                    if block.kind == "numbered":
+                        # Literal numbers so each section's list starts where the model numbered it
+                        p.add_run(f"{block.number}. ")
+                    self._add_runs(p, block.runs)
             else:
-                doc.add_paragraph("[No content generated yet]", style='Intense Quote')
+                add_paragraph(PLACEHOLDER_TEXT, PLACEHOLDER_STYLE)
             
             # Add spacing
-            doc.add_paragraph()
+            add_paragraph()
+        
+        if output is not None:
+            doc.save(output)
+            return output
         
         # Save to BytesIO
         file_stream = BytesIO()
@@ -71,13 +79,17 @@ class DocGenService:
         
         return file_stream
 
-    def create_pptx(self, project_title: str, sections: list) -> BytesIO:
-        """Create a PowerPoint presentation from project data"""
-        prs = Presentation()
+    def create_pptx(self, project_title: str, sections: list, output=None, template: str = None) -> BytesIO:
+        """Create a PowerPoint presentation from project data (written to `output` path/file if given)
+
+        `template` is a .pptx whose masters and page size are used instead of the default.
+        """
+        prs = Presentation(template)
         
-        # Set slide width and height (16:9)
-        prs.slide_width = PptxInches(10)
-        prs.slide_height = PptxInches(7.5)
+        if template is None:
+            # Set slide width and height (16:9)
+            prs.slide_width = PptxInches(10)
+            prs.slide_height = PptxInches(7.5)
         
         # Title slide
         title_slide_layout = prs.slide_layouts[0]
@@ -88,10 +100,9 @@ class DocGenService:
         title.text = project_title
         subtitle.text = "Generated by NexWrit"
         
-        # Add content slides
+        # Add content slides (title and content layout)
+        bullet_slide_layout = prs.slide_layouts[1]
         for section in sections:
-            # Use title and content layout
-            bullet_slide_layout = prs.slide_layouts[1]
             slide = prs.slides.add_slide(bullet_slide_layout)
             
             # Set title
@@ -104,25 +115,23 @@ class DocGenService:
             text_frame.clear()
             
             if section.get("content"):
-                # Clean markdown first
-                content = self._clean_markdown(section["content"])
-                
-                # Parse content into bullet points
-                lines = content.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line:
-                        # Remove existing bullet markers if present to avoid double bullets
-                        if line.startswith(('•', '-', '*')):
-                            line = line.lstrip('•-* ').strip()
-                        
-                        p = text_frame.add_paragraph()
-                        p.text = line
-                        p.level = 0
+                for block in parse_markdown(section["content"]):
+                    p = text_frame.add_paragraph()
+                    if block.kind == "numbered":
+                        p.add_run().text = f"{block.number}. "
+                    self._add_runs(p, block.runs)
+                    if block.kind == "heading":
+                        p.font.bold = True
+                    else:
+                        p.level = block.level
             else:
                 p = text_frame.add_paragraph()
                 p.text = "[No content generated yet]"
         
+        if output is not None:
+            prs.save(output)
+            return output
+        
         # Save to BytesIO
         file_stream = BytesIO()
         prs.save(file_stream)
@@ -0,0 +1,197 @@
+"""
+Streaming .docx writer for large documents.
+
+DocGenService.create_docx builds the whole python-docx object tree and then
+serializes it, so peak memory is several times the size of the file. This
+writer produces the same paragraphs (title, section headings, Markdown
+headings/bullets/numbered items with bold/italic runs, and the "Intense Quote"
+placeholder) as raw WordprocessingML written straight into a deflated zip
+stream: the static parts of python-docx's default template are copied once,
+then word/document.xml grows section by section and every call hands back the
+compressed bytes produced so far. Memory stays at roughly one page of
+sections however long the document gets.
+"""
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Optional
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import importlib.util
+import os
+import re
+import zipfile
+
+from app.services.markdown_parser import Block, parse_markdown
+
+# Paragraph styles by list nesting level (0-2) in the default template
+BULLET_STYLES = ["List Bullet", "List Bullet 2", "List Bullet 3"]
+NUMBERED_STYLES = ["List Continue", "List Continue 2", "List Continue 3"]
+PLACEHOLDER_TEXT = "[No content generated yet]"
+PLACEHOLDER_STYLE = "Intense Quote"
+
+DOCUMENT_PART = "word/document.xml"
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Characters XML 1.0 can't carry (python-docx refuses them; here they're dropped)
+_INVALID_XML_RE = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+_BREAKS_RE = re.compile(r"(\t|\r\n|\r|\n)")
+
+
+def block_style(block: Block) -> Optional[str]:
+    """Paragraph style for a parsed Markdown block (None = Normal)"""
+    if block.kind == "heading":
+        return f"Heading {min(block.level + 1, 9)}"
+    if block.kind == "bullet":
+        return BULLET_STYLES[block.level]
+    if block.kind == "numbered":
+        return NUMBERED_STYLES[block.level]
+    return None
+
+
+def _template_path() -> str:
+    # Found without importing python-docx, which API processes otherwise never load
+    package_dir = os.path.dirname(importlib.util.find_spec("docx").origin)
+    return os.path.join(package_dir, "templates", "default.docx")
+
+
+@lru_cache(maxsize=1)
+def _template() -> tuple:
+    """(static parts [(ZipInfo, bytes)], document.xml head, document.xml tail, {style name: id})"""
+    with zipfile.ZipFile(_template_path()) as template:
+        parts = [(info, template.read(info)) for info in template.infolist() if info.filename != DOCUMENT_PART]
+        document = template.read(DOCUMENT_PART).decode("utf-8")
+        styles = ElementTree.fromstring(template.read("word/styles.xml"))
+
+    head, _, body = document.partition("<w:body>")
+    section_properties = body.index("<w:sectPr")
+    style_ids = {
+        style.find(f"{_W}name").get(f"{_W}val").lower(): style.get(f"{_W}styleId")
+        for style in styles.iter(f"{_W}style")
+        if style.find(f"{_W}name") is not None
+    }
+    return parts, (head + "<w:body>").encode("utf-8"), body[section_properties:].strip().encode("utf-8"), style_ids
+
+
+def preload_template():
+    """Read the template ahead of the first export (render workers call this at start-up)"""
+    _template()
+
+
+def _run(text: str, bold: bool = False, italic: bool = False) -> str:
+    """A w:r element; tabs and line breaks become w:tab/w:br like python-docx's run.text"""
+    properties = ("<w:b/>" if bold else "") + ("<w:i/>" if italic else "")
+    content = []
+    for piece in _BREAKS_RE.split(_INVALID_XML_RE.sub("", text)):
+        if piece == "\t":
+            content.append("<w:tab/>")
+        elif piece in ("\n", "\r", "\r\n"):
+            content.append("<w:br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ""
+            content.append(f"<w:t{space}>{escape(piece)}</w:t>")
+    if not content:
+        return ""
+    return "<w:r>" + (f"<w:rPr>{properties}</w:rPr>" if properties else "") + "".join(content) + "</w:r>"
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that collects what zipfile writes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _paragraph(runs: str = "", style: Optional[str] = None, centered: bool = False) -> str:
+    properties = ""
+    if style:
+        properties += f'<w:pStyle w:val="{_template()[3][style.lower()]}"/>'
+    if centered:
+        properties += '<w:jc w:val="center"/>'
+    if properties:
+        properties = f"<w:pPr>{properties}</w:pPr>"
+    return f"<w:p>{properties}{runs}</w:p>" if properties or runs else "<w:p/>"
+
+
+def _section_xml(section: dict) -> str:
+    paragraphs = [_paragraph(_run(section["title"]), "Heading 1")]
+    content = section.get("content")
+    if content:
+        for block in parse_markdown(content):
+            runs = _run(f"{block.number}. ") if block.kind == "numbered" else ""
+            runs += "".join(_run(run.text, run.bold, run.italic) for run in block.runs)
+            paragraphs.append(_paragraph(runs, block_style(block)))
+    else:
+        paragraphs.append(_paragraph(_run(PLACEHOLDER_TEXT), PLACEHOLDER_STYLE))
+    # Spacing after each section
+    paragraphs.append(_paragraph())
+    return "".join(paragraphs)
+
+
+def sections_xml(sections: list) -> bytes:
+    """The document.xml paragraphs of some sections (the CPU-heavy part, safe to run in another process)"""
+    return "".join(_section_xml(section) for section in sections).encode("utf-8")
+
+
+class StreamingDocxWriter:
+    """Incremental .docx output: start(), add_sections() per page, finish(); each returns the next bytes
+
+    add_xml() takes pages already turned into XML by sections_xml(), so that
+    work can happen elsewhere while this object only compresses.
+    """
+
+    def __init__(self, project_title: str):
+        self.project_title = project_title
+        self._sink = _ChunkSink()
+        self._zip = None
+        self._document = None
+
+    def start(self) -> bytes:
+        """Template parts, then the start of document.xml with the title"""
+        parts, head, _, _ = _template()
+        self._zip = zipfile.ZipFile(self._sink, "w", zipfile.ZIP_DEFLATED)
+        for info, data in parts:
+            self._zip.writestr(info.filename, data)
+        # Unseekable output: sizes go in a data descriptor, so the part can be of any length
+        self._document = self._zip.open(DOCUMENT_PART, "w", force_zip64=True)
+        self._document.write(head)
+        self._document.write(_paragraph(_run(self.project_title), "Title", centered=True).encode("utf-8"))
+        return self._sink.drain()
+
+    def add_sections(self, sections: list) -> bytes:
+        """Append sections (dicts with title/content) and return the bytes compressed so far"""
+        return self.add_xml(sections_xml(sections))
+
+    def add_xml(self, xml: bytes) -> bytes:
+        """Append sections_xml() output and return the bytes compressed so far"""
+        self._document.write(xml)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        """Close document.xml and the zip; returns the remaining bytes"""
+        self._document.write(_template()[2])
+        self._document.close()
+        self._zip.close()
+        return self._sink.drain()
+
+
+
+def write_docx(project_title: str, sections: list, output):
+    """Write a whole document to `output` (a path or binary file object)"""
+    writer = StreamingDocxWriter(project_title)
+    with open(output, "wb") if isinstance(output, str) else nullcontext(output) as file:
+        file.write(writer.start())
+        file.write(writer.add_sections(sections))
+        file.write(writer.finish())
+    return output
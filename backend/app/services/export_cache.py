@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Bump when DocGenService output changes so previously cached files are not served
+RENDER_VERSION = 4
+
+
+def content_hash(project: dict, sections: list, template: Optional[str] = None) -> str:
+    """Hash of everything that affects the rendered file (`template`: version of the project's template)"""
+    payload = json.dumps(
+        {
+            "v": RENDER_VERSION,
+            "title": project["title"],
+            "type": project["type"],
+            "template": template,
+            "sections": [
+                [s.get("id"), s.get("title"), s.get("content"), s.get("order_index")]
+                for s in sections
+            ],
+        },
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def version_hash(project: dict, sections: list, template: Optional[str] = None) -> str:
+    """Like content_hash, from section versions instead of their content
+
+    Every content write bumps a section's version, so exports can tag (and
+    look up) a document without loading any of its text first.
+    """
+    payload = json.dumps(
+        {
+            "v": RENDER_VERSION,
+            "title": project["title"],
+            "type": project["type"],
+            "template": template,
+            "versions": [
+                [s.get("id"), s.get("title"), s.get("order_index"), s.get("version")]
+                for s in sections
+            ],
+        },
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against a strong ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ExportCache:
+    """Rendered .docx/.pptx bytes keyed by content hash, one entry per project, bounded by bytes"""
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # content hash -> (project_id, bytes)
+        self._by_project = {}  # project_id -> content hash
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, project_id: str, digest: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            # A project only ever needs its latest render
+            previous = self._by_project.get(project_id)
+            if previous is not None:
+                self._remove(previous)
+            self._entries[digest] = (project_id, data)
+            self._by_project[project_id] = digest
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, project_id: str):
+        """Drop the cached render of a project (called from section write paths)"""
+        with self._lock:
+            digest = self._by_project.get(project_id)
+            if digest is not None:
+                self._remove(digest)
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        project_id, data = entry
+        self._bytes -= len(data)
+        if self._by_project.get(project_id) == digest:
+            del self._by_project[project_id]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+# Global instance
+export_cache = ExportCache()
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+import asyncio
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Finished jobs stay pollable for this long before being pruned
+JOB_TTL = float(os.environ.get("JOB_TTL", "3600"))
+
+
+class Job:
+    """A background task with pollable progress"""
+
+    def __init__(self, kind: str, user_id: str, total: int = 0):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.user_id = user_id
+        self.status = "pending"  # pending -> running -> completed | failed
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.errors = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self._finished_monotonic = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "errors": self.errors,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """In-process registry of background jobs (per worker)"""
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._tasks = set()
+
+    def create(self, kind: str, user_id: str, total: int = 0) -> Job:
+        self._prune()
+        job = Job(kind, user_id, total)
+        self._jobs[job.id] = job
+        return job
+
+    def start(self, job: Job, work: Callable[[Job], Awaitable]) -> Job:
+        """Run `work(job)` in the background; its return value becomes job.result"""
+        task = asyncio.create_task(self._run(job, work))
+        # Keep a strong reference so the task isn't garbage collected mid-run
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, work):
+        job.status = "running"
+        try:
+            job.result = await work(job)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        except BaseException:
+            # Cancelled (e.g. by shutdown): still end in a state pollers recognise as final
+            print(f"Job {job.id} ({job.kind}) cancelled")
+            job.error = "Job was cancelled"
+            job.status = "failed"
+            raise
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job._finished_monotonic = time.monotonic()
+
+    def get(self, job_id: str, user_id: str) -> Optional[Job]:
+        """Return the job if it exists and belongs to the user"""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job._finished_monotonic is not None and job._finished_monotonic < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+# Global instance
+job_manager = JobManager()
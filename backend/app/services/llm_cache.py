@@ -0,0 +1,226 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Optional second tier that survives restarts and is shared by workers on one host
+LLM_CACHE_SQLITE_PATH = os.environ.get("LLM_CACHE_SQLITE_PATH")
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_MAX_ENTRIES", "100000"))
+# Disk hits only note their access time in memory; it is written out this often (seconds)
+# or once this many are pending, in one transaction
+LLM_CACHE_TOUCH_INTERVAL = float(os.environ.get("LLM_CACHE_TOUCH_INTERVAL", "5"))
+LLM_CACHE_TOUCH_BATCH = int(os.environ.get("LLM_CACHE_TOUCH_BATCH", "100"))
+
+
+def cache_key(model_name: str, prompt: str, settings: dict) -> str:
+    """Content address for a generation: model + prompt + generation settings"""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "settings": settings},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _SQLiteTier:
+    """On-disk tier; eviction drops expired rows, then least recently used beyond max_entries
+
+    Blocking: LLMCache calls it from its own thread, never the event loop.
+    Reads don't commit; their access times are written in batches (see
+    LLM_CACHE_TOUCH_INTERVAL), so LRU order on disk can lag by that much.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int,
+                 touch_interval: float = LLM_CACHE_TOUCH_INTERVAL, touch_batch: int = LLM_CACHE_TOUCH_BATCH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._touched = {}  # key -> last access not yet written
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A lost cache write after a power cut is harmless; no fsync per commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl <= now:
+                # Left for _evict; it can't be returned either way
+                return None
+            self._touched[key] = now
+            if (len(self._touched) >= self.touch_batch
+                    or time.monotonic() - self._flushed_at >= self.touch_interval):
+                self._write_touches()
+                self._conn.commit()
+            return row[0]
+
+    def _write_touches(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+        self._flushed_at = time.monotonic()
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._touched.pop(key, None)
+            self._writes += 1
+            # Evicting on every write would scan the table; every 100 writes is plenty
+            if self._writes % 100 == 0:
+                self._write_touches()
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at + ? <= ?", (self.ttl, now))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class LLMCache:
+    """Two-tier (memory LRU + optional SQLite) cache of cleaned LLM responses
+
+    The memory tier is answered inline; the SQLite tier runs on a dedicated
+    thread so disk reads and commits never block the event loop.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_ENABLED,
+        ttl: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        sqlite_path: Optional[str] = LLM_CACHE_SQLITE_PATH,
+        disk_max_entries: int = LLM_CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _SQLiteTier(sqlite_path, ttl, disk_max_entries) if (enabled and sqlite_path) else None
+        # One thread: the tier serializes on its connection anyway
+        self._disk_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache") if self._disk is not None else None
+        )
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def _on_disk(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._disk_executor, fn, *args)
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        if self._disk is not None:
+            value = await self._on_disk(self._disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self._set_memory(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        self._set_memory(key, value)
+        if self._disk is not None:
+            await self._on_disk(self._disk.set, key, value)
+
+    def _set_memory(self, key: str, value: str):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            await self._on_disk(self._disk.clear)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,289 @@
+"""
+Scheduling of model calls: one concurrency cap shared by three priority lanes.
+
+    interactive  section generation and refinement a user is waiting on (default)
+    outline      outline suggestions
+    background   project jobs
+
+A free slot goes to the interactive lane first, then outline, then
+background. Background calls never hold more than LLM_MAX_CONCURRENCY minus
+LLM_RESERVED_SLOTS slots, so an interactive call finds a slot as soon as one
+frees up while background work soaks up the rest. Running calls are never
+preempted.
+
+Within a lane users take turns by start-time fair queuing: a call's tag is
+where its user's earlier calls in the lane leave off, plus its cost (the
+sections it generates), and the lowest tag goes first. One user's 40-slide
+job therefore doesn't hold back another user's single slide.
+
+Per-user caps count calls queued or running. A user holds at most
+LLM_MAX_PER_USER interactive and outline calls together, and separately at
+most LLM_MAX_PER_USER_BACKGROUND background calls, shared by all of the
+user's project jobs. A job can fan out without using up the allowance for
+the sections the same user edits meanwhile, and no user exceeds the sum of
+the two caps.
+
+A queued call is dropped without ever taking a slot when its task is
+cancelled or when its client disconnects (see watch_client). The lane and the
+client check are context variables, so they follow the request into the
+tasks it starts.
+"""
+from fastapi import HTTPException, status
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from dotenv import load_dotenv
+
+from app.services.metrics import current_timing, llm_queue_duration, llm_shed
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_PER_USER = int(os.environ.get("LLM_MAX_PER_USER", "2"))
+# Background (project job) calls per user, counted apart from LLM_MAX_PER_USER
+LLM_MAX_PER_USER_BACKGROUND = int(os.environ.get("LLM_MAX_PER_USER_BACKGROUND", "4"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "30"))
+LLM_RETRY_AFTER = int(os.environ.get("LLM_RETRY_AFTER", "5"))
+
+# Slots background calls never take, kept for interactive and outline calls
+LLM_RESERVED_SLOTS = int(os.environ.get("LLM_RESERVED_SLOTS", "2"))
+# Background calls have no one waiting on them, so they may queue much longer
+LLM_BACKGROUND_QUEUE_TIMEOUT = float(os.environ.get("LLM_BACKGROUND_QUEUE_TIMEOUT", "600"))
+# How often a queued call checks whether its client is still connected (seconds)
+LLM_DISCONNECT_POLL = float(os.environ.get("LLM_DISCONNECT_POLL", "0.5"))
+
+INTERACTIVE = "interactive"
+OUTLINE = "outline"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, OUTLINE, BACKGROUND)  # in priority order
+
+_lane: ContextVar = ContextVar("llm_lane", default=INTERACTIVE)
+_client_gone: ContextVar = ContextVar("llm_client_gone", default=None)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+@contextmanager
+def llm_lane(lane: str, detached: bool = False):
+    """Schedule the model calls made in the block, and in tasks it starts, in `lane`
+
+    detached: the calls serve more than the current request (a project job, a
+    shared batch), so its client disconnecting doesn't drop them.
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane: {lane}")
+    lane_token = _lane.set(lane)
+    client_token = _client_gone.set(None) if detached else None
+    try:
+        yield
+    finally:
+        if client_token is not None:
+            _client_gone.reset(client_token)
+        _lane.reset(lane_token)
+
+
+def watch_client(client_gone: Optional[Callable[[], Awaitable[bool]]]):
+    """Drop the current request's queued model calls once `client_gone()` (e.g. Request.is_disconnected) is true"""
+    _client_gone.set(client_gone)
+
+
+class LLMCapacityError(HTTPException):
+    """Raised when an LLM call is shed instead of queued (429 per-user, 503 global)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int = LLM_RETRY_AFTER):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.retry_after = retry_after
+
+
+class LLMCancelledError(HTTPException):
+    """A queued call dropped because its client disconnected (499, as nginx logs it)"""
+
+    def __init__(self):
+        super().__init__(status_code=499, detail="Client closed the request")
+
+
+class _Lane:
+    """Calls of one lane: queued ones in a heap by start tag, plus counts"""
+
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit  # slots the lane may hold at once
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.virtual_time = 0.0  # start tag of the call dispatched last
+        self._finish = {}  # user -> tag where the user's queued calls end
+        self._heap = []  # (start tag, sequence, future); cancelled futures are skipped when popped
+        self._sequence = itertools.count()
+
+    def push(self, user_id: Optional[str], cost: float, future: asyncio.Future):
+        start = max(self.virtual_time, self._finish.get(user_id, 0.0))
+        self._finish[user_id] = start + cost
+        heapq.heappush(self._heap, (start, next(self._sequence), future))
+        self.queued += 1
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self._heap:
+            start, _, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            self.queued -= 1
+            self.virtual_time = start
+            if not self.queued:
+                # Idle again: nobody is behind anyone
+                self._finish.clear()
+            return future
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.limit,
+            "queue_timeout": self.queue_timeout,
+        }
+
+
+class ConcurrencyLimiter:
+    """Global cap on concurrent LLM calls, scheduled across priority lanes and fairly across users
+
+    Per-user caps: max_per_user for interactive and outline calls together,
+    max_background_per_user for background calls. Each lane has its own bounded wait queue.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_per_user: int = LLM_MAX_PER_USER,
+        max_background_per_user: int = LLM_MAX_PER_USER_BACKGROUND,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        retry_after: int = LLM_RETRY_AFTER,
+        reserved_slots: int = LLM_RESERVED_SLOTS,
+        background_queue_timeout: float = LLM_BACKGROUND_QUEUE_TIMEOUT,
+        disconnect_poll: float = LLM_DISCONNECT_POLL,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_background_per_user = max_background_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.disconnect_poll = disconnect_poll
+        self.lanes = {
+            INTERACTIVE: _Lane(INTERACTIVE, max_concurrency, queue_timeout),
+            OUTLINE: _Lane(OUTLINE, max_concurrency, queue_timeout),
+            BACKGROUND: _Lane(BACKGROUND, max(1, max_concurrency - reserved_slots), background_queue_timeout),
+        }
+        self.in_flight = 0
+        self.per_user = {}  # (user, background?) -> calls queued or running
+
+    @property
+    def queued(self) -> int:
+        return sum(lane.queued for lane in self.lanes.values())
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active_users": len({user for user, _ in self.per_user}),
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+    def _shed(self, lane: _Lane, reason: str, status_code: int, detail: str):
+        llm_shed.inc(lane=lane.name, reason=reason)
+        raise LLMCapacityError(status_code, detail, self.retry_after)
+
+    def _dispatch(self):
+        """Hand free slots to queued calls, highest priority lane first"""
+        while self.in_flight < self.max_concurrency:
+            for lane in self.lanes.values():
+                future = lane.pop() if lane.in_flight < lane.limit else None
+                if future is not None:
+                    break
+            else:
+                return
+            lane.in_flight += 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _release(self, lane: _Lane):
+        lane.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    async def _wait(self, lane: _Lane, future: asyncio.Future):
+        """Wait until `future` is granted a slot, the queue timeout passes or the client goes away"""
+        client_gone = _client_gone.get()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lane.queue_timeout
+        while not future.done():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._shed(lane, "timeout", status.HTTP_503_SERVICE_UNAVAILABLE, "Timed out waiting for AI capacity")
+            await asyncio.wait((future,), timeout=min(remaining, self.disconnect_poll) if client_gone else remaining)
+            if not future.done() and client_gone is not None and await client_gone():
+                llm_shed.inc(lane=lane.name, reason="disconnected")
+                raise LLMCancelledError()
+
+    async def _acquire(self, lane: _Lane, user_id: Optional[str], cost: float):
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        lane.push(user_id, cost, future)
+        self._dispatch()
+        try:
+            await self._wait(lane, future)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self._release(lane)  # granted just as the wait ended
+            else:
+                future.cancel()
+                lane.queued -= 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            llm_queue_duration.observe(waited, lane=lane.name)
+            timing = current_timing()
+            if timing is not None:
+                timing.add("queue", waited)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, cost: float = 1):
+        """Hold one LLM slot in the current lane for the duration of the block, or fail fast with Retry-After
+
+        `cost` weighs the call against the user's other calls in fair queuing.
+        """
+        lane = self.lanes[_lane.get()]
+        background = lane.name == BACKGROUND
+        user_key = (user_id, background)
+        user_cap = self.max_background_per_user if background else self.max_per_user
+        if user_id is not None and self.per_user.get(user_key, 0) >= user_cap:
+            self._shed(lane, "user", status.HTTP_429_TOO_MANY_REQUESTS, "Too many concurrent AI requests for this user")
+        if lane.queued >= self.max_queue:
+            self._shed(lane, "queue_full", status.HTTP_503_SERVICE_UNAVAILABLE, "AI service is busy, please retry shortly")
+
+        if user_id is not None:
+            self.per_user[user_key] = self.per_user.get(user_key, 0) + 1
+        try:
+            await self._acquire(lane, user_id, cost)
+            try:
+                yield
+            finally:
+                self._release(lane)
+        finally:
+            if user_id is not None:
+                remaining = self.per_user.get(user_key, 1) - 1
+                if remaining:
+                    self.per_user[user_key] = remaining
+                else:
+                    self.per_user.pop(user_key, None)
@@ -0,0 +1,378 @@
+from collections import OrderedDict
+from importlib import import_module
+from typing import AsyncIterator, NamedTuple, Optional
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "gemini", "fake" (offline, see FakeProvider) or "package.module:ClassName" for a custom LLMProvider subclass
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-2.0-flash")
+
+# Gemini explicit context caching of shared prompt prefixes (the project digest): prefixes of
+# at least this many tokens are uploaded once and reused for LLM_CONTEXT_CACHE_TTL seconds.
+# The API refuses prefixes below the model's minimum; shorter ones are sent inline, where
+# models with implicit caching still reuse the common prefix. 0 disables explicit caching.
+LLM_CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get("LLM_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+LLM_CONTEXT_CACHE_TTL = int(os.environ.get("LLM_CONTEXT_CACHE_TTL", "3600"))
+
+# FakeProvider behaviour: base latency + per output token, +/- jitter, and injected failures
+LLM_FAKE_LATENCY_MS = float(os.environ.get("LLM_FAKE_LATENCY_MS", "200"))
+LLM_FAKE_MS_PER_TOKEN = float(os.environ.get("LLM_FAKE_MS_PER_TOKEN", "2"))
+LLM_FAKE_JITTER = float(os.environ.get("LLM_FAKE_JITTER", "0.2"))
+LLM_FAKE_ERROR_RATE = float(os.environ.get("LLM_FAKE_ERROR_RATE", "0"))
+LLM_FAKE_ERROR_STATUS = int(os.environ.get("LLM_FAKE_ERROR_STATUS", "503"))
+LLM_FAKE_HANG_RATE = float(os.environ.get("LLM_FAKE_HANG_RATE", "0"))
+LLM_FAKE_SEED = int(os.environ.get("LLM_FAKE_SEED", "0"))
+
+# Statuses worth another attempt: rate limited, upstream errors and timeouts
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """An upstream failure, classified for retries and the circuit breaker"""
+
+    def __init__(self, message: str, status: int = 500, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+class LLMResponse(NamedTuple):
+    text: str
+    blocked: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # part of prompt_tokens served from a prompt cache
+
+
+class LLMProvider:
+    """A text generation backend used by LLMService
+
+    generate() returns a whole answer; stream() is an async iterator of text
+    chunks (nothing at all if the answer was blocked) whose aclose() cancels the
+    upstream call. Upstream failures are raised as ProviderError so LLMService
+    can retry them and feed its circuit breaker. `settings` is everything besides
+    the prompt that changes the output; it is part of response cache keys.
+
+    The *_with_context variants take a prompt whose first part (`context`) is
+    shared by many calls. Providers with prompt caching override them so that
+    prefix isn't processed and billed again on every call; by default it is
+    simply prepended.
+    """
+
+    model_name = ""
+    settings: dict = {}
+
+    async def generate(self, prompt: str, json_output: bool = False) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def generate_with_context(self, context: str, prompt: str, json_output: bool = False) -> LLMResponse:
+        return await self.generate(context + prompt, json_output=json_output)
+
+    def stream_with_context(self, context: str, prompt: str) -> AsyncIterator[str]:
+        return self.stream(context + prompt)
+
+
+def _status_of(error: Exception) -> int:
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    # grpc status codes on google.api_core exceptions raised by the async client
+    grpc_status = getattr(error, "grpc_status_code", None)
+    return {
+        "RESOURCE_EXHAUSTED": 429, "UNAVAILABLE": 503, "DEADLINE_EXCEEDED": 504,
+        "INTERNAL": 500, "INVALID_ARGUMENT": 400, "PERMISSION_DENIED": 403,
+    }.get(getattr(grpc_status, "name", None), 500)
+
+
+def _retry_after_of(error: Exception) -> Optional[float]:
+    """Retry-After header (REST) or RetryInfo detail (gRPC) of an upstream error"""
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through the google-generativeai async client"""
+
+    def __init__(self, model_name: str = LLM_MODEL):
+        import google.generativeai as genai
+        from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY must be set in environment variables")
+
+        genai.configure(api_key=api_key)
+
+        # --- NEW: Disable Safety Filters to prevent 500 Errors ---
+        self.safety_settings = {
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(self.model_name)
+        self.settings = {
+            "safety_settings": {str(k): str(v) for k, v in self.safety_settings.items()},
+        }
+        self._context_models = OrderedDict()  # sha256 of a prefix -> (reuse until, model or None)
+        self._context_pending = {}
+
+    def _error(self, error: Exception) -> ProviderError:
+        if isinstance(error, ProviderError):
+            return error
+        return ProviderError(str(error), status=_status_of(error), retry_after=_retry_after_of(error))
+
+    def _create_context_model(self, context: str):
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        cached = caching.CachedContent.create(
+            model=f"models/{self.model_name}",
+            contents=[context],
+            ttl=datetime.timedelta(seconds=LLM_CONTEXT_CACHE_TTL),
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cached)
+
+    async def _context_model(self, context: str):
+        """A model bound to a server-side cache of `context`, or None to send the context inline"""
+        if not LLM_CONTEXT_CACHE_MIN_TOKENS or _tokens(context) < LLM_CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        key = hashlib.sha256(context.encode()).hexdigest()
+        now = time.monotonic()
+        entry = self._context_models.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        # Concurrent calls with the same prefix share one upload
+        task = self._context_pending.get(key)
+        if task is None:
+            task = self._context_pending[key] = asyncio.ensure_future(
+                asyncio.to_thread(self._create_context_model, context)
+            )
+        try:
+            model = await asyncio.shield(task)
+        except Exception as e:
+            print(f"LLM context cache error: {str(e)}")
+            model = None
+        finally:
+            self._context_pending.pop(key, None)
+
+        # Used until shortly before the server drops it; a failed upload is retried after a minute
+        self._context_models[key] = (now + (max(60, LLM_CONTEXT_CACHE_TTL - 60) if model else 60), model)
+        self._context_models.move_to_end(key)
+        while len(self._context_models) > 256:
+            self._context_models.popitem(last=False)
+        return model
+
+    async def _generate(self, model, prompt: str, json_output: bool = False) -> LLMResponse:
+        kwargs = {"generation_config": {"response_mime_type": "application/json"}} if json_output else {}
+        try:
+            response = await model.generate_content_async(
+                prompt,
+                safety_settings=self.safety_settings,
+                **kwargs
+            )
+        except Exception as e:
+            raise self._error(e)
+
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+        # Check if response was blocked
+        if not response.parts:
+            return LLMResponse("", blocked=True, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens)
+        return LLMResponse(response.text, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           cached_tokens=cached_tokens)
+
+    async def generate(self, prompt: str, json_output: bool = False) -> LLMResponse:
+        return await self._generate(self.model, prompt, json_output)
+
+    async def generate_with_context(self, context: str, prompt: str, json_output: bool = False) -> LLMResponse:
+        model = await self._context_model(context)
+        if model is None:
+            return await self._generate(self.model, context + prompt, json_output)
+        return await self._generate(model, prompt, json_output)
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        return self._stream(None, prompt)
+
+    def stream_with_context(self, context: str, prompt: str) -> AsyncIterator[str]:
+        return self._stream(context, prompt)
+
+    async def _stream(self, context: Optional[str], prompt: str) -> AsyncIterator[str]:
+        model = await self._context_model(context) if context else None
+        if model is None:
+            model, prompt = self.model, (context or "") + prompt
+        try:
+            response = await model.generate_content_async(
+                prompt,
+                safety_settings=self.safety_settings,
+                stream=True
+            )
+        except Exception as e:
+            raise self._error(e)
+
+        try:
+            async for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+        except Exception as e:
+            raise self._error(e)
+        finally:
+            await self._close_stream(response)
+
+    async def _close_stream(self, response):
+        """Cancel an unfinished upstream stream (client went away or we stopped reading)"""
+        iterator = getattr(response, "_iterator", None)
+        if iterator is None or getattr(response, "_done", True):
+            return
+        try:
+            if hasattr(iterator, "cancel"):
+                iterator.cancel()
+            elif hasattr(iterator, "aclose"):
+                await iterator.aclose()
+        except Exception as e:
+            print(f"LLM stream close error: {str(e)}")
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic offline backend for load tests and local development
+
+    Answers are derived from the prompt (section, batch, outline and refine
+    prompts all get plausible Markdown; refinements return the text unchanged),
+    so the same prompt always gets the same text. Each call sleeps latency_ms +
+    ms_per_token per output token, scaled by up to +/- jitter; error_rate of
+    calls fail with ProviderError(error_status) and hang_rate of calls never
+    answer (to exercise deadlines). Randomness comes from a seeded RNG, so a run
+    is reproducible for a given sequence of calls. A shared context is answered
+    as if it were cached from its second use on (reported as cached_tokens).
+    """
+
+    model_name = "fake"
+
+    def __init__(self, latency_ms: float = LLM_FAKE_LATENCY_MS, ms_per_token: float = LLM_FAKE_MS_PER_TOKEN,
+                 jitter: float = LLM_FAKE_JITTER, error_rate: float = LLM_FAKE_ERROR_RATE,
+                 error_status: int = LLM_FAKE_ERROR_STATUS, hang_rate: float = LLM_FAKE_HANG_RATE,
+                 seed: int = LLM_FAKE_SEED):
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.rng = random.Random(seed)
+        self.settings = {"seed": seed}
+        self.calls = 0
+        self._contexts = set()
+
+    def answer(self, prompt: str, json_output: bool = False) -> str:
+        topic = re.search(r'"([^"]*)"', prompt)
+        topic = topic.group(1) if topic else "the topic"
+        numbered = re.findall(r'^(\d+)\. "([^"]*)"$', prompt, re.M)
+        if json_output and numbered:
+            return json.dumps({number: self._bullets(title, topic) for number, title in numbered})
+        outline = re.search(r"Generate exactly (\d+)", prompt)
+        if outline:
+            return "\n".join(f"Part {i}: {topic}" for i in range(1, int(outline.group(1)) + 1))
+        original = re.search(r"^Original:\n(.*?)\n\nInstruction:", prompt, re.S)
+        if original:
+            return original.group(1)
+        passage = re.search(r"^Passage:\n(.*?)\n\nText after", prompt, re.M | re.S)
+        if passage:
+            return passage.group(1)
+        title = re.search(r'Title: "([^"]*)"', prompt)
+        title = title.group(1) if title else topic
+        if "paragraphs" in prompt:
+            return "\n\n".join(
+                f"**{title}** matters for {topic}. " + self._filler(prompt, i) for i in range(3)
+            )
+        return self._bullets(title, topic)
+
+    def _bullets(self, title: str, topic: str) -> str:
+        return "\n".join(f"- **{title}** point {i} on {topic}" for i in range(1, 5))
+
+    def _filler(self, prompt: str, index: int) -> str:
+        digest = hashlib.sha256(f"{prompt}{index}".encode()).hexdigest()
+        return " ".join(f"Finding {digest[i:i + 6]} supports the analysis." for i in range(0, 48, 8))
+
+    async def _delay(self, text: str):
+        """Sleep like an upstream call producing `text`, or fail as configured"""
+        self.calls += 1
+        roll = self.rng.random()
+        scale = 1 + self.rng.uniform(-self.jitter, self.jitter)
+        if roll < self.hang_rate:
+            await asyncio.Event().wait()
+        await asyncio.sleep(max(0.0, self.latency_ms + self.ms_per_token * _tokens(text)) * scale / 1000)
+        if roll < self.hang_rate + self.error_rate:
+            raise ProviderError(
+                f"Injected {self.error_status} from fake provider",
+                status=self.error_status,
+                retry_after=1.0 if self.error_status == 429 else None,
+            )
+
+    async def generate(self, prompt: str, json_output: bool = False) -> LLMResponse:
+        text = self.answer(prompt, json_output)
+        await self._delay(text)
+        return LLMResponse(text, prompt_tokens=_tokens(prompt), completion_tokens=_tokens(text))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self.answer(prompt)
+        await self._delay(text[:64])
+        for start in range(0, len(text), 64):
+            if start:
+                await asyncio.sleep(self.ms_per_token * 16 / 1000)
+            yield text[start:start + 64]
+
+    async def generate_with_context(self, context: str, prompt: str, json_output: bool = False) -> LLMResponse:
+        # Answered from the prompt alone; the context only counts towards usage
+        response = await self.generate(prompt, json_output=json_output)
+        key = hashlib.sha256(context.encode()).digest()
+        cached = _tokens(context) if key in self._contexts else 0
+        self._contexts.add(key)
+        return response._replace(prompt_tokens=_tokens(context + prompt), cached_tokens=cached)
+
+    def stream_with_context(self, context: str, prompt: str) -> AsyncIterator[str]:
+        return self.stream(prompt)
+
+
+def get_llm_provider() -> LLMProvider:
+    if LLM_PROVIDER == "gemini":
+        return GeminiProvider()
+    if LLM_PROVIDER == "fake":
+        return FakeProvider()
+    module_name, _, class_name = LLM_PROVIDER.partition(":")
+    return getattr(import_module(module_name), class_name)()
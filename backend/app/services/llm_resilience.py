@@ -0,0 +1,185 @@
+from fastapi import HTTPException, status
+from app.services.llm_provider import ProviderError
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import asyncio
+import math
+import os
+import random
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Deadlines: one upstream attempt, and the whole call including retries and backoff
+LLM_ATTEMPT_TIMEOUT = float(os.environ.get("LLM_ATTEMPT_TIMEOUT", "30"))
+LLM_CALL_DEADLINE = float(os.environ.get("LLM_CALL_DEADLINE", "60"))
+# Retries of 429/5xx/timeouts: full-jitter exponential backoff, never sooner than Retry-After
+LLM_RETRIES = int(os.environ.get("LLM_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.environ.get("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.environ.get("LLM_RETRY_MAX", "8"))
+# Circuit breaker: open when at least LLM_BREAKER_MIN_CALLS attempts in the last
+# LLM_BREAKER_WINDOW seconds failed at LLM_BREAKER_ERROR_RATE or more; stay open for
+# LLM_BREAKER_COOLDOWN seconds, then let a single probe call through
+LLM_BREAKER_WINDOW = float(os.environ.get("LLM_BREAKER_WINDOW", "30"))
+LLM_BREAKER_MIN_CALLS = int(os.environ.get("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+
+class LLMUnavailableError(HTTPException):
+    """Raised when the upstream model is failing: breaker open, retries exhausted or deadline hit (503/504)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float = LLM_BREAKER_COOLDOWN):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+class RetryPolicy:
+    def __init__(self, retries: int = LLM_RETRIES, base: float = LLM_RETRY_BASE, cap: float = LLM_RETRY_MAX,
+                 rng: Optional[random.Random] = None):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Backoff before retry number `attempt` (1-based)"""
+        backoff = self.rng.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+        return max(backoff, retry_after or 0)
+
+
+class CircuitBreaker:
+    """Error-rate breaker over a sliding time window of attempt outcomes
+
+    closed -> open when the window's error rate crosses the threshold; open ->
+    half-open after the cooldown, where one probe is let through: success closes
+    the breaker, failure reopens it for another cooldown.
+    """
+
+    def __init__(self, window: float = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, cooldown: float = LLM_BREAKER_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes = deque()  # (time, ok)
+        self._probing = False
+
+    def stats(self) -> dict:
+        self._trim()
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+    def _trim(self):
+        cutoff = self.clock() - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def before_call(self):
+        """Raise LLMUnavailableError instead of calling upstream while open"""
+        if self.state == "open":
+            remaining = self.opened_at + self.cooldown - self.clock()
+            if remaining > 0:
+                self.rejected += 1
+                raise LLMUnavailableError(
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                    "AI service is temporarily unavailable, please retry shortly",
+                    remaining,
+                )
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                raise LLMUnavailableError(
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                    "AI service is recovering, please retry shortly",
+                    1,
+                )
+            self._probing = True
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+
+        self._outcomes.append((self.clock(), ok))
+        self._trim()
+        if ok or len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for _, outcome in self._outcomes if not outcome)
+        if failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    def release(self):
+        """The probe ended without an upstream outcome (cancelled, or a non-retryable error)"""
+        if self.state == "half_open" and self._probing:
+            self._probing = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = self.clock()
+        self.trips += 1
+        self._outcomes.clear()
+
+
+async def call_with_retries(attempt: Callable[[], Awaitable], retry: RetryPolicy, breaker: CircuitBreaker,
+                            attempt_timeout: float = LLM_ATTEMPT_TIMEOUT, deadline: float = LLM_CALL_DEADLINE):
+    """Run attempt() under the breaker with a per-attempt timeout and retries, all within `deadline` seconds
+
+    Retryable failures (429/5xx/timeouts) count against the breaker and are
+    retried until retries or the deadline run out, then raised as
+    LLMUnavailableError. Other ProviderErrors are raised as they are.
+    """
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + deadline
+    tries = 0
+    while True:
+        breaker.before_call()
+        remaining = give_up_at - loop.time()
+        try:
+            result = await asyncio.wait_for(attempt(), timeout=max(0.001, min(attempt_timeout, remaining)))
+        except asyncio.TimeoutError:
+            error = ProviderError("AI service timed out", status=status.HTTP_504_GATEWAY_TIMEOUT)
+        except ProviderError as e:
+            error = e
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            breaker.record(True)
+            return result
+
+        if not error.retryable:
+            breaker.release()
+            raise error
+        breaker.record(False)
+        tries += 1
+        delay = retry.delay(tries, error.retry_after)
+        if tries > retry.retries or loop.time() + delay >= give_up_at:
+            print(f"LLM call failed after {tries} attempt(s): {str(error)}")
+            if error.status == status.HTTP_504_GATEWAY_TIMEOUT:
+                raise LLMUnavailableError(status.HTTP_504_GATEWAY_TIMEOUT, "AI service timed out", delay or 1)
+            raise LLMUnavailableError(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "AI service is unavailable, please retry shortly",
+                error.retry_after or delay or 1,
+            )
+        await asyncio.sleep(delay)
@@ -1,64 +1,354 @@
 import os
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from app.services.llm_limiter import (
+    OUTLINE, ConcurrencyLimiter, LLMCancelledError, LLMCapacityError, current_lane, llm_lane
+)
+from app.services.llm_cache import LLMCache, cache_key
+from app.services.llm_provider import LLMProvider, LLMResponse, get_llm_provider
+from app.services.llm_resilience import (
+    LLM_ATTEMPT_TIMEOUT, CircuitBreaker, LLMUnavailableError, RetryPolicy, call_with_retries
+)
+from app.services.metrics import (
+    count_tokens, llm_call_duration, llm_errors, llm_in_flight, llm_queued, markdown_duration, timed
+)
+from app.services.rate_limit import estimate_tokens, rate_limiter
+from typing import AsyncIterator, List, Optional
+import asyncio
+import json
 import re
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class LLMService:
+# Section batching: requests for sections of the same project that arrive within
+# LLM_BATCH_WINDOW_MS share one Gemini call (0 disables the window). Only document
+# types in LLM_BATCH_TYPES are batched; pptx bullets are short enough that several
+# fit in one response, docx sections are long enough that parallel calls finish first.
+LLM_BATCH_WINDOW_MS = float(os.environ.get("LLM_BATCH_WINDOW_MS", "25"))
+LLM_BATCH_MAX_SECTIONS = int(os.environ.get("LLM_BATCH_MAX_SECTIONS", "8"))
+LLM_BATCH_TYPES = {t.strip() for t in os.environ.get("LLM_BATCH_TYPES", "pptx").split(",") if t.strip()}
+
+# Common AI filler phrases stripped from responses
+FILLER_PHRASES = [
+    "here is", "here's", "sure,", "certainly", "concise bullet points", 
+    "content for", "slide:", "output:", "revised text", "in this section"
+]
+
+BLOCKED_MESSAGE = "Content generation was blocked by AI safety filters. Please try a different topic."
+
+
+def _is_filler(line: str) -> bool:
+    lower_line = line.lower()
+    return any(phrase in lower_line for phrase in FILLER_PHRASES)
+
+
+class StreamCleaner:
+    """Incremental _clean_response: feed raw chunks, get back the cleaned text to emit.
+
+    Filler lines are dropped as soon as they are complete, and blank lines are
+    held back until more content follows, so the concatenated output equals
+    _clean_response() of the full text.
+    """
+
     def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY must be set in environment variables")
-        
-        genai.configure(api_key=api_key)
-        
-        # --- NEW: Disable Safety Filters to prevent 500 Errors ---
-        self.safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        self._buffer = ""   # current unterminated line
+        self._pending = ""  # newlines/whitespace not emitted yet
+        self._started = False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        return "".join(self._accept(line) for line in lines)
+
+    def finish(self) -> str:
+        line, self._buffer = self._buffer, ""
+        return self._accept(line)
+
+    def _accept(self, line: str) -> str:
+        if _is_filler(line):
+            return ""
+        if not self._started:
+            line = line.lstrip()
+            if not line:
+                return ""
+            self._started = True
+        else:
+            self._pending += '\n'
+        stripped = line.rstrip()
+        if not stripped:
+            self._pending += line
+            return ""
+        out = self._pending + stripped
+        self._pending = line[len(stripped):]
+        self.text += out
+        return out
+
+
+class SectionBatcher:
+    """Coalesces section requests for the same project that arrive within a short window
+
+    A request for a (project, topic, type, user) with nothing else pending or in
+    flight is sent at once, so a lone interactive request never waits out the
+    window. One that arrives while a call for the key is running opens a batch;
+    it is sent after window_ms, or as soon as it holds max_sections requests,
+    through LLMService.generate_sections_batch. Each caller awaits its own
+    entry, so a cancelled caller doesn't affect the rest of the batch.
+    """
+
+    def __init__(self, service: "LLMService", window_ms: float = LLM_BATCH_WINDOW_MS,
+                 max_sections: int = LLM_BATCH_MAX_SECTIONS):
+        self.service = service
+        self.window = window_ms / 1000
+        self.max_sections = max(1, max_sections)
+        self._pending = {}
+        self._in_flight = {}  # key -> batches sent and not yet answered
+        self._tasks = set()
+        self.batches = 0
+        self.batched_sections = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_sections > 1
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_sections": self.max_sections,
+            "open_batches": len(self._pending),
+            "in_flight_batches": sum(self._in_flight.values()),
+            "batches": self.batches,
+            "batched_sections": self.batched_sections,
         }
-        
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+
+    async def submit(self, project_id: str, section_title: str, document_topic: str, document_type: str,
+                     user_id: Optional[str] = None, bypass_cache: bool = False, project_context: str = "") -> str:
+        loop = asyncio.get_running_loop()
+        key = (project_id, document_topic, document_type, user_id, bypass_cache, project_context)
+        batch = self._pending.get(key)
+        alone = batch is None and not self._in_flight.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            if not alone:
+                loop.call_later(self.window, self._flush, key, batch)
+        future = loop.create_future()
+        batch.append((section_title, future))
+        if alone or len(batch) >= self.max_sections:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: tuple, batch: list):
+        if self._pending.get(key) is not batch:
+            return  # already sent when it filled up
+        del self._pending[key]
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        task = asyncio.ensure_future(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(lambda task: self._done(key, task))
+
+    def _done(self, key: tuple, task: asyncio.Task):
+        self._tasks.discard(task)
+        remaining = self._in_flight.get(key, 1) - 1
+        if remaining:
+            self._in_flight[key] = remaining
+        else:
+            self._in_flight.pop(key, None)
+
+    async def _run(self, key: tuple, batch: list):
+        _, document_topic, document_type, user_id, bypass_cache, project_context = key
+        live = [(title, future) for title, future in batch if not future.done()]
+        if not live:
+            return
+        self.batches += 1
+        self.batched_sections += len(live)
+        try:
+            # The call serves every request in the batch, not just the one that opened it
+            with llm_lane(current_lane(), detached=True):
+                results = await self.service.generate_sections_batch(
+                    [title for title, _ in live], document_topic, document_type,
+                    user_id=user_id, bypass_cache=bypass_cache, project_context=project_context
+                )
+        except Exception as e:
+            results = [e] * len(live)
+        for (_, future), result in zip(live, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class LLMService:
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        self._provider = provider
+        self._provider_lock = threading.Lock()
+        self.limiter = ConcurrencyLimiter()
+        self.cache = LLMCache()
+        self.batcher = SectionBatcher(self)
+        self.retry = RetryPolicy()
+        self.breaker = CircuitBreaker()
+
+    @property
+    def provider(self) -> LLMProvider:
+        """The model backend, created on first use (importing the Gemini SDK takes ~0.5 s)"""
+        if self._provider is None:
+            with self._provider_lock:
+                if self._provider is None:
+                    self._provider = get_llm_provider()
+        return self._provider
+
+    @provider.setter
+    def provider(self, provider: LLMProvider):
+        self._provider = provider
+
+    @property
+    def model_name(self) -> str:
+        return self.provider.model_name
+
+    def warm_up(self) -> LLMProvider:
+        """Create the provider ahead of the first request (blocking; run off the event loop)"""
+        return self.provider
+
+    def _cache_key(self, prompt: str) -> str:
+        # The provider's settings are everything besides the prompt that changes what the model returns
+        return cache_key(self.model_name, prompt, self.provider.settings)
 
     def _clean_response(self, text: str) -> str:
         """Removes conversational filler from AI response"""
-        lines = text.strip().split('\n')
-        cleaned_lines = []
-        for line in lines:
-            lower_line = line.lower()
-            # Filter out common AI filler phrases
-            if any(phrase in lower_line for phrase in [
-                "here is", "here's", "sure,", "certainly", "concise bullet points", 
-                "content for", "slide:", "output:", "revised text", "in this section"
-            ]):
-                continue
-            cleaned_lines.append(line)
-            
-        return '\n'.join(cleaned_lines).strip()
+        with timed("markdown", markdown_duration, kind="clean"):
+            lines = text.strip().split('\n')
+            cleaned_lines = [line for line in lines if not _is_filler(line)]
+            return '\n'.join(cleaned_lines).strip()
+
+    async def _complete(self, prompt: str, json_output: bool = False, user_id: Optional[str] = None,
+                        context: str = "") -> LLMResponse:
+        """One provider call with deadlines, retries and the circuit breaker; its tokens count against user_id's budget
+
+        `context` is a prompt prefix shared with other calls, which the provider may cache.
+        """
+        model = self.model_name
+        if context:
+            call = lambda: self.provider.generate_with_context(context, prompt, json_output=json_output)
+        else:
+            call = lambda: self.provider.generate(prompt, json_output=json_output)
+        with timed("llm", llm_call_duration, llm_errors, model=model, kind="json" if json_output else "text"):
+            response = await call_with_retries(call, self.retry, self.breaker)
+        count_tokens(model, response.prompt_tokens, response.completion_tokens, response.cached_tokens)
+        await rate_limiter.record(user_id, response.prompt_tokens, response.completion_tokens)
+        return response
+
+    async def generate_content(self, prompt: str, user_id: Optional[str] = None, bypass_cache: bool = False,
+                               context: str = "") -> str:
+        """Generate content based on a prompt
+
+        Runs on the provider's async client so the event loop keeps serving other
+        requests, and waits for a slot in the current scheduler lane (raises
+        LLMCapacityError when full, LLMCancelledError if the client leaves first).
+        Each attempt has a deadline, 429/5xx/timeouts are retried with backoff, and
+        LLMUnavailableError is raised when they run out or the breaker is open.
+        Identical prompts are answered from the response cache unless bypass_cache
+        is set; a bypassed call still refreshes the cached entry. `context` goes
+        before the prompt as a prefix the provider may cache across calls.
+        """
+        key = self._cache_key(context + prompt)
+        if not bypass_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
 
-    async def generate_content(self, prompt: str) -> str:
-        """Generate content based on a prompt"""
         try:
-            response = self.model.generate_content(
-                prompt, 
-                safety_settings=self.safety_settings  # <--- Apply settings here
-            )
-            
+            async with self.limiter.slot(user_id):
+                response = await self._complete(prompt, user_id=user_id, context=context)
+
             # Check if response was blocked
-            if not response.parts:
-                return "Content generation was blocked by AI safety filters. Please try a different topic."
-                
-            return self._clean_response(response.text)
+            if response.blocked:
+                return BLOCKED_MESSAGE
+
+            content = self._clean_response(response.text)
+            await self.cache.set(key, content)
+            return content
+        except (LLMCapacityError, LLMCancelledError, LLMUnavailableError):
+            raise
         except Exception as e:
             print(f"LLM Generation Error: {str(e)}") # Print error to console for debugging
             raise Exception(f"Error generating content: {str(e)}")
 
-    async def generate_section_content(self, section_title: str, document_topic: str, document_type: str) -> str:
-        """Generate content for a specific section"""
+    async def _open_stream(self, prompt: str, context: str = ""):
+        """Start a provider stream and wait for its first chunk (None if the answer was blocked)"""
+        stream = self.provider.stream_with_context(context, prompt) if context else self.provider.stream(prompt)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    async def stream_content(self, prompt: str, user_id: Optional[str] = None, bypass_cache: bool = False,
+                             context: str = "") -> AsyncIterator[str]:
+        """Stream cleaned content as the model produces it
+
+        The first item is always "" and is yielded once a scheduler slot is held and
+        the first chunk has arrived, so callers can prime the generator to surface
+        capacity/upstream errors before committing to a streaming response. Opening
+        the stream is retried like generate_content; after that each chunk must
+        arrive within LLM_ATTEMPT_TIMEOUT. Closing the generator early cancels the
+        upstream call. Streams don't carry usage metadata, so the tokens counted
+        against the user's budget are estimated from the text.
+        """
+        key = self._cache_key(context + prompt)
+        if not bypass_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield ""
+                yield cached
+                return
+
+        cleaner = StreamCleaner()
+        async with self.limiter.slot(user_id):
+            try:
+                with timed("llm", llm_call_duration, llm_errors, model=self.model_name, kind="stream"):
+                    stream, chunk = await call_with_retries(
+                        lambda: self._open_stream(prompt, context), self.retry, self.breaker
+                    )
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                print(f"LLM Generation Error: {str(e)}")
+                raise Exception(f"Error generating content: {str(e)}")
+
+            yield ""
+            received = 0
+            try:
+                saw_parts = chunk is not None
+                while chunk is not None:
+                    received += len(chunk)
+                    piece = cleaner.feed(chunk)
+                    if piece:
+                        yield piece
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=LLM_ATTEMPT_TIMEOUT)
+                    except StopAsyncIteration:
+                        chunk = None
+                tail = cleaner.finish()
+                if tail:
+                    yield tail
+                if saw_parts:
+                    await self.cache.set(key, cleaner.text)
+                else:
+                    yield BLOCKED_MESSAGE
+            except asyncio.TimeoutError:
+                print("LLM Generation Error: stream stalled")
+                raise Exception("Error generating content: AI service stopped responding")
+            except Exception as e:
+                print(f"LLM Generation Error: {str(e)}")
+                raise Exception(f"Error generating content: {str(e)}")
+            finally:
+                await stream.aclose()
+                await rate_limiter.record(user_id, estimate_tokens(len(context) + len(prompt)), estimate_tokens(received))
+
+    def _section_prompt(self, section_title: str, document_topic: str, document_type: str) -> str:
         if document_type == "docx":
             prompt = f"""Topic: "{document_topic}"
 Section Title: "{section_title}"
@@ -83,11 +373,150 @@ Rules:
 4. Use **bold** for keywords.
 
 Content:"""
-        
-        return await self.generate_content(prompt)
+        return prompt
+
+    def _context_prefix(self, project_context: str) -> str:
+        """The shared first part of a project's section prompts (see project_context)"""
+        if not project_context:
+            return ""
+        return f"""Document context:
+{project_context}
+
+Keep sections consistent with each other and don't repeat what other sections already cover.
 
-    async def refine_content(self, current_content: str, refinement_instruction: str) -> str:
-        prompt = f"""Original:
+"""
+
+    async def generate_section_content(self, section_title: str, document_topic: str, document_type: str, user_id: Optional[str] = None, bypass_cache: bool = False, project_context: str = "") -> str:
+        """Generate content for a specific section, aware of the rest of the document through `project_context`"""
+        prompt = self._section_prompt(section_title, document_topic, document_type)
+        return await self.generate_content(prompt, user_id=user_id, bypass_cache=bypass_cache,
+                                           context=self._context_prefix(project_context))
+
+    def stream_section_content(self, section_title: str, document_topic: str, document_type: str, user_id: Optional[str] = None, bypass_cache: bool = False, project_context: str = "") -> AsyncIterator[str]:
+        """Streaming variant of generate_section_content"""
+        prompt = self._section_prompt(section_title, document_topic, document_type)
+        return self.stream_content(prompt, user_id=user_id, bypass_cache=bypass_cache,
+                                   context=self._context_prefix(project_context))
+
+    def batch_size(self, document_type: str) -> int:
+        """How many sections of this document type share one Gemini call"""
+        return LLM_BATCH_MAX_SECTIONS if document_type in LLM_BATCH_TYPES else 1
+
+    async def batch_section_content(self, project_id: str, section_title: str, document_topic: str, document_type: str, user_id: Optional[str] = None, bypass_cache: bool = False, project_context: str = "") -> str:
+        """generate_section_content, sharing one call with other sections of the project requested at the same time"""
+        if not self.batcher.enabled or self.batch_size(document_type) <= 1:
+            return await self.generate_section_content(section_title, document_topic, document_type, user_id=user_id, bypass_cache=bypass_cache, project_context=project_context)
+        if not bypass_cache:
+            prompt = self._context_prefix(project_context) + self._section_prompt(section_title, document_topic, document_type)
+            cached = await self.cache.get(self._cache_key(prompt))
+            if cached is not None:
+                return cached
+        return await self.batcher.submit(project_id, section_title, document_topic, document_type, user_id=user_id, bypass_cache=bypass_cache, project_context=project_context)
+
+    def _batch_prompt(self, section_titles: List[str], document_topic: str, document_type: str) -> str:
+        numbered = "\n".join(f'{i}. "{title}"' for i, title in enumerate(section_titles, 1))
+        if document_type == "docx":
+            task = "Write professional content for each section below: 2-3 detailed paragraphs per section."
+            heading = "Sections"
+        else:  # pptx
+            task = "Create 3-5 bullet points for each PowerPoint slide below."
+            heading = "Slides"
+        return f"""Topic: "{document_topic}"
+
+Task: {task}
+Rules:
+1. Return ONLY a JSON object mapping each number below to that entry's content as one Markdown string, e.g. {{"1": "...", "2": "..."}}.
+2. Include every number exactly once.
+3. Do NOT repeat the titles or use intro phrases.
+4. Use **bold** for key terms.
+
+{heading}:
+{numbered}
+
+JSON:"""
+
+    def _parse_batch(self, text: str, count: int) -> dict:
+        """Valid entries of a batched response as {index: cleaned content}; anything else is left out"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = re.sub(r"^```[a-zA-Z]*\s*|\s*```$", "", text)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        parsed = {}
+        for index in range(count):
+            value = data.get(str(index + 1))
+            if isinstance(value, list) and all(isinstance(item, str) for item in value):
+                # Bullets returned as an array instead of one string
+                value = "\n".join(item if item.lstrip().startswith(("-", "*", "•")) else f"- {item}" for item in value)
+            if not isinstance(value, str):
+                continue
+            content = self._clean_response(value)
+            if content:
+                parsed[index] = content
+        return parsed
+
+    async def _generate_batch(self, section_titles: List[str], document_topic: str, document_type: str, user_id: Optional[str] = None, project_context: str = "") -> dict:
+        prompt = self._batch_prompt(section_titles, document_topic, document_type)
+        try:
+            async with self.limiter.slot(user_id, cost=len(section_titles)):
+                response = await self._complete(
+                    prompt, json_output=True, user_id=user_id, context=self._context_prefix(project_context)
+                )
+            if response.blocked:
+                return {}
+            return self._parse_batch(response.text, len(section_titles))
+        except (LLMCapacityError, LLMCancelledError, LLMUnavailableError):
+            raise
+        except Exception as e:
+            print(f"LLM Batch Generation Error: {str(e)}")
+            return {}
+
+    async def generate_sections_batch(self, section_titles: List[str], document_topic: str, document_type: str, user_id: Optional[str] = None, bypass_cache: bool = False, project_context: str = "") -> list:
+        """Generate several sections of one document with a single structured call
+
+        Returns one entry per title, in order: the content, or the exception raised
+        for that section (like asyncio.gather(return_exceptions=True)). Cached
+        sections are answered from the cache, and entries that are missing or
+        invalid in the batched JSON are retried one at a time through
+        generate_section_content; LLMCapacityError/LLMUnavailableError for the
+        batched call itself are raised. Results are cached under the per-section prompt,
+        so later single-section requests hit them too.
+        """
+        prefix = self._context_prefix(project_context)
+        keys = [self._cache_key(prefix + self._section_prompt(title, document_topic, document_type)) for title in section_titles]
+        results = [None] * len(section_titles)
+        if not bypass_cache:
+            for index, key in enumerate(keys):
+                results[index] = await self.cache.get(key)
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if len(pending) > 1:
+            parsed = await self._generate_batch([section_titles[i] for i in pending], document_topic, document_type, user_id=user_id, project_context=project_context)
+            for position, content in parsed.items():
+                index = pending[position]
+                results[index] = content
+                await self.cache.set(keys[index], content)
+
+        # Sequential so the fallback never holds more than the one limiter slot the batch used
+        for index in range(len(results)):
+            if results[index] is not None:
+                continue
+            try:
+                results[index] = await self.generate_section_content(
+                    section_titles[index], document_topic, document_type, user_id=user_id, bypass_cache=bypass_cache,
+                    project_context=project_context
+                )
+            except Exception as e:
+                results[index] = e
+        return results
+
+    def _refine_prompt(self, current_content: str, refinement_instruction: str) -> str:
+        return f"""Original:
 {current_content}
 
 Instruction: {refinement_instruction}
@@ -98,10 +527,46 @@ Rules:
 2. Keep professional formatting.
 
 Result:"""
-        
-        return await self.generate_content(prompt)
 
-    async def generate_outline(self, topic: str, document_type: str, num_sections: int = 5) -> list[str]:
+    async def refine_content(self, current_content: str, refinement_instruction: str, user_id: Optional[str] = None, bypass_cache: bool = False) -> str:
+        prompt = self._refine_prompt(current_content, refinement_instruction)
+        return await self.generate_content(prompt, user_id=user_id, bypass_cache=bypass_cache)
+
+    def stream_refine_content(self, current_content: str, refinement_instruction: str, user_id: Optional[str] = None, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """Streaming variant of refine_content"""
+        prompt = self._refine_prompt(current_content, refinement_instruction)
+        return self.stream_content(prompt, user_id=user_id, bypass_cache=bypass_cache)
+
+    def _refine_span_prompt(self, before: str, passage: str, after: str, refinement_instruction: str) -> str:
+        return f"""Text before (context only):
+{before.strip() or "(start of section)"}
+
+Passage:
+{passage.strip()}
+
+Text after (context only):
+{after.strip() or "(end of section)"}
+
+Instruction: {refinement_instruction}
+
+Task: Rewrite ONLY the passage following the instruction, so it still fits between the text before and after.
+Rules:
+1. Return ONLY the rewritten passage. Do NOT repeat the text before or after. NO intro or outro.
+2. Keep the passage's formatting (bullets, numbering, **bold**).
+
+Result:"""
+
+    async def refine_span(self, before: str, passage: str, after: str, refinement_instruction: str, user_id: Optional[str] = None, bypass_cache: bool = False) -> str:
+        """refine_content for part of a section: only `passage` and its surrounding context are sent"""
+        prompt = self._refine_span_prompt(before, passage, after, refinement_instruction)
+        return await self.generate_content(prompt, user_id=user_id, bypass_cache=bypass_cache)
+
+    def stream_refine_span(self, before: str, passage: str, after: str, refinement_instruction: str, user_id: Optional[str] = None, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """Streaming variant of refine_span"""
+        prompt = self._refine_span_prompt(before, passage, after, refinement_instruction)
+        return self.stream_content(prompt, user_id=user_id, bypass_cache=bypass_cache)
+
+    async def generate_outline(self, topic: str, document_type: str, num_sections: int = 5, user_id: Optional[str] = None, bypass_cache: bool = False) -> list[str]:
         if document_type == "docx":
             prompt = f"""Create a Word document outline about "{topic}".
 Generate exactly {num_sections} section titles.
@@ -111,7 +576,8 @@ Return ONLY the titles, one per line."""
 Generate exactly {num_sections} slide titles.
 Return ONLY the titles, one per line."""
         
-        response = await self.generate_content(prompt)
+        with llm_lane(OUTLINE):
+            response = await self.generate_content(prompt, user_id=user_id, bypass_cache=bypass_cache)
         
         # Safe parsing
         if not response:
@@ -120,5 +586,26 @@ Return ONLY the titles, one per line."""
         sections = [line.strip() for line in response.split('\n') if line.strip()]
         return sections[:num_sections]
 
-# Global instance
-llm_service = LLMService()
\ No newline at end of file
+_llm_service: Optional[LLMService] = None
+_llm_service_lock = threading.Lock()
+
+
+def get_llm_service() -> LLMService:
+    """The process-wide LLMService (a FastAPI dependency); nothing is configured until it's first needed"""
+    global _llm_service
+    if _llm_service is None:
+        with _llm_service_lock:
+            if _llm_service is None:
+                service = LLMService()
+                lanes = service.limiter.lanes
+                llm_in_flight.set_function(lambda: {(name,): lane.in_flight for name, lane in lanes.items()})
+                llm_queued.set_function(lambda: {(name,): lane.queued for name, lane in lanes.items()})
+                _llm_service = service
+    return _llm_service
+
+
+def __getattr__(name: str):
+    # `from app.services.llm_service import llm_service` keeps working, built on first import of the name
+    if name == "llm_service":
+        return get_llm_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
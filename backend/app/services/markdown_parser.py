@@ -0,0 +1,115 @@
+"""
+Single-pass Markdown tokenizer for section content.
+
+Turns the Markdown Gemini produces into a small block/inline model that the
+.docx and .pptx renderers consume directly:
+
+    Block(kind, runs, level, number)
+      kind   - "paragraph", "heading", "bullet" or "numbered"
+      runs   - list of Run(text, bold, italic)
+      level  - heading depth (1-6) or list nesting level (0-based)
+      number - the item's own number for "numbered" blocks
+
+Each line is classified by one precompiled pattern and its inline emphasis is
+split into runs by a second one, so bold/italic survive as real formatting
+instead of being stripped.
+"""
+from typing import List, NamedTuple, Optional
+import re
+
+MAX_LIST_LEVEL = 2
+
+# One match per line across the whole text (re.M); groups: indent, heading, bullet, number, text
+_LINE_RE = re.compile(
+    r"^([ \t]*)"
+    r"(?:(#{1,6})[ \t]+|([-*+•])[ \t]+|(\d{1,3})[.)][ \t]+)?"
+    r"([^\n]*)",
+    re.M,
+)
+_RULE_RE = re.compile(r"([-*_])(?:[ \t]*\1){2,}")
+# Emphasis alternatives in priority order; lastindex picks the flags below
+_INLINE_RE = re.compile(
+    r"\*\*\*(.+?)\*\*\*"
+    r"|\*\*(.+?)\*\*"
+    r"|__(.+?)__"
+    r"|\*(?=\S)(.+?)(?<=\S)\*"
+    r"|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)"
+)
+_INLINE_FLAGS = {1: (True, True), 2: (True, False), 3: (True, False), 4: (False, True), 5: (False, True)}
+
+
+class Run(NamedTuple):
+    text: str
+    bold: bool = False
+    italic: bool = False
+
+
+class Block(NamedTuple):
+    kind: str
+    runs: List[Run]
+    level: int = 0
+    number: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(run.text for run in self.runs)
+
+
+def parse_inline(text: str) -> List[Run]:
+    """Split a line into runs, turning **bold**, *italic* and ***both*** into flags"""
+    if "*" not in text and "_" not in text:
+        return [Run(text)]
+    runs = []
+    position = 0
+    for match in _INLINE_RE.finditer(text):
+        start = match.start()
+        if start > position:
+            runs.append(Run(text[position:start]))
+        index = match.lastindex
+        bold, italic = _INLINE_FLAGS[index]
+        runs.append(Run(match.group(index), bold, italic))
+        position = match.end()
+    if position < len(text):
+        runs.append(Run(text[position:]))
+    return runs
+
+
+def parse_markdown(text: str) -> List[Block]:
+    """Parse section Markdown into blocks in one pass over the text"""
+    blocks = []
+    if not text:
+        return blocks
+
+    indent_stack = []  # indentation widths of the currently open list levels
+    for indent, heading, bullet, number, content in _LINE_RE.findall(text):
+        content = content.rstrip()
+        if not content:
+            continue
+
+        if heading:
+            indent_stack.clear()
+            blocks.append(Block("heading", parse_inline(content), len(heading)))
+            continue
+
+        if not (bullet or number):
+            if content[0] in "-*_" and _RULE_RE.fullmatch(content):
+                continue  # horizontal rule
+            indent_stack.clear()
+            blocks.append(Block("paragraph", parse_inline(content)))
+            continue
+
+        if bullet and content[0] in "-*_" and _RULE_RE.fullmatch(bullet + content):
+            continue  # "- - -" is a rule, not a bullet
+        width = len(indent.expandtabs(4)) if indent else 0
+        while indent_stack and width < indent_stack[-1]:
+            indent_stack.pop()
+        if not indent_stack or width > indent_stack[-1]:
+            indent_stack.append(width)
+        level = min(len(indent_stack) - 1, MAX_LIST_LEVEL)
+
+        if bullet:
+            blocks.append(Block("bullet", parse_inline(content), level))
+        else:
+            blocks.append(Block("numbered", parse_inline(content), level, int(number)))
+
+    return blocks
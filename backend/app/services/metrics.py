@@ -0,0 +1,296 @@
+"""
+In-process metrics in the Prometheus text format, plus per-request stage timing.
+
+Counters, gauges and histograms live in one registry and are rendered by
+GET /metrics. Code that does a distinct kind of work wraps it in
+`timed(stage, ...)`: the duration goes into that stage's histogram and into
+the current request's RequestTiming, which MetricsMiddleware turns into a
+Server-Timing header and a per-endpoint stage histogram.
+
+Stages: auth, db, queue (waiting for a model call slot), llm, markdown, render. Durations of a stage are summed per
+request, so stages that run concurrently (e.g. a batch of LLM calls) can add
+up to more than the request's wall time.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(key, self._render_value(value)) for key, value in self._values.items()]
+
+    def _render_value(self, value):
+        return value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.samples():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; set_function() samples it at scrape time instead"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], dict]] = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], dict]):
+        """`function()` returns {label values tuple: value}; () for an unlabelled gauge"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            return list(self._function().items())
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_value(self, value):
+        counts, total, count = value
+        return list(counts), total, count
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in self.samples():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+registry = Registry()
+
+# --- HTTP ---
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time until the response body was sent", ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ("method",))
+http_errors = registry.counter(
+    "http_errors_total", "Error responses and unhandled exceptions by route and type", ("route", "type"))
+request_stage_duration = registry.histogram(
+    "http_request_stage_duration_seconds", "Time a request spent in each stage (summed per request)",
+    ("route", "stage"))
+
+# --- Stages ---
+auth_duration = registry.histogram("auth_verify_duration_seconds", "Access token verification", ("mode",))
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Supabase round trips by table (or rpc/function) and HTTP method", ("query", "method"))
+db_errors = registry.counter("db_errors_total", "Failed Supabase queries by exception type", ("query", "type"))
+llm_call_duration = registry.histogram(
+    "llm_call_duration_seconds", "Model calls including retries (streams: until the first chunk)", ("model", "kind"))
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens reported by the model, by direction (prompt/completion, and cached: the part of"
+    " the prompt served from a prompt cache)", ("model", "direction"))
+llm_errors = registry.counter("llm_errors_total", "Failed model calls by exception type", ("model", "type"))
+llm_in_flight = registry.gauge("llm_in_flight", "Model calls holding a scheduler slot, by lane", ("lane",))
+llm_queued = registry.gauge("llm_queued", "Model calls waiting for a scheduler slot, by lane", ("lane",))
+llm_queue_duration = registry.histogram(
+    "llm_queue_duration_seconds", "Time model calls waited for a scheduler slot, by lane", ("lane",))
+llm_shed = registry.counter(
+    "llm_shed_total", "Model calls refused or dropped before getting a slot, by lane and reason"
+    " (user, queue_full, timeout, disconnected)", ("lane", "reason"))
+markdown_duration = registry.histogram(
+    "markdown_duration_seconds", "Cleaning model output", ("kind",), buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+render_duration = registry.histogram(
+    "render_duration_seconds", "Document renders including queueing for a worker", ("type", "mode"))
+
+
+class RequestTiming:
+    """Stage durations of one request: {stage: [seconds, count]}, plus model tokens used"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, stage: str, seconds: float):
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def _describe(self, stage: str, count: int) -> str:
+        notes = [f"{count}x"] if count > 1 else []
+        if stage == "llm" and (self.prompt_tokens or self.completion_tokens):
+            notes.append(f"{self.prompt_tokens}+{self.completion_tokens} tokens")
+        return f';desc="{" ".join(notes)}"' if notes else ""
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: each stage so far, then the total"""
+        parts = [
+            f"{stage};dur={seconds * 1000:.1f}" + self._describe(stage, count)
+            for stage, (seconds, count) in self.stages.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_request_timing: ContextVar = ContextVar("request_timing", default=None)
+
+
+def begin_request_timing() -> RequestTiming:
+    timing = RequestTiming()
+    _request_timing.set(timing)
+    return timing
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _request_timing.get()
+
+
+def count_tokens(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+    """Record a model call's token usage globally and against the current request"""
+    llm_tokens.inc(prompt_tokens, model=model, direction="prompt")
+    llm_tokens.inc(completion_tokens, model=model, direction="completion")
+    if cached_tokens:
+        llm_tokens.inc(cached_tokens, model=model, direction="cached")
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.prompt_tokens += prompt_tokens
+        timing.completion_tokens += completion_tokens
+
+
+@contextmanager
+def timed(stage: str, histogram: Optional[Histogram] = None, errors: Optional[Counter] = None, **labels):
+    """Time the block as `stage` of the current request, observing `histogram` with `labels`
+
+    Exceptions raised by the block are counted in `errors` (labelled with their type).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if errors is not None and isinstance(e, Exception):
+            errors.inc(type=type(e).__name__, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        timing = _request_timing.get()
+        if timing is not None:
+            timing.add(stage, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
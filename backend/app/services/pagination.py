@@ -0,0 +1,129 @@
+from fastapi import HTTPException, Response, status
+from fastapi.responses import JSONResponse
+from app.services.export_cache import etag_matches
+from datetime import datetime
+from typing import Optional
+import base64
+import hashlib
+import json
+import os
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Largest page a listing endpoint will return
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", "200"))
+
+PROJECT_FIELDS = ("id", "user_id", "title", "type", "status", "created_at", "updated_at")
+SECTION_FIELDS = (
+    "id", "project_id", "title", "content", "order_index", "version", "created_at", "updated_at", "comments"
+)
+# Sections without their content bodies or comments
+SECTION_SUMMARY_FIELDS = ("id", "project_id", "title", "order_index", "version", "created_at", "updated_at")
+
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> Optional[list]:
+    """Parse a `fields=a,b,c` projection; None means every column"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})"
+        )
+    return requested
+
+
+def _timestamp(value) -> str:
+    if not isinstance(value, str):
+        raise ValueError(value)
+    datetime.fromisoformat(value)
+    return value
+
+
+def _uuid(value) -> str:
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return str(uuid.UUID(value))
+
+
+def _integer(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(value)
+    return value
+
+
+# How each cursor key is checked and normalized before it goes into a filter
+CURSOR_TYPES = {"created_at": _timestamp, "id": _uuid, "order_index": _integer}
+
+
+def encode_cursor(row: dict, keys: tuple) -> str:
+    payload = json.dumps([row[k] for k in keys], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], keys: tuple) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    try:
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(values)
+        return [CURSOR_TYPES[key](value) for key, value in zip(keys, values)]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _quote(value) -> str:
+    """PostgREST double-quoted filter value"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def keyset_filter(keys: tuple, values: list, descending: bool = False) -> str:
+    """PostgREST `or` filter for rows strictly after (key1, key2) in the listing order
+
+    `values` come from decode_cursor, which has checked their types; they are quoted all the same.
+    """
+    (first, second), (first_value, second_value) = keys, (_quote(v) for v in values)
+    op = "lt" if descending else "gt"
+    return (
+        f'{first}.{op}.{first_value},'
+        f'and({first}.eq.{first_value},{second}.{op}.{second_value})'
+    )
+
+
+def paginate(rows: list, limit: Optional[int], keys: tuple):
+    """Trim a limit+1 fetch to one page and return (page, next_cursor)"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1], keys)
+
+
+def project_rows(rows: list, fields: Optional[list]) -> list:
+    """Drop columns fetched only for the cursor"""
+    if fields is None:
+        return rows
+    return [{k: row.get(k) for k in fields} for row in rows]
+
+
+def listing_response(rows: list, if_none_match: Optional[str], next_cursor: Optional[str] = None) -> Response:
+    """JSON listing with a weak ETag over the body; 304 when the client's copy is current"""
+    body = json.dumps(rows, separators=(",", ":"), default=str).encode()
+    digest = hashlib.sha256(body)
+    if next_cursor:
+        digest.update(next_cursor.encode())
+    etag = f'"{digest.hexdigest()[:32]}"'
+    headers = {"ETag": f"W/{etag}", "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=JSONResponse.media_type, headers=headers)
@@ -0,0 +1,217 @@
+"""
+Template-cloned .pptx rendering.
+
+DocGenService.create_pptx opens a fresh Presentation per export and builds
+every slide through python-pptx's placeholder API. SlideTemplate does the
+python-pptx work once per template and process: it opens the (optionally
+branded, or per-project uploaded) template, drops any sample slides, adds one
+title slide and one title-and-bullets prototype with marker text, and keeps
+the saved package parts. A render then only fills text into copies of the
+prototype slide XML and writes the zip: no object tree, no per-slide layout
+lookups.
+
+Templates are cached per process by path and modification time, so a
+re-uploaded template is picked up on the next render.
+"""
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional
+from xml.sax.saxutils import escape
+import os
+import re
+import threading
+import zipfile
+from dotenv import load_dotenv
+
+from app.services.markdown_parser import parse_markdown
+
+load_dotenv()
+
+# Branded default template (.pptx); python-pptx's blank template when unset
+PPTX_TEMPLATE_PATH = os.environ.get("PPTX_TEMPLATE_PATH", "")
+# Parsed templates kept per render process (the default plus recent per-project ones)
+PPTX_TEMPLATE_CACHE_SIZE = int(os.environ.get("PPTX_TEMPLATE_CACHE_SIZE", "8"))
+
+TITLE_LAYOUT = 0  # title + subtitle
+CONTENT_LAYOUT = 1  # title + body
+SUBTITLE_TEXT = "Generated by NexWrit"
+PLACEHOLDER_TEXT = "[No content generated yet]"
+
+_TITLE_MARKER = "NEXWRIT_TITLE_MARKER"
+_BODY_MARKER = "NEXWRIT_BODY_MARKER"
+
+_REL_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+_CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+_SLIDE_REL_RE = re.compile(r'<Relationship [^>]*Type="' + re.escape(_REL_SLIDE) + r'"[^>]*/>')
+_SLIDE_OVERRIDE_RE = re.compile(r'<Override [^>]*ContentType="' + re.escape(_CT_SLIDE) + r'"[^>]*/>')
+_SLIDE_ID_LIST_RE = re.compile(r"<p:sldIdLst>.*?</p:sldIdLst>|<p:sldIdLst/>", re.S)
+_REL_ID_RE = re.compile(r'Id="rId(\d+)"')
+# Characters XML 1.0 can't carry (python-pptx refuses them; here they're dropped)
+_INVALID_XML_RE = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+class TemplateError(ValueError):
+    """The file can't be used as a slide template"""
+
+
+def _text(text: str) -> str:
+    return escape(_INVALID_XML_RE.sub("", text).replace("\n", " "))
+
+
+def _run(text: str, bold: bool = False, italic: bool = False) -> str:
+    if not text:
+        return ""
+    flags = (' b="1"' if bold else "") + (' i="1"' if italic else "")
+    return f'<a:r><a:rPr lang="en-US"{flags} dirty="0"/><a:t>{_text(text)}</a:t></a:r>'
+
+
+def _paragraphs(content: Optional[str]) -> str:
+    """Body paragraphs for a section, styled like DocGenService.create_pptx"""
+    if not content:
+        return f"<a:p>{_run(PLACEHOLDER_TEXT)}</a:p>"
+    paragraphs = []
+    for block in parse_markdown(content):
+        heading = block.kind == "heading"
+        runs = _run(f"{block.number}. ") if block.kind == "numbered" else ""
+        runs += "".join(_run(run.text, run.bold or heading, run.italic) for run in block.runs)
+        properties = f'<a:pPr lvl="{block.level}"/>' if block.level and not heading else ""
+        paragraphs.append(f"<a:p>{properties}{runs}</a:p>")
+    return "".join(paragraphs) or "<a:p/>"
+
+
+def _split_paragraph(xml: str, marker: str) -> tuple:
+    """(xml before, xml after) the <a:p> element that contains `marker`"""
+    at = xml.index(marker)
+    start = max(xml.rfind("<a:p>", 0, at), xml.rfind("<a:p ", 0, at))
+    end = xml.index("</a:p>", at) + len("</a:p>")
+    return xml[:start], xml[end:]
+
+
+def _load_presentation(source):
+    from pptx import Presentation
+    try:
+        prs = Presentation(source)
+    except Exception as e:
+        raise TemplateError(f"Not a readable .pptx file: {str(e)}")
+    layouts = prs.slide_layouts
+    for index in (TITLE_LAYOUT, CONTENT_LAYOUT):
+        if len(layouts) <= index:
+            raise TemplateError("Template needs a title layout and a title-and-content layout")
+        placeholders = {p.placeholder_format.idx for p in layouts[index].placeholders}
+        if not {0, 1} <= placeholders:
+            raise TemplateError(f"Layout {index + 1} ({layouts[index].name}) needs a title and a body placeholder")
+    return prs
+
+
+def validate_template(data: bytes):
+    """Raise TemplateError unless `data` is a .pptx with the layouts rendering needs"""
+    _load_presentation(BytesIO(data))
+
+
+class SlideTemplate:
+    """A parsed template: static package parts plus title and content slide prototypes"""
+
+    def __init__(self, path: Optional[str] = None):
+        from pptx.util import Inches
+
+        prs = _load_presentation(path or None)
+        if not path:
+            # Same page size as DocGenService.create_pptx
+            prs.slide_width = Inches(10)
+            prs.slide_height = Inches(7.5)
+
+        # A branded deck may ship sample slides; only its masters and layouts are kept
+        slide_ids = prs.slides._sldIdLst
+        for slide_id in list(slide_ids):
+            prs.part.drop_rel(slide_id.rId)
+            slide_ids.remove(slide_id)
+
+        title_slide = prs.slides.add_slide(prs.slide_layouts[TITLE_LAYOUT])
+        title_slide.shapes.title.text = _TITLE_MARKER
+        title_slide.placeholders[1].text = SUBTITLE_TEXT
+        content_slide = prs.slides.add_slide(prs.slide_layouts[CONTENT_LAYOUT])
+        content_slide.shapes.title.text = _TITLE_MARKER
+        content_slide.placeholders[1].text_frame.text = _BODY_MARKER
+
+        buffer = BytesIO()
+        prs.save(buffer)
+        title_name = str(title_slide.part.partname).lstrip("/")
+        content_name = str(content_slide.part.partname).lstrip("/")
+
+        with zipfile.ZipFile(buffer) as package:
+            parts = {info.filename: package.read(info) for info in package.infolist()}
+
+        def rels_of(name):
+            folder, file = name.rsplit("/", 1)
+            return parts.pop(f"{folder}/_rels/{file}.rels")
+
+        self._title_slide = parts.pop(title_name).decode("utf-8")
+        self._title_rels = rels_of(title_name)
+        content = parts.pop(content_name).decode("utf-8")
+        self._content_rels = rels_of(content_name)
+        before_title, after_title = content.split(_TITLE_MARKER)
+        self._content_head = before_title
+        self._content_middle, self._content_tail = _split_paragraph(after_title, _BODY_MARKER)
+
+        self._presentation = parts.pop("ppt/presentation.xml").decode("utf-8")
+        self._presentation_rels = _SLIDE_REL_RE.sub("", parts.pop("ppt/_rels/presentation.xml.rels").decode("utf-8"))
+        self._content_types = _SLIDE_OVERRIDE_RE.sub("", parts.pop("[Content_Types].xml").decode("utf-8"))
+        self._first_rel_id = max(int(n) for n in _REL_ID_RE.findall(self._presentation_rels)) + 1
+        self._parts = parts
+
+    def _content_slide(self, section: dict) -> bytes:
+        return (
+            self._content_head + _text(section["title"]) + self._content_middle
+            + _paragraphs(section.get("content")) + self._content_tail
+        ).encode("utf-8")
+
+    def render(self, project_title: str, sections: list, output=None):
+        """Write the deck to `output` (path or binary file); returns BytesIO when no output is given"""
+        target = output if output is not None else BytesIO()
+        slide_ids, rels, overrides = [], [], []
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as package:
+            for number in range(1, len(sections) + 2):
+                rel_id = f"rId{self._first_rel_id + number - 1}"
+                slide_ids.append(f'<p:sldId id="{255 + number}" r:id="{rel_id}"/>')
+                rels.append(f'<Relationship Id="{rel_id}" Type="{_REL_SLIDE}" Target="slides/slide{number}.xml"/>')
+                overrides.append(f'<Override PartName="/ppt/slides/slide{number}.xml" ContentType="{_CT_SLIDE}"/>')
+
+            package.writestr("[Content_Types].xml", self._content_types.replace("</Types>", "".join(overrides) + "</Types>"))
+            for name, data in self._parts.items():
+                package.writestr(name, data)
+            package.writestr("ppt/presentation.xml", _SLIDE_ID_LIST_RE.sub(
+                lambda _: "<p:sldIdLst>" + "".join(slide_ids) + "</p:sldIdLst>", self._presentation, count=1
+            ))
+            package.writestr(
+                "ppt/_rels/presentation.xml.rels",
+                self._presentation_rels.replace("</Relationships>", "".join(rels) + "</Relationships>")
+            )
+
+            package.writestr("ppt/slides/slide1.xml", self._title_slide.replace(_TITLE_MARKER, _text(project_title)))
+            package.writestr("ppt/slides/_rels/slide1.xml.rels", self._title_rels)
+            for number, section in enumerate(sections, start=2):
+                package.writestr(f"ppt/slides/slide{number}.xml", self._content_slide(section))
+                package.writestr(f"ppt/slides/_rels/slide{number}.xml.rels", self._content_rels)
+
+        if output is None:
+            target.seek(0)
+        return target
+
+
+_templates = OrderedDict()  # (path, mtime, size) -> SlideTemplate
+_templates_lock = threading.Lock()
+
+
+def get_template(path: Optional[str] = None) -> SlideTemplate:
+    """The parsed template at `path` (default: PPTX_TEMPLATE_PATH), built once per process"""
+    path = path or PPTX_TEMPLATE_PATH or None
+    stat = os.stat(path) if path else None
+    key = (path, stat.st_mtime_ns, stat.st_size) if stat else (None, 0, 0)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = SlideTemplate(path)
+            while len(_templates) > PPTX_TEMPLATE_CACHE_SIZE:
+                _templates.popitem(last=False)
+        _templates.move_to_end(key)
+    return template
@@ -0,0 +1,115 @@
+"""
+Project context digest shared by the section prompts of a project.
+
+Section prompts only name the project and the section, so sections written
+independently repeat each other. Sending the whole outline and every
+section's text along would multiply the tokens per call. The digest is the
+compact middle ground: every section in order, each with a one-line
+extractive summary of what it already says (its opening text with the
+Markdown stripped).
+
+Summaries are stored per project in projects.context_digest
+(sql/project_context.sql), keyed by section id along with the version they
+were taken from. When a prompt needs the digest, only sections whose version
+changed since are read and summarized again, and those entries are merged
+back. Titles and order come from the live section list, so renames, moves
+and deletes show up immediately.
+
+The rendered digest goes first in the prompt and stays byte-identical for
+every section of the project until something changes. That shared prefix is
+what provider prompt caching keys on (LLMProvider.generate_with_context).
+"""
+from typing import Optional
+import os
+from dotenv import load_dotenv
+
+from app.services.markdown_parser import parse_markdown
+from app.services.repository import repository
+
+load_dotenv()
+
+PROJECT_CONTEXT_ENABLED = os.environ.get("PROJECT_CONTEXT_ENABLED", "true").lower() == "true"
+# Longest summary kept per section, and the most the whole digest may take up. The cap
+# (~5,000 tokens) lets large projects reach LLM_CONTEXT_CACHE_MIN_TOKENS, where the digest
+# is cached by the provider instead of being sent with every prompt.
+PROJECT_CONTEXT_SUMMARY_CHARS = int(os.environ.get("PROJECT_CONTEXT_SUMMARY_CHARS", "200"))
+PROJECT_CONTEXT_MAX_CHARS = int(os.environ.get("PROJECT_CONTEXT_MAX_CHARS", "20000"))
+
+NOT_WRITTEN = "(not written yet)"
+
+
+def _shorten(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    if limit <= 1:
+        return ""
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit - 1].rstrip(" ,;:") + "…"
+
+
+def summarize(content: Optional[str], limit: int = PROJECT_CONTEXT_SUMMARY_CHARS) -> str:
+    """The opening text of a section as one line of plain text, at most `limit` characters"""
+    if not content:
+        return ""
+    text = " ".join(block.text.strip() for block in parse_markdown(content) if block.text.strip())
+    return _shorten(" ".join(text.split()), limit)
+
+
+def render_digest(project: dict, sections: list, entries: dict, max_chars: int = PROJECT_CONTEXT_MAX_CHARS) -> str:
+    """The digest text: the document, then every section's title and summary in order
+
+    Summaries are trimmed evenly when the whole list wouldn't fit in max_chars.
+    """
+    kind = "Word document" if project.get("type") == "docx" else "PowerPoint presentation"
+    header = [f'{kind}: "{project.get("title", "")}"', "Sections (title: what it already covers):"]
+    lines = [f"{number}. {section['title']}" for number, section in enumerate(sections, start=1)]
+    room = max_chars - sum(len(line) for line in header + lines) - 4 * len(lines)
+    per_section = max(0, min(PROJECT_CONTEXT_SUMMARY_CHARS, room // max(1, len(lines))))
+
+    for index, section in enumerate(sections):
+        summary = (entries.get(section["id"]) or {}).get("summary")
+        # Written sections whose summaries don't fit are listed by title alone
+        summary = _shorten(summary, per_section) if summary else NOT_WRITTEN
+        if summary:
+            lines[index] += f": {summary}"
+    return "\n".join(header + lines)
+
+
+async def project_digest(project: dict, sections: Optional[list] = None) -> str:
+    """The context digest of a project row, refreshing stored summaries that are out of date
+
+    Pass `sections` when they are already loaded with their content (a project
+    job); otherwise the section list is read without content, plus the content
+    of changed sections only. Returns "" when digests are disabled.
+    """
+    if not PROJECT_CONTEXT_ENABLED:
+        return ""
+    stored = project.get("context_digest") or {}
+    if sections is None:
+        sections = await repository.list_section_outline(project["id"])
+
+    stale = [
+        section for section in sections
+        if (stored.get(section["id"]) or {}).get("version") != (section.get("version") or 0)
+    ]
+    current_ids = {section["id"] for section in sections}
+    removed = [section_id for section_id in stored if section_id not in current_ids]
+
+    if stale or removed:
+        if all("content" in section for section in stale):
+            rows = stale
+        else:
+            rows = await repository.get_section_contents(project["id"], [section["id"] for section in stale])
+        updates = {
+            row["id"]: {"version": row.get("version") or 0, "summary": summarize(row.get("content"))}
+            for row in rows
+        }
+        stored = {**{k: v for k, v in stored.items() if k not in removed}, **updates}
+        project["context_digest"] = stored
+        try:
+            await repository.merge_context_digest(project["id"], project["user_id"], updates, removed)
+        except Exception as e:
+            # The digest is recomputed next time; generation shouldn't fail over it
+            print(f"Context digest save error: {str(e)}")
+
+    return render_digest(project, sections, stored)
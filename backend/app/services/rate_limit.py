@@ -0,0 +1,295 @@
+"""
+Request rate limits and daily model token budgets for the routes that call the LLM.
+
+Two token buckets are checked per request: one per user and one shared by
+everyone, each refilled continuously at its per-minute rate up to its burst
+size. Prompt and completion tokens reported by the model are added up per
+user and globally for the current UTC day; once a budget is spent, further
+requests are refused until midnight UTC. Budgets are checked when a request
+arrives, so calls already running may take a user slightly past the limit.
+
+The in-memory backend keeps state per process. With several API workers, set
+RATE_LIMIT_BACKEND to a shared RateLimitBackend (e.g. one on Redis) so the
+limits apply across all of them.
+"""
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.security import HTTPAuthorizationCredentials
+from importlib import import_module
+from typing import Optional
+import math
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+from app.middleware.auth import security, verify_token
+from app.services.llm_limiter import watch_client
+from app.services.metrics import registry
+
+load_dotenv()
+
+# Request buckets: sustained requests per minute and burst size (a rate of 0 disables the bucket)
+RATE_LIMIT_USER_PER_MINUTE = float(os.environ.get("RATE_LIMIT_USER_PER_MINUTE", "20"))
+RATE_LIMIT_USER_BURST = int(os.environ.get("RATE_LIMIT_USER_BURST", "10"))
+RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.environ.get("RATE_LIMIT_GLOBAL_PER_MINUTE", "600"))
+RATE_LIMIT_GLOBAL_BURST = int(os.environ.get("RATE_LIMIT_GLOBAL_BURST", "100"))
+
+# Daily model token budgets per UTC day (0 = unlimited)
+LLM_USER_DAILY_PROMPT_TOKENS = int(os.environ.get("LLM_USER_DAILY_PROMPT_TOKENS", "2000000"))
+LLM_USER_DAILY_COMPLETION_TOKENS = int(os.environ.get("LLM_USER_DAILY_COMPLETION_TOKENS", "500000"))
+LLM_GLOBAL_DAILY_PROMPT_TOKENS = int(os.environ.get("LLM_GLOBAL_DAILY_PROMPT_TOKENS", "0"))
+LLM_GLOBAL_DAILY_COMPLETION_TOKENS = int(os.environ.get("LLM_GLOBAL_DAILY_COMPLETION_TOKENS", "0"))
+
+# "memory" or "package.module:ClassName" for a shared RateLimitBackend subclass
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+
+GLOBAL_KEY = "global"
+
+rate_limited = registry.counter(
+    "rate_limited_total", "Requests refused by the rate limiter, by reason", ("reason",))
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def _seconds_until_tomorrow() -> float:
+    return 86400 - time.time() % 86400
+
+
+def estimate_tokens(characters: int) -> int:
+    """Rough token count of text the model didn't report usage for (streamed answers)"""
+    return max(1, characters // 4) if characters else 0
+
+
+class RateLimitExceeded(HTTPException):
+    """429 for a spent request bucket or daily token budget, with Retry-After"""
+
+    def __init__(self, detail: str, retry_after: float, headers: Optional[dict] = None):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={**(headers or {}), "Retry-After": str(self.retry_after)},
+        )
+
+
+class RateLimitBackend:
+    """Where bucket levels and daily token usage are kept
+
+    take() must be atomic per key. Usage is stored per (key, day); entries of
+    past days are never read again and can be expired.
+    """
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> tuple:
+        """Spend `cost` from the bucket at `key`, refilled at `rate` per second up to `burst`
+
+        Returns (True, tokens left) or, when there isn't enough, (False, seconds until there is).
+        A negative cost gives tokens back, never filling the bucket past `burst`.
+        """
+        raise NotImplementedError
+
+    async def add_usage(self, key: str, day: str, prompt_tokens: int, completion_tokens: int):
+        raise NotImplementedError
+
+    async def usage(self, key: str, day: str) -> tuple:
+        """(prompt tokens, completion tokens) used by `key` on `day`"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets and usage in this process's memory"""
+
+    def __init__(self, max_buckets: int = 10000):
+        self.max_buckets = max_buckets
+        self._buckets = {}  # key -> (tokens, monotonic time of last update, rate, burst)
+        self._usage = {}  # key -> [prompt, completion] for self._day
+        self._day = None
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> tuple:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now, rate, burst)
+                return False, (cost - tokens) / rate
+            tokens = min(burst, tokens - cost)
+            self._buckets[key] = (tokens, now, rate, burst)
+            if len(self._buckets) > self.max_buckets:
+                self._drop_full(now)
+            return True, tokens
+
+    def _drop_full(self, now: float):
+        # A bucket that has refilled completely is the same as one never used
+        for key, (tokens, updated, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+
+    def _usage_for(self, day: str) -> dict:
+        if day != self._day:
+            self._day = day
+            self._usage = {}
+        return self._usage
+
+    async def add_usage(self, key: str, day: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            entry = self._usage_for(day).setdefault(key, [0, 0])
+            entry[0] += prompt_tokens
+            entry[1] += completion_tokens
+
+    async def usage(self, key: str, day: str) -> tuple:
+        with self._lock:
+            entry = self._usage_for(day).get(key)
+        return tuple(entry) if entry else (0, 0)
+
+
+class RateLimiter:
+    """Per-user and global request buckets plus daily prompt/completion token budgets"""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        user_per_minute: float = RATE_LIMIT_USER_PER_MINUTE,
+        user_burst: int = RATE_LIMIT_USER_BURST,
+        global_per_minute: float = RATE_LIMIT_GLOBAL_PER_MINUTE,
+        global_burst: int = RATE_LIMIT_GLOBAL_BURST,
+        user_prompt_budget: int = LLM_USER_DAILY_PROMPT_TOKENS,
+        user_completion_budget: int = LLM_USER_DAILY_COMPLETION_TOKENS,
+        global_prompt_budget: int = LLM_GLOBAL_DAILY_PROMPT_TOKENS,
+        global_completion_budget: int = LLM_GLOBAL_DAILY_COMPLETION_TOKENS,
+    ):
+        self.backend = backend
+        self.user_rate = user_per_minute / 60
+        self.user_burst = max(1, user_burst)
+        self.global_rate = global_per_minute / 60
+        self.global_burst = max(1, global_burst)
+        self.user_budget = (user_prompt_budget, user_completion_budget)
+        self.global_budget = (global_prompt_budget, global_completion_budget)
+        self.rejected = {"user": 0, "global": 0, "budget": 0}
+
+    def stats(self) -> dict:
+        return {
+            "user_per_minute": self.user_rate * 60,
+            "user_burst": self.user_burst,
+            "global_per_minute": self.global_rate * 60,
+            "global_burst": self.global_burst,
+            "rejected": dict(self.rejected),
+        }
+
+    def _reject(self, reason: str, detail: str, retry_after: float, headers: dict):
+        self.rejected[reason] += 1
+        rate_limited.inc(reason=reason)
+        raise RateLimitExceeded(detail, retry_after, headers)
+
+    async def _remaining_budget(self, key: str, day: str, budget: tuple) -> Optional[tuple]:
+        """(prompt, completion) tokens left today, None when neither budget is set"""
+        if not any(budget):
+            return None
+        used = await self.backend.usage(key, day)
+        return tuple(max(0, limit - spent) if limit else None for limit, spent in zip(budget, used))
+
+    async def check(self, user_id: str) -> dict:
+        """Admit one request for `user_id` or raise RateLimitExceeded; returns the headers to send"""
+        headers = {}
+        day = _today()
+
+        # Budgets first: a request refused for its budget shouldn't also spend a bucket token
+        user_left = await self._remaining_budget(f"user:{user_id}", day, self.user_budget)
+        if user_left is not None:
+            for direction, left in zip(("Prompt", "Completion"), user_left):
+                if left is not None:
+                    headers[f"X-Token-Budget-{direction}-Remaining"] = str(left)
+            if 0 in user_left:
+                self._reject("budget", "Daily AI usage limit reached", _seconds_until_tomorrow(), headers)
+        global_left = await self._remaining_budget(GLOBAL_KEY, day, self.global_budget)
+        if global_left is not None and 0 in global_left:
+            self._reject("budget", "AI service usage limit reached for today", _seconds_until_tomorrow(), headers)
+
+        if self.user_rate > 0:
+            allowed, value = await self.backend.take(f"user:{user_id}", self.user_rate, self.user_burst)
+            headers["X-RateLimit-Limit"] = str(self.user_burst)
+            headers["X-RateLimit-Remaining"] = str(int(value) if allowed else 0)
+            if not allowed:
+                self._reject("user", "Too many AI requests, please slow down", value, headers)
+        if self.global_rate > 0:
+            allowed, value = await self.backend.take(GLOBAL_KEY, self.global_rate, self.global_burst)
+            if not allowed:
+                self._reject("global", "AI service is busy, please retry shortly", value, headers)
+        return headers
+
+    async def refund(self, user_id: str):
+        """Give back the bucket tokens check() took for a request that was refused before calling the model"""
+        try:
+            if self.user_rate > 0:
+                await self.backend.take(f"user:{user_id}", self.user_rate, self.user_burst, cost=-1)
+            if self.global_rate > 0:
+                await self.backend.take(GLOBAL_KEY, self.global_rate, self.global_burst, cost=-1)
+        except Exception as e:
+            print(f"Rate limit refund error: {str(e)}")
+
+    async def record(self, user_id: Optional[str], prompt_tokens: int, completion_tokens: int):
+        """Add a model call's tokens to today's usage of the user and of everyone"""
+        if not prompt_tokens and not completion_tokens:
+            return
+        day = _today()
+        try:
+            if user_id is not None:
+                await self.backend.add_usage(f"user:{user_id}", day, prompt_tokens, completion_tokens)
+            await self.backend.add_usage(GLOBAL_KEY, day, prompt_tokens, completion_tokens)
+        except Exception as e:
+            # Losing some accounting beats failing a call that already succeeded
+            print(f"Rate limit usage error: {str(e)}")
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitBackend()
+    module_name, _, class_name = RATE_LIMIT_BACKEND.partition(":")
+    return getattr(import_module(module_name), class_name)()
+
+# Global instance
+rate_limiter = RateLimiter(get_rate_limit_backend())
+
+
+async def rate_limited_user(
+    request: Request,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+):
+    """FastAPI dependency for routes that call the model: the verified user, once the limits admit the request
+
+    A request the route refuses with a 4xx (section not found, not the user's,
+    stale version) gets its bucket tokens back, so it doesn't use up the quota.
+    """
+    user = await verify_token(credentials)
+    await admit_model_request(request, response, user)
+    try:
+        yield user
+    except HTTPException as e:
+        if 400 <= e.status_code < 500 and getattr(request.state, "rate_limit_charged", False):
+            await rate_limiter.refund(user.id)
+        raise
+
+
+async def admit_model_request(request: Request, response: Response, user):
+    """Apply the limits to a request that is about to call the model, or raise RateLimitExceeded
+
+    For routes that only sometimes call the model; the rest use
+    rate_limited_user. The limit headers go on the response; routes that build
+    their own (Server-Sent Events) find them on request.state.rate_limit_headers.
+    Model calls the request leaves queued are dropped if the client disconnects.
+    """
+    try:
+        headers = await rate_limiter.check(user.id)
+        request.state.rate_limit_charged = True
+    except HTTPException:
+        raise
+    except Exception as e:
+        # A shared backend outage shouldn't take generation down with it
+        print(f"Rate limit check error: {str(e)}")
+        headers = {}
+    response.headers.update(headers)
+    request.state.rate_limit_headers = headers
+    watch_client(request.is_disconnected)
@@ -0,0 +1,218 @@
+from fastapi import HTTPException, status
+from app.services.docx_stream import preload_template, sections_xml, write_docx
+from app.services.metrics import render_duration, timed
+from app.services.pptx_template import get_template
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Optional
+import asyncio
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker processes for python-docx/python-pptx rendering (0 = render on the event loop thread)
+EXPORT_RENDER_WORKERS = int(os.environ.get("EXPORT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXPORT_RENDER_TIMEOUT = float(os.environ.get("EXPORT_RENDER_TIMEOUT", "60"))
+# Renders waiting or running before new exports are rejected with 503
+EXPORT_RENDER_MAX_QUEUE = int(os.environ.get("EXPORT_RENDER_MAX_QUEUE", "16"))
+EXPORT_RENDER_RETRY_AFTER = int(os.environ.get("EXPORT_RENDER_RETRY_AFTER", "5"))
+# "spawn" keeps children clear of the parent's threads and sockets (and works on Windows)
+EXPORT_RENDER_START_METHOD = os.environ.get("EXPORT_RENDER_START_METHOD", "spawn")
+# Write .docx files as raw WordprocessingML (docx_stream), streamed into export responses;
+# false builds them with python-docx (DocGenService.create_docx) and sends them whole
+EXPORT_DOCX_STREAMING = os.environ.get("EXPORT_DOCX_STREAMING", "true").lower() == "true"
+# "template" fills cloned slide XML from a cached template; "python-pptx" builds every deck from scratch
+EXPORT_PPTX_RENDERER = os.environ.get("EXPORT_PPTX_RENDERER", "template")
+
+
+def _renderer():
+    # python-docx/python-pptx take ~100 ms to import, so API processes that never
+    # render in-process don't load them; warm_up() preloads them in the workers
+    from app.services.doc_gen_service import doc_gen_service
+    return doc_gen_service
+
+
+def preload_renderer():
+    if EXPORT_PPTX_RENDERER == "template":
+        get_template()
+    else:
+        _renderer()
+    if EXPORT_DOCX_STREAMING:
+        preload_template()
+    else:
+        _renderer()
+
+
+def _render_docx(title: str, sections: list, output):
+    if EXPORT_DOCX_STREAMING:
+        return write_docx(title, sections, output)
+    return _renderer().create_docx(title, sections, output=output)
+
+
+def _render_pptx(title: str, sections: list, output=None, template: Optional[str] = None):
+    if EXPORT_PPTX_RENDERER == "template":
+        return get_template(template).render(title, sections, output)
+    return _renderer().create_pptx(title, sections, output=output, template=template)
+
+
+def render_document(doc_type: str, title: str, sections: list, template: Optional[str] = None) -> bytes:
+    """Render a project to .docx/.pptx bytes (runs inside a worker process)
+
+    `template` is the path of the project's own .pptx template, if it has one.
+    """
+    if doc_type == "docx":
+        file_stream = _render_docx(title, sections, BytesIO())
+    else:  # pptx
+        file_stream = _render_pptx(title, sections, template=template)
+    return file_stream.getvalue()
+
+
+def render_document_to_file(doc_type: str, title: str, sections: list, path: str,
+                            template: Optional[str] = None) -> str:
+    """Render straight to a file so the bytes never pass through the API process"""
+    if doc_type == "docx":
+        _render_docx(title, sections, path)
+    else:  # pptx
+        _render_pptx(title, sections, output=path, template=template)
+    return path
+
+
+def render_docx_page(doc_type: str, title: str, sections: list) -> bytes:
+    """One page of a streamed .docx as document.xml paragraphs (see StreamingDocxWriter.add_xml)"""
+    return sections_xml(sections)
+
+
+class RenderPool:
+    """Process pool for CPU-bound document rendering with a queue cap and per-render timeout"""
+
+    def __init__(
+        self,
+        workers: int = EXPORT_RENDER_WORKERS,
+        timeout: float = EXPORT_RENDER_TIMEOUT,
+        max_queue: int = EXPORT_RENDER_MAX_QUEUE,
+        start_method: str = EXPORT_RENDER_START_METHOD,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self.pending = 0
+        self._executor = None
+        self._in_flight = {}  # executor -> renders awaited on it
+        self._retired = set()  # executors replaced after a timeout, killed once their other renders finish
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self._executor
+
+    async def render(self, doc_type: str, title: str, sections: list, template: Optional[str] = None) -> bytes:
+        """Render off the event loop; raises 503 when the queue is full and 504 on timeout"""
+        return await self._submit(render_document, doc_type, title, sections, template)
+
+    async def render_to_file(self, doc_type: str, title: str, sections: list, path: str,
+                             template: Optional[str] = None) -> str:
+        """Like render(), but the worker writes the document to `path`"""
+        return await self._submit(render_document_to_file, doc_type, title, sections, path, template)
+
+    async def render_docx_page(self, title: str, sections: list) -> bytes:
+        """Like render(), for one page of a streamed .docx: returns its XML for the writer to compress"""
+        return await self._submit(render_docx_page, "docx", title, sections)
+
+    def check_capacity(self):
+        """Raise the queue-full 503 now, before a streamed response commits to its headers"""
+        if self.workers > 0 and self.pending >= self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Export queue is full, please retry shortly",
+                headers={"Retry-After": str(EXPORT_RENDER_RETRY_AFTER)},
+            )
+
+    async def _submit(self, fn, doc_type: str, title: str, sections: list, *args):
+        # Only ship what the renderer reads across the process boundary
+        sections = [{"title": s["title"], "content": s.get("content")} for s in sections]
+
+        if self.workers <= 0:
+            with timed("render", render_duration, type=doc_type, mode="inline"):
+                return fn(doc_type, title, sections, *args)
+
+        self.check_capacity()
+
+        self.pending += 1
+        try:
+            with timed("render", render_duration, type=doc_type, mode="pool"):
+                try:
+                    return await self._run(fn, doc_type, title, sections, *args)
+                except BrokenProcessPool:
+                    # A worker died under this render (killed, out of memory); once more on a fresh pool
+                    return await self._run(fn, doc_type, title, sections, *args)
+        except BrokenProcessPool:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Export rendering failed, please retry shortly",
+                headers={"Retry-After": str(EXPORT_RENDER_RETRY_AFTER)},
+            )
+        finally:
+            self.pending -= 1
+
+    async def _run(self, fn, *args):
+        """One attempt on the current pool; 504 (and the pool retired) on timeout"""
+        executor = self._get_executor()
+        self._in_flight[executor] = self._in_flight.get(executor, 0) + 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._retire(executor)
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Export rendering timed out")
+        except BrokenProcessPool:
+            if self._executor is executor:
+                self._executor = None
+            raise
+        finally:
+            self._in_flight[executor] -= 1
+            if not self._in_flight[executor]:
+                del self._in_flight[executor]
+                if executor in self._retired:
+                    self._kill(executor)
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """Send new renders to a fresh pool after a timeout
+
+        A stuck render can't be cancelled, only killed, and killing any worker
+        breaks the whole pool. The old pool keeps its workers until the other
+        renders already on it are done, then goes (see _run).
+        """
+        if self._executor is executor:
+            self._executor = None
+        self._retired.add(executor)
+
+    def _kill(self, executor: ProcessPoolExecutor):
+        self._retired.discard(executor)
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def warm_up(self):
+        """Start the worker processes (with the renderer loaded) ahead of the first export"""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(preload_renderer)
+
+    def shutdown(self):
+        for executor in list(self._retired):
+            self._kill(executor)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+render_pool = RenderPool()
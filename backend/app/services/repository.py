@@ -0,0 +1,481 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from app.services.supabase_client import get_supabase, warm_up as warm_up_supabase
+from app.services.pagination import keyset_filter
+from app.services.metrics import db_errors, db_query_duration, timed
+from app.services.section_history import (
+    HISTORY_KEEP_RECENT, HISTORY_SNAPSHOT_INTERVAL, build_entry, compaction_bounds, rebuild
+)
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# supabase-py is synchronous; every query runs on this bounded pool so a slow
+# query only ties up one worker thread instead of the whole event loop.
+# DB_MAX_WORKERS=0 runs queries inline (old blocking behaviour, useful for benchmarks).
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "32"))
+# Use the SQL functions in sql/scoped_writes.sql for one-round-trip owned writes
+# (switched off automatically if the database doesn't have them)
+DB_SCOPED_RPC = os.environ.get("DB_SCOPED_RPC", "true").lower() == "true"
+
+
+class RequestScope:
+    """Per-request database state: project rows already loaded and round trips made"""
+
+    def __init__(self):
+        self.projects = {}  # (project_id, user_id) -> project row
+        self.queries = 0
+
+
+_request_scope: ContextVar = ContextVar("request_scope", default=None)
+
+
+def begin_request_scope() -> RequestScope:
+    scope = RequestScope()
+    _request_scope.set(scope)
+    return scope
+
+
+def current_scope():
+    return _request_scope.get()
+
+
+def _query_label(query) -> tuple:
+    """(table or rpc/function, HTTP method) of a PostgREST query builder, for metrics"""
+    request = getattr(query, "request", None)
+    path = str(getattr(request, "path", ""))
+    return path.split("/rest/v1/", 1)[-1] or "unknown", getattr(request, "http_method", "")
+
+
+class Repository:
+    """Data access layer for projects, sections, comments and history"""
+
+    def __init__(self, max_workers: int = DB_MAX_WORKERS, scoped_rpc: bool = DB_SCOPED_RPC):
+        self.max_workers = max_workers
+        self.scoped_rpc = scoped_rpc
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+            if max_workers > 0 else None
+        )
+
+    @property
+    def db(self):
+        """The shared supabase client, created on first use"""
+        return get_supabase()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking Supabase call off the event loop"""
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def execute(self, query) -> list:
+        """Execute a PostgREST query builder and return its rows"""
+        scope = current_scope()
+        if scope is not None:
+            scope.queries += 1
+        table, method = _query_label(query)
+        with timed("db", db_query_duration, db_errors, query=table, method=method):
+            response = await self.run(query.execute)
+        return response.data
+
+    async def _rpc_or(self, name: str, params: dict, fallback):
+        """Call a scoped SQL function, or run `fallback()` if it isn't installed"""
+        if self.scoped_rpc:
+            from postgrest.exceptions import APIError  # loaded with the client, not at import
+            try:
+                return await self.execute(self.db.rpc(name, params))
+            except APIError as e:
+                if e.code != "PGRST202":  # function not found
+                    raise
+                print(f"SQL function {name} not found, using two-step queries (see sql/scoped_writes.sql)")
+                self.scoped_rpc = False
+        return await fallback()
+
+    # --- Request-scoped project cache ---
+    def _cached_project(self, project_id: str, user_id: str):
+        scope = current_scope()
+        return scope.projects.get((project_id, user_id)) if scope is not None else None
+
+    def _remember_project(self, project: dict):
+        scope = current_scope()
+        if scope is not None and project:
+            row = {k: v for k, v in project.items() if k != "sections"}
+            scope.projects[(row["id"], row["user_id"])] = row
+
+    def _forget_project(self, project_id: str, user_id: str):
+        scope = current_scope()
+        if scope is not None:
+            scope.projects.pop((project_id, user_id), None)
+
+    async def warm_up(self):
+        """Create the Supabase client and open a pooled connection before the first query needs them"""
+        await self.run(warm_up_supabase)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Auth ---
+    async def get_user(self, token: str):
+        return await self.run(self.db.auth.get_user, token)
+
+    # --- Projects ---
+    async def list_projects(self, user_id: str, columns: str = "*", limit: int = None, after: list = None) -> list:
+        """Projects newest first; `after` is the (created_at, id) keyset of the previous page's last row"""
+        query = (
+            self.db.table("projects").select(columns).eq("user_id", user_id)
+            .order("created_at", desc=True).order("id", desc=True)
+        )
+        if after:
+            query = query.or_(keyset_filter(("created_at", "id"), after, descending=True))
+        if limit:
+            query = query.limit(limit)
+        return await self.execute(query)
+
+    async def get_project(self, project_id: str, user_id: str):
+        """Load an owned project (free if already loaded during this request)"""
+        cached = self._cached_project(project_id, user_id)
+        if cached is not None:
+            return cached
+        rows = await self.execute(
+            self.db.table("projects").select("*").eq("id", project_id).eq("user_id", user_id)
+        )
+        if not rows:
+            return None
+        self._remember_project(rows[0])
+        return rows[0]
+
+    async def create_project(self, user_id: str, title: str, type: str) -> dict:
+        rows = await self.execute(self.db.table("projects").insert({
+            "user_id": user_id,
+            "title": title,
+            "type": type,
+            "status": "draft"
+        }))
+        return rows[0]
+
+    async def create_project_with_sections(self, user_id: str, title: str, type: str, section_titles: list) -> dict:
+        """Insert a project and its (empty) sections together; returns the project with "sections"
+
+        One transaction with the SQL function. The fallback deletes the project
+        again if its sections can't be written, so no empty project is left behind.
+        """
+        async def two_step():
+            project = await self.create_project(user_id, title, type)
+            try:
+                project["sections"] = await self.create_sections(project["id"], [
+                    {"title": section_title, "content": None, "order_index": index}
+                    for index, section_title in enumerate(section_titles)
+                ])
+            except Exception:
+                await self.delete_project(project["id"], user_id)
+                raise
+            return project
+
+        return await self._rpc_or("create_project_with_sections", {
+            "p_user_id": user_id,
+            "p_title": title,
+            "p_type": type,
+            "p_section_titles": section_titles
+        }, two_step)
+
+    async def delete_project(self, project_id: str, user_id: str) -> list:
+        self._forget_project(project_id, user_id)
+        return await self.execute(
+            self.db.table("projects").delete().eq("id", project_id).eq("user_id", user_id)
+        )
+
+    # --- Sections ---
+    async def list_sections(self, project_id: str, with_comments: bool = False) -> list:
+        columns = "*, comments(*)" if with_comments else "*"
+        return await self.execute(
+            self.db.table("sections").select(columns).eq("project_id", project_id).order("order_index")
+        )
+
+    async def get_project_with_sections(self, project_id: str, user_id: str):
+        """Load an owned project and all its sections in one round trip"""
+        rows = await self.execute(
+            self.db.table("projects").select("*, sections(*)")
+            .eq("id", project_id).eq("user_id", user_id)
+            .order("order_index", foreign_table="sections")
+        )
+        if not rows:
+            return None
+        self._remember_project(rows[0])
+        return rows[0]
+
+    async def list_owned_sections(self, project_id: str, user_id: str, with_comments: bool = False,
+                                  columns: str = "*", limit: int = None, after: list = None):
+        """Sections of an owned project in one round trip; None if the project isn't the user's
+
+        Ordered by (order_index, id); `after` is the keyset of the previous page's last row.
+        """
+        if with_comments:
+            columns = f"{columns}, comments(*)"
+        query = (
+            self.db.table("projects").select(f"*, sections({columns})")
+            .eq("id", project_id).eq("user_id", user_id)
+            .order("order_index", foreign_table="sections").order("id", foreign_table="sections")
+        )
+        if after:
+            query = query.or_(keyset_filter(("order_index", "id"), after), reference_table="sections")
+        if limit:
+            query = query.limit(limit, foreign_table="sections")
+        rows = await self.execute(query)
+        if not rows:
+            return None
+        self._remember_project(rows[0])
+        return rows[0]["sections"] or []
+
+    async def iter_owned_sections(self, project_id: str, user_id: str, columns: str = "*", page_size: int = 100):
+        """Sections of an owned project, `page_size` at a time in (order_index, id) order
+
+        `columns` must include order_index and id (the keyset).
+        """
+        after = None
+        while True:
+            page = await self.list_owned_sections(project_id, user_id, columns=columns, limit=page_size, after=after)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = [page[-1]["order_index"], page[-1]["id"]]
+
+    async def get_owned_section(self, section_id: str, user_id: str):
+        """Load a section with its project, only if the project is the user's (one round trip)"""
+        rows = await self.execute(
+            self.db.table("sections").select("*, projects!inner(*)")
+            .eq("id", section_id).eq("projects.user_id", user_id)
+        )
+        if not rows:
+            return None
+        self._remember_project(rows[0]["projects"])
+        return rows[0]
+
+    async def list_section_outline(self, project_id: str) -> list:
+        """id, title, order_index and version of a project's sections in order, without their content"""
+        return await self.execute(
+            self.db.table("sections").select("id, title, order_index, version")
+            .eq("project_id", project_id).order("order_index").order("id")
+        )
+
+    async def get_section_contents(self, project_id: str, section_ids: list) -> list:
+        """id, content and version of some sections of a project"""
+        if not section_ids:
+            return []
+        return await self.execute(
+            self.db.table("sections").select("id, content, version")
+            .eq("project_id", project_id).in_("id", section_ids)
+        )
+
+    async def merge_context_digest(self, project_id: str, user_id: str, entries: dict, removed: list) -> list:
+        """Merge section entries into an owned project's context digest (one round trip with the SQL function)"""
+        self._forget_project(project_id, user_id)
+
+        async def two_step():
+            rows = await self.execute(
+                self.db.table("projects").select("context_digest").eq("id", project_id).eq("user_id", user_id)
+            )
+            if not rows:
+                return []
+            digest = {k: v for k, v in (rows[0]["context_digest"] or {}).items() if k not in removed}
+            digest.update(entries)
+            return await self.execute(
+                self.db.table("projects").update({"context_digest": digest}).eq("id", project_id).eq("user_id", user_id)
+            )
+
+        return await self._rpc_or("merge_context_digest", {
+            "p_project_id": project_id,
+            "p_user_id": user_id,
+            "p_entries": entries,
+            "p_removed": removed
+        }, two_step)
+
+    async def create_section(self, project_id: str, title: str, content, order_index: int) -> dict:
+        rows = await self.execute(self.db.table("sections").insert({
+            "project_id": project_id,
+            "title": title,
+            "content": content,
+            "order_index": order_index
+        }))
+        return rows[0]
+
+    async def create_sections(self, project_id: str, sections: list) -> list:
+        """Insert many sections in one request ({title, content, order_index} dicts)"""
+        if not sections:
+            return []
+        return await self.execute(self.db.table("sections").insert([
+            {
+                "project_id": project_id,
+                "title": section["title"],
+                "content": section.get("content"),
+                "order_index": section["order_index"]
+            }
+            for section in sections
+        ]))
+
+    async def create_owned_section(self, project_id: str, user_id: str, title: str, content, order_index: int):
+        """Insert a section into an owned project; None if the project isn't the user's"""
+        if self._cached_project(project_id, user_id) is not None:
+            return await self.create_section(project_id, title, content, order_index)
+
+        async def two_step():
+            if not await self.get_project(project_id, user_id):
+                return []
+            return [await self.create_section(project_id, title, content, order_index)]
+
+        rows = await self._rpc_or("create_owned_section", {
+            "p_project_id": project_id,
+            "p_user_id": user_id,
+            "p_title": title,
+            "p_content": content,
+            "p_order_index": order_index
+        }, two_step)
+        return rows[0] if rows else None
+
+    async def update_section(self, section_id: str, project_id: str, update_data: dict):
+        """Update a section, scoped to the project it must belong to"""
+        rows = await self.execute(
+            self.db.table("sections").update(update_data).eq("id", section_id).eq("project_id", project_id)
+        )
+        return rows[0] if rows else None
+
+    async def update_owned_section(self, section_id: str, project_id: str, user_id: str, update_data: dict):
+        """Update a section of an owned project; None if either doesn't match"""
+        if self._cached_project(project_id, user_id) is not None:
+            return await self.update_section(section_id, project_id, update_data)
+
+        async def two_step():
+            if not await self.get_project(project_id, user_id):
+                return []
+            return [await self.update_section(section_id, project_id, update_data)]
+
+        rows = await self._rpc_or("update_owned_section", {
+            "p_section_id": section_id,
+            "p_project_id": project_id,
+            "p_user_id": user_id,
+            "p_patch": update_data
+        }, two_step)
+        return rows[0] if rows else None
+
+    async def save_section_content(self, section: dict, content: str, prompt: str,
+                                   delta: list = None, title: str = None, rebase: bool = False):
+        """Write new content for a loaded section as its next version, plus its history entry
+
+        The write only applies if the row is still at the version `section` was read
+        at. On a conflict it returns None, or with `rebase` (full-text writes such as
+        generations) reloads the section and writes on top of the newer version.
+        One round trip with the SQL function.
+        """
+        version = (section.get("version") or 0) + 1
+        entry = build_entry(section["id"], version, prompt, section.get("content"), content, delta)
+        update = {"content": content, "version": version}
+        if title:
+            update["title"] = title
+
+        async def two_step():
+            rows = await self.execute(
+                self.db.table("sections").update(update)
+                .eq("id", section["id"]).eq("project_id", section["project_id"]).eq("version", version - 1)
+            )
+            if rows:
+                await self.execute(self.db.table("section_history").insert(entry))
+            return rows
+
+        rows = await self._rpc_or("save_section_content", {
+            "p_section_id": section["id"],
+            "p_project_id": section["project_id"],
+            "p_expected_version": version - 1,
+            "p_title": title,
+            "p_content": content,
+            "p_history": entry
+        }, two_step)
+
+        if not rows:
+            if not rebase or delta is not None:
+                return None
+            current = await self.execute(
+                self.db.table("sections").select("*").eq("id", section["id"]).eq("project_id", section["project_id"])
+            )
+            if not current:
+                return None
+            return await self.save_section_content(current[0], content, prompt, title=title)
+
+        if entry["kind"] == "snapshot" and version > HISTORY_KEEP_RECENT:
+            await self.compact_section_history(section["id"], version)
+        return rows[0]
+
+    async def upsert_sections(self, rows: list) -> list:
+        """Write many sections in one request (rows must carry id and the NOT NULL columns)"""
+        if not rows:
+            return []
+        return await self.execute(self.db.table("sections").upsert(rows, on_conflict="id"))
+
+    async def compact_section_history(self, section_id: str, latest: int) -> list:
+        """Apply the retention policy in one delete (see section_history)"""
+        keep_from, drop_through = compaction_bounds(latest)
+        conditions = [f"and(kind.eq.diff,version.lt.{keep_from})"]
+        if drop_through > 0:
+            conditions.append(f"version.lte.{drop_through}")
+        return await self.execute(
+            self.db.table("section_history").delete().eq("section_id", section_id).or_(",".join(conditions))
+        )
+
+    async def list_section_versions(self, section_id: str, project_id: str, user_id: str):
+        """Version list (newest first, no bodies) for an owned section; None if not found"""
+        rows = await self.execute(
+            self.db.table("sections")
+            .select("id, version, projects!inner(user_id), section_history(version, kind, prompt, created_at)")
+            .eq("id", section_id).eq("project_id", project_id).eq("projects.user_id", user_id)
+            .order("version", desc=True, foreign_table="section_history")
+        )
+        return rows[0]["section_history"] if rows else None
+
+    async def get_section_version(self, section_id: str, project_id: str, user_id: str, version: int):
+        """Rebuild one version of an owned section from at most one snapshot interval of rows
+
+        Returns the history row with `content` filled in, or None.
+        """
+        rows = await self.execute(
+            self.db.table("section_history")
+            .select("version, kind, prompt, content, delta, created_at, sections!inner(project_id, projects!inner(user_id))")
+            .eq("section_id", section_id)
+            .eq("sections.project_id", project_id).eq("sections.projects.user_id", user_id)
+            .lte("version", version).order("version", desc=True).limit(HISTORY_SNAPSHOT_INTERVAL)
+        )
+        content = rebuild(rows, version)
+        if content is None:
+            return None
+        row = next(r for r in rows if r["version"] == version)
+        return {"version": version, "kind": row["kind"], "prompt": row["prompt"],
+                "content": content, "created_at": row.get("created_at")}
+
+    # --- Comments & feedback ---
+    async def add_feedback(self, section_id: str, user_id: str, is_positive: bool) -> list:
+        return await self.execute(self.db.table("section_feedback").insert({
+            "section_id": section_id,
+            "user_id": user_id,
+            "is_positive": is_positive
+        }))
+
+    async def add_comment(self, section_id: str, user_id: str, text: str) -> dict:
+        rows = await self.execute(self.db.table("comments").insert({
+            "section_id": section_id,
+            "user_id": user_id,
+            "text": text
+        }))
+        return rows[0]
+
+    async def delete_comment(self, comment_id: str, user_id: str) -> list:
+        return await self.execute(
+            self.db.table("comments").delete().eq("id", comment_id).eq("user_id", user_id)
+        )
+
+# Global instance
+repository = Repository()
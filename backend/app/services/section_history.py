@@ -0,0 +1,122 @@
+"""
+Delta-compressed section history.
+
+Every content change gets the next version number. A version is stored either as
+a full snapshot or as a diff against the version before it:
+
+    kind="snapshot"  content = full text
+    kind="diff"      delta   = [[start, end, text], ...] replacements of the
+                               previous version's text (ascending, non-overlapping)
+
+Versions that are multiples of HISTORY_SNAPSHOT_INTERVAL are always snapshots
+(as is the first version, and any change whose diff wouldn't be smaller), so
+rebuilding a version reads at most HISTORY_SNAPSHOT_INTERVAL rows.
+
+Retention: the newest HISTORY_KEEP_RECENT versions are kept exactly; older
+diffs are dropped, leaving one snapshot per interval, and anything more than
+HISTORY_MAX_VERSIONS behind the latest version is deleted.
+"""
+from difflib import SequenceMatcher
+from typing import List, Optional
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HISTORY_SNAPSHOT_INTERVAL = max(1, int(os.environ.get("HISTORY_SNAPSHOT_INTERVAL", "10")))
+HISTORY_KEEP_RECENT = int(os.environ.get("HISTORY_KEEP_RECENT", "20"))
+HISTORY_MAX_VERSIONS = int(os.environ.get("HISTORY_MAX_VERSIONS", "200"))
+
+
+class DeltaError(ValueError):
+    """A delta doesn't apply to the text it was sent for"""
+
+
+def apply_delta(text: str, delta: list) -> str:
+    """Apply [[start, end, replacement], ...] edits (offsets into `text`)"""
+    pieces = []
+    position = 0
+    for start, end, replacement in delta:
+        if start < position or end < start or end > len(text):
+            raise DeltaError(f"Edit [{start}, {end}] is out of order or outside the text (length {len(text)})")
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def compute_delta(old: str, new: str) -> list:
+    """Line-level diff of two texts as [[start, end, replacement], ...] on `old`"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    old_offsets = [0]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+
+    delta = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            delta.append([old_offsets[i1], old_offsets[i2], "".join(new_lines[j1:j2])])
+    return delta
+
+
+def _size(delta: list) -> int:
+    return len(json.dumps(delta, separators=(",", ":")))
+
+
+def build_entry(section_id: str, version: int, prompt: str, previous: Optional[str], content: str,
+                delta: Optional[list] = None) -> dict:
+    """The section_history row for `version`, whose text is `content`
+
+    `previous` must be the text of version - 1 (the section content it replaces).
+    A delta already known (e.g. sent by the editor) is stored as is.
+    """
+    entry = {"section_id": section_id, "version": version, "prompt": prompt, "content": None, "delta": None}
+    if version <= 1 or version % HISTORY_SNAPSHOT_INTERVAL == 0 or not previous:
+        entry.update(kind="snapshot", content=content)
+        return entry
+
+    if delta is None:
+        delta = compute_delta(previous, content)
+    if _size(delta) >= len(content):
+        entry.update(kind="snapshot", content=content)
+    else:
+        entry.update(kind="diff", delta=delta)
+    return entry
+
+
+def rebuild(rows: List[dict], version: int) -> Optional[str]:
+    """Rebuild `version` from history rows (any order) covering its latest snapshot onwards
+
+    Returns None if the chain is incomplete (e.g. the version was compacted away).
+    """
+    by_version = {row["version"]: row for row in rows}
+    if version not in by_version:
+        return None
+
+    chain = []
+    current = version
+    while True:
+        row = by_version.get(current)
+        if row is None:
+            return None
+        chain.append(row)
+        if row.get("kind", "snapshot") == "snapshot":
+            break
+        current -= 1
+
+    text = chain[-1]["content"] or ""
+    for row in reversed(chain[:-1]):
+        text = apply_delta(text, row["delta"] or [])
+    return text
+
+
+def compaction_bounds(latest: int) -> tuple:
+    """(drop diffs below this version, drop everything at or below this version)"""
+    window_start = max(1, latest - HISTORY_KEEP_RECENT + 1)
+    # The recent window is rebuilt from the last interval snapshot at or before its start
+    keep_from = window_start - window_start % HISTORY_SNAPSHOT_INTERVAL
+    return keep_from, latest - HISTORY_MAX_VERSIONS
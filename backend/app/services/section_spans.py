@@ -0,0 +1,112 @@
+"""
+Spans of section text for partial refinement.
+
+A span is a [start, end) character range of a section's content, given
+directly or as paragraph indices. Paragraphs are the non-blank lines of the
+Markdown, the same units the .docx/.pptx renderers turn into paragraphs, so
+one bullet or one body paragraph is one index. Only the span and up to
+REFINE_CONTEXT_CHARS of whole lines on either side go to the model. The
+rewrite is spliced back as a one-edit delta, which is only saved if the
+section is still at the version the span was taken from, so the rest of the
+section stays exactly as it was.
+"""
+from typing import List, NamedTuple, Optional
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Text on each side of the span sent along as context (whole lines, at most this many characters)
+REFINE_CONTEXT_CHARS = int(os.environ.get("REFINE_CONTEXT_CHARS", "600"))
+
+
+class SpanError(ValueError):
+    """The requested span doesn't fit the section's text"""
+
+
+class Span(NamedTuple):
+    start: int
+    end: int
+    before: str  # context preceding the span
+    text: str
+    after: str  # context following the span
+
+
+def paragraph_ranges(text: str) -> List[tuple]:
+    """(start, end) of every non-blank line, without its line break"""
+    ranges = []
+    position = 0
+    for line in text.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        if body.strip():
+            ranges.append((position, position + len(body)))
+        position += len(line)
+    return ranges
+
+
+def _context(text: str, start: int, end: int, chars: int) -> tuple:
+    """Whole lines of at most `chars` characters before `start` and after `end`"""
+    floor = max(0, start - chars)
+    if floor > 0:
+        # Start at the first line that begins inside the window
+        newline = text.find("\n", floor - 1, start)
+        floor = start if newline < 0 else newline + 1
+    ceiling = min(len(text), end + chars)
+    if ceiling < len(text):
+        newline = text.rfind("\n", end, ceiling + 1)
+        ceiling = end if newline < 0 else newline
+    return text[floor:start], text[end:ceiling]
+
+
+def resolve_span(text: str, char_range: Optional[tuple] = None, paragraphs: Optional[List[int]] = None,
+                 context_chars: int = REFINE_CONTEXT_CHARS) -> Span:
+    """The span given as a character range or paragraph indices, with its context
+
+    Paragraph indices cover everything from the first listed paragraph to the
+    last, including any in between.
+    """
+    if (char_range is None) == (paragraphs is None):
+        raise SpanError("Give either a character range or paragraph indices")
+
+    if paragraphs is not None:
+        ranges = paragraph_ranges(text)
+        first, last = min(paragraphs), max(paragraphs)
+        if first < 0 or last >= len(ranges):
+            raise SpanError(f"Paragraph index out of range (the section has {len(ranges)} paragraphs)")
+        start, end = ranges[first][0], ranges[last][1]
+    else:
+        start, end = char_range
+        if not 0 <= start < end <= len(text):
+            raise SpanError(f"Character range [{start}, {end}) is empty or outside the text (length {len(text)})")
+
+    if not text[start:end].strip():
+        raise SpanError("The selected text is blank")
+    before, after = _context(text, start, end, context_chars)
+    return Span(start, end, before, text[start:end], after)
+
+
+def _strip_echo(rewrite: str, span: Span) -> str:
+    """Drop context lines the model repeated around its rewrite"""
+    before = span.before.strip()
+    after = span.after.strip()
+    if before and rewrite.startswith(before):
+        rewrite = rewrite[len(before):]
+    if after and rewrite.endswith(after):
+        rewrite = rewrite[:-len(after)]
+    return rewrite.strip()
+
+
+def splice(text: str, span: Span, rewrite: str) -> tuple:
+    """(new text, [[start, end, replacement]] delta) with the span replaced by `rewrite`
+
+    The span's own leading/trailing whitespace is kept, so the rewrite lands
+    between the same line breaks the original did.
+    """
+    rewrite = _strip_echo(rewrite, span)
+    if not rewrite:
+        raise SpanError("The model returned nothing for the selected text")
+    leading = span.text[:len(span.text) - len(span.text.lstrip())]
+    trailing = span.text[len(span.text.rstrip()):]
+    replacement = leading + rewrite + trailing
+
+    return text[:span.start] + replacement + text[span.end:], [[span.start, span.end, replacement]]
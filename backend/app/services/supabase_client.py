@@ -1,13 +1,67 @@
-from supabase import create_client, Client
+from typing import Optional
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+# One pooled HTTP client shared by PostgREST, auth and storage, so queries issued
+# from the repository thread pool reuse keep-alive connections instead of re-handshaking.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "32"))
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "30"))
 
-if not url or not key:
-    raise ValueError("Supabase URL and Key must be set in environment variables")
+# Both clients are built on first use (supabase-py alone takes ~150 ms to import),
+# so processes and requests that never touch the database don't pay for them.
+_lock = threading.Lock()
+_http_client = None
+_supabase = None
 
-supabase: Client = create_client(url, key)
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                import httpx
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=DB_POOL_SIZE, max_keepalive_connections=DB_POOL_SIZE),
+                    timeout=httpx.Timeout(DB_TIMEOUT),
+                    follow_redirects=True,
+                )
+    return _http_client
+
+
+def get_supabase():
+    """The shared supabase Client; raises ValueError if it isn't configured"""
+    global _supabase
+    if _supabase is None:
+        url: Optional[str] = os.environ.get("SUPABASE_URL")
+        key: Optional[str] = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise ValueError("Supabase URL and Key must be set in environment variables")
+
+        http_client = get_http_client()
+        with _lock:
+            if _supabase is None:
+                from supabase import create_client
+                from supabase.lib.client_options import SyncClientOptions
+                _supabase = create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+    return _supabase
+
+
+def warm_up():
+    """Build the client and open a pooled connection to Supabase (blocking; run off the event loop)"""
+    client = get_supabase()
+    try:
+        get_http_client().head(str(client.rest_url))
+    except Exception as e:
+        print(f"Supabase warm-up failed: {str(e)}")
+
+
+def close():
+    """Close pooled connections if the client was ever created"""
+    global _http_client, _supabase
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = _supabase = None
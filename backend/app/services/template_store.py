@@ -0,0 +1,84 @@
+from importlib import import_module
+from typing import Optional
+import os
+import tempfile
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "local" or "package.module:ClassName" for a custom TemplateStore subclass
+PPTX_TEMPLATE_STORE = os.environ.get("PPTX_TEMPLATE_STORE", "local")
+PPTX_TEMPLATE_DIR = os.environ.get(
+    "PPTX_TEMPLATE_DIR", os.path.join(tempfile.gettempdir(), "nexwrit-templates")
+)
+# Largest template a project can upload
+PPTX_TEMPLATE_MAX_BYTES = int(os.environ.get("PPTX_TEMPLATE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class TemplateStore:
+    """Where per-project .pptx templates live
+
+    local_path() must return a filesystem path the render workers can open, or
+    None when the project has no template of its own. version() changes
+    whenever the template does (it is part of the export ETag).
+    """
+
+    def local_path(self, project_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def version(self, project_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def save(self, project_id: str, data: bytes):
+        raise NotImplementedError
+
+    def delete(self, project_id: str) -> bool:
+        raise NotImplementedError
+
+
+class LocalTemplateStore(TemplateStore):
+    """Templates as files in one directory, named by project id"""
+
+    def __init__(self, directory: str = PPTX_TEMPLATE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, project_id: str) -> str:
+        # basename() keeps ids inside the directory
+        return os.path.join(self.directory, f"{os.path.basename(project_id)}.pptx")
+
+    def local_path(self, project_id: str) -> Optional[str]:
+        path = self._path(project_id)
+        return path if os.path.exists(path) else None
+
+    def version(self, project_id: str) -> Optional[str]:
+        try:
+            stat = os.stat(self._path(project_id))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def save(self, project_id: str, data: bytes):
+        # Written aside and renamed, so a render never opens half a file
+        upload_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.part")
+        with open(upload_path, "wb") as f:
+            f.write(data)
+        os.replace(upload_path, self._path(project_id))
+
+    def delete(self, project_id: str) -> bool:
+        try:
+            os.remove(self._path(project_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def get_template_store() -> TemplateStore:
+    if PPTX_TEMPLATE_STORE == "local":
+        return LocalTemplateStore()
+    module_name, _, class_name = PPTX_TEMPLATE_STORE.partition(":")
+    return getattr(import_module(module_name), class_name)()
+
+# Global instance
+template_store = get_template_store()
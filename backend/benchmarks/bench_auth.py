@@ -0,0 +1,50 @@
+"""
+Compare GET /projects throughput with remote (per-request Supabase auth call)
+and local (JWT signature check + token cache) verification.
+
+    python -m benchmarks.bench_auth --requests 500 --concurrency 20 --auth-latency 0.03
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import boot_app, mint_token, run_load
+from benchmarks.stub_supabase import StubSupabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--auth-latency", type=float, default=0.03, help="seconds added to each stub auth call")
+    parser.add_argument("--projects", type=int, default=20)
+    args = parser.parse_args()
+
+    stub = StubSupabase(auth_latency=args.auth_latency)
+    stub.start()
+    app = boot_app(stub)
+
+    from app.middleware import auth
+
+    user_id = "00000000-0000-0000-0000-000000000001"
+    token = mint_token(user_id)
+    stub.add_user(token, user_id=user_id)
+    for i in range(args.projects):
+        stub.insert("projects", {"user_id": user_id, "title": f"Project {i}", "type": "docx", "status": "draft"})
+
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for mode in ("remote", "local"):
+        auth.AUTH_MODE = mode
+        auth.token_cache.clear()
+        stub.reset_counts()
+        results[mode] = asyncio.run(run_load(app, "GET", "/projects", args.requests, args.concurrency, headers))
+        results[mode]["auth_server_calls"] = stub.request_counts.get("auth", 0)
+
+    results["speedup"] = round(results["local"]["rps"] / results["remote"]["rps"], 2) if results["remote"]["rps"] else None
+    print(json.dumps(results, indent=2))
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
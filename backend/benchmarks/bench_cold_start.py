@@ -0,0 +1,120 @@
+"""
+Cold-start cost of the API: how long `import main` takes in a fresh
+interpreter, and how long a fresh uvicorn process takes to answer its first
+requests (GET /, then an authenticated GET /projects against the stub
+Supabase server, which needs the database client).
+
+Each run starts a new process; medians over --runs are reported. --pause-ms
+is the gap between the first response and the first database request (a user
+opening the app); --no-warm-up makes that request build the database client
+itself instead of the lifespan warm-up.
+
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import BENCH_JWT_SECRET, mint_token
+from benchmarks.stub_supabase import StubSupabase
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(stub: StubSupabase, warm_up: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": stub.url,
+        "SUPABASE_SERVICE_ROLE_KEY": "bench-service-role-key",
+        "SUPABASE_JWT_SECRET": BENCH_JWT_SECRET,
+        "GEMINI_API_KEY": env.get("GEMINI_API_KEY", "bench-gemini-key"),
+        "EXPORT_RENDER_WORKERS": "0",
+        "WARM_UP_CLIENTS": "true" if warm_up else "false",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def import_time(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_responses(env: dict, token: str, pause: float) -> dict:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() - started > 60:
+                        raise
+                    time.sleep(0.005)
+            root = time.perf_counter() - started
+            time.sleep(pause)
+
+            request_started = time.perf_counter()
+            client.get("/projects", headers={"Authorization": f"Bearer {token}"}).raise_for_status()
+            projects = time.perf_counter() - request_started
+    finally:
+        server.terminate()
+        server.wait()
+    return {"first_root": root, "first_projects": projects}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pause-ms", type=float, default=1000.0)
+    parser.add_argument("--no-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    stub = StubSupabase()
+    stub.start()
+    user_id = "00000000-0000-0000-0000-000000000017"
+    token = mint_token(user_id)
+    stub.insert("projects", {"user_id": user_id, "title": "Cold", "type": "docx", "status": "draft"})
+    env = _env(stub, warm_up=not args.no_warm_up)
+
+    imports, roots, projects = [], [], []
+    for _ in range(args.runs):
+        imports.append(import_time(env))
+        first = first_responses(env, token, args.pause_ms / 1000)
+        roots.append(first["first_root"])
+        projects.append(first["first_projects"])
+    stub.stop()
+
+    print(json.dumps({
+        "runs": args.runs,
+        "warm_up": not args.no_warm_up,
+        "pause_ms": args.pause_ms,
+        "import_main_ms": round(statistics.median(imports) * 1000, 1),
+        "time_to_first_response_ms": round(statistics.median(roots) * 1000, 1),
+        "first_db_request_ms": round(statistics.median(projects) * 1000, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Latency of GET /projects under 200 parallel requests when Supabase queries run
+inline on the event loop versus on the repository thread pool.
+
+The stub PostgREST adds --rest-latency seconds per query, standing in for the
+network hop to a hosted database.
+
+    python -m benchmarks.bench_db_concurrency --parallel 200 --rest-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import boot_app, mint_token, run_load
+from benchmarks.stub_supabase import StubSupabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--parallel", type=int, default=200)
+    parser.add_argument("--rest-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    stub = StubSupabase(rest_latency=args.rest_latency)
+    stub.start()
+    app = boot_app(stub)
+
+    from app.services.repository import repository
+
+    user_id = "00000000-0000-0000-0000-000000000002"
+    token = mint_token(user_id)
+    for i in range(10):
+        stub.insert("projects", {"user_id": user_id, "title": f"Project {i}", "type": "pptx", "status": "draft"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {}
+    executor = repository._executor
+    for mode in ("inline", "thread_pool"):
+        # Inline mode reproduces the old behaviour of calling .execute() on the event loop
+        repository._executor = None if mode == "inline" else executor
+        results[mode] = asyncio.run(run_load(app, "GET", "/projects", args.parallel, args.parallel, headers))
+    results["thread_pool_workers"] = repository.max_workers
+
+    print(json.dumps(results, indent=2))
+    repository.shutdown()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Peak memory and time of a .docx export as the document grows: DocGenService
+(all sections loaded, python-docx object tree, then serialized) versus the
+StreamingDocxWriter used by GET /export (sections arrive a page at a time and
+the zip is written as they do). Each measurement runs in a fresh process and
+reports its peak RSS above the interpreter's baseline after imports, so
+python-docx's lxml allocations are counted too. 2000 sections of the sample
+content come to roughly 300 pages.
+
+    python -m benchmarks.bench_docx_streaming --sections 100,500,2000 --page-size 50
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+SECTION = "\n".join([
+    "## Market Overview",
+    "The **electric vehicle** market grew *rapidly* over the last five years, "
+    "driven by falling battery costs and ***policy incentives***.",
+    "",
+    "- **Cost**: pack prices fell 14% year on year",
+    "  - *Range* anxiety is declining",
+    "  - Charging networks are maturing",
+    "- Consumer sentiment improved across key regions",
+    "",
+    "1. Expand charging partnerships",
+    "2. Invest in **solid-state** research",
+    "",
+    "In summary, the outlook remains *positive* with **strong** demand signals.",
+])
+
+
+def _section(i: int) -> dict:
+    # A fresh string per section, as rows decoded from a database response would be
+    return {"id": str(i), "title": f"Section {i + 1}", "content": SECTION + f"\n\nSection {i + 1} ends here.", "order_index": i}
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, count: int, page_size: int) -> dict:
+    from app.services.doc_gen_service import doc_gen_service
+    from app.services.docx_stream import StreamingDocxWriter
+    # Warm the renderer being measured so imports and the template don't count
+    if mode == "python-docx":
+        doc_gen_service.create_docx("Warm-up", [_section(0)])
+    else:
+        warm = StreamingDocxWriter("Warm-up")
+        warm.start(), warm.add_sections([_section(0)]), warm.finish()
+    baseline = _peak_rss_mb()
+
+    started = time.perf_counter()
+    if mode == "python-docx":
+        sections = [_section(i) for i in range(count)]
+        size = len(doc_gen_service.create_docx("Benchmark Report", sections).getvalue())
+        first_byte = time.perf_counter() - started
+    else:
+        writer = StreamingDocxWriter("Benchmark Report")
+        size = len(writer.start())
+        first_byte = time.perf_counter() - started
+        for offset in range(0, count, page_size):
+            page = [_section(i) for i in range(offset, min(offset + page_size, count))]
+            size += len(writer.add_sections(page))
+        size += len(writer.finish())
+    elapsed = time.perf_counter() - started
+
+    return {
+        "bytes": size,
+        "seconds": round(elapsed, 3),
+        "first_byte_ms": round(first_byte * 1000, 1),
+        "peak_rss_above_baseline_mb": round(_peak_rss_mb() - baseline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", default="100,500,2000", help="comma separated document sizes")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SECTIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child[0], int(args.child[1]), args.page_size)))
+        return
+
+    results = {}
+    for count in [int(c) for c in args.sections.split(",")]:
+        results[f"{count}_sections"] = {
+            mode: json.loads(subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_docx_streaming", "--child", mode, str(count),
+                 "--page-size", str(args.page_size)],
+                capture_output=True, text=True, check=True,
+            ).stdout)
+            for mode in ("python-docx", "streaming")
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
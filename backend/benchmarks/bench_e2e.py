@@ -0,0 +1,251 @@
+"""
+End-to-end load test of main.app, fully offline: the app runs in-process
+against the stub Supabase server (PostgREST + auth) and the fake LLM provider
+(LLM_PROVIDER=fake, latency set by --llm-latency-ms / --llm-ms-per-token).
+
+Each virtual user owns a .docx report and a .pptx deck of --sections sections
+and runs every scenario --iterations times, one operation after another:
+
+    list_projects   GET /projects
+    open_project    GET /projects/{id}, then GET /projects/{id}/sections
+    generate        POST /generate/project/{id}, polled until the job is done
+    refine          POST /generate/refine/{section_id}
+    refine_span     the same, for one paragraph of the section ("paragraphs": [i])
+    refine_under_load  refine while a project job of the user's .docx runs; only
+                    the refine is timed (it should stay close to "refine")
+    export_docx     GET /export/{id} of the report (render cache cleared first)
+    export_pptx     GET /export/{id} of the deck (render cache cleared first)
+
+Per scenario: operations/sec, p50/p95/p99 latency, the worst and p99
+event-loop lag seen by a 5 ms ticker, and the API process's peak RSS while
+it ran. Render worker processes are not included in RSS. The JSON carries the
+git commit and settings so runs can be compared across commits (--output
+also writes it to a file).
+
+    python -m benchmarks.bench_e2e --users 8 --iterations 5 --llm-latency-ms 200 --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import time
+
+import httpx
+
+from benchmarks.common import boot_app, mint_token, percentile, summarize
+from benchmarks.stub_supabase import StubSupabase, install_scoped_rpc
+
+SCENARIOS = ["list_projects", "open_project", "generate", "refine", "refine_span", "refine_under_load",
+             "export_docx", "export_pptx"]
+TICK = 0.005
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux /proc), else the process's peak so far"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Monitor:
+    """Event-loop lag and peak RSS while a scenario runs"""
+
+    def __init__(self):
+        self.lags = []
+        self.peak_rss = _rss_mb()
+        self._task = None
+
+    async def _tick(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            self.lags.append(max(0.0, time.perf_counter() - started - TICK))
+            self.peak_rss = max(self.peak_rss, _rss_mb())
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "loop_lag_p99_ms": round(percentile(self.lags, 99) * 1000, 2),
+            "loop_lag_max_ms": round(max(self.lags, default=0.0) * 1000, 2),
+            "peak_rss_mb": round(self.peak_rss, 1),
+        }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, index: int):
+        self.client = client
+        self.user_id = f"00000000-0000-0000-0000-{index:012d}"
+        self.headers = {"Authorization": f"Bearer {mint_token(self.user_id)}"}
+        self.projects = {}  # type -> project id
+        self.sections = {}  # type -> section ids
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def setup(self, sections: int):
+        for doc_type in ("docx", "pptx"):
+            response = await self.request("POST", "/projects/from-outline", json={
+                "title": f"Benchmark {doc_type}", "type": doc_type,
+                "outline": [f"Part {i + 1}: market drivers" for i in range(sections)],
+            })
+            project = response.json()
+            self.projects[doc_type] = project["id"]
+            self.sections[doc_type] = [s["id"] for s in project["sections"]]
+            await self.generate(doc_type)
+
+    async def generate(self, doc_type: str = "docx"):
+        response = await self.request("POST", f"/generate/project/{self.projects[doc_type]}",
+                                      json={"bypass_cache": True})
+        job_id = response.json()["id"]
+        while True:
+            await asyncio.sleep(0.02)
+            job = (await self.request("GET", f"/generate/jobs/{job_id}")).json()
+            if job["status"] not in ("pending", "running"):
+                if job["status"] != "completed" or job.get("failed"):
+                    raise RuntimeError(f"generation job ended {job['status']} with {job.get('failed')} failed")
+                return
+
+    async def run(self, scenario: str, iteration: int):
+        """Run one operation; returns its latency when only part of it is timed"""
+        if scenario == "list_projects":
+            await self.request("GET", "/projects")
+        elif scenario == "open_project":
+            project_id = self.projects["docx"]
+            await self.request("GET", f"/projects/{project_id}")
+            await self.request("GET", f"/projects/{project_id}/sections")
+        elif scenario == "generate":
+            await self.generate("docx")
+        elif scenario == "refine_under_load":
+            job = asyncio.create_task(self.generate("docx"))
+            await asyncio.sleep(0.05)  # let the job queue its calls first
+            started = time.perf_counter()
+            await self.run("refine", iteration)
+            latency = time.perf_counter() - started
+            await job
+            return latency
+        elif scenario in ("refine", "refine_span"):
+            section_ids = self.sections["docx"]
+            section_id = section_ids[iteration % len(section_ids)]
+            body = {"section_id": section_id, "refinement_prompt": "Make it more concise", "bypass_cache": True}
+            if scenario == "refine_span":
+                body["paragraphs"] = [iteration % 3]
+            await self.request("POST", f"/generate/refine/{section_id}", json=body)
+        elif scenario in ("export_docx", "export_pptx"):
+            from app.services.export_cache import export_cache
+            project_id = self.projects[scenario.split("_")[1]]
+            export_cache.invalidate(project_id)
+            await self.request("GET", f"/export/{project_id}")
+
+
+async def run_scenario(users: list, scenario: str, iterations: int) -> dict:
+    latencies, errors = [], []
+
+    async def drive(user: VirtualUser):
+        for iteration in range(iterations):
+            started = time.perf_counter()
+            try:
+                latency = await user.run(scenario, iteration)
+                latencies.append(latency if latency is not None else time.perf_counter() - started)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    with Monitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed, len(errors))
+    result["operations"] = result.pop("requests")
+    result["ops_per_sec"] = result.pop("rps")
+    result.update(monitor.stats())
+    if errors:
+        result["error_types"] = sorted(set(errors))
+    return result
+
+
+async def run(app, args) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        users = [VirtualUser(client, i + 1) for i in range(args.users)]
+        started = time.perf_counter()
+        await asyncio.gather(*(user.setup(args.sections) for user in users))
+        setup_s = time.perf_counter() - started
+
+        results = {}
+        for scenario in args.scenarios.split(","):
+            results[scenario] = await run_scenario(users, scenario, args.iterations)
+    return {"setup_s": round(setup_s, 2), "scenarios": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="added to every stub PostgREST request")
+    parser.add_argument("--auth-latency-ms", type=float, default=20.0)
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stub = StubSupabase(auth_latency=args.auth_latency_ms / 1000, rest_latency=args.db_latency_ms / 1000)
+    install_scoped_rpc(stub)
+    stub.start()
+    app = boot_app(
+        stub,
+        LLM_PROVIDER="fake",
+        LLM_FAKE_LATENCY_MS=args.llm_latency_ms,
+        LLM_FAKE_MS_PER_TOKEN=args.llm_ms_per_token,
+        LLM_CACHE_ENABLED="false",
+        EXPORT_RENDER_WORKERS=args.render_workers,
+        WARM_UP_CLIENTS="false",
+    )
+
+    from app.services.render_pool import render_pool
+    render_pool.warm_up()
+    try:
+        report = asyncio.run(run(app, args))
+    finally:
+        render_pool.shutdown()
+        stub.stop()
+
+    report = {
+        "commit": _commit(),
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        **report,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Export throughput for 50-section documents rendered inline versus on the
+render process pool with 1, 2 and 4 workers. Also reports the worst event-loop
+stall seen while the renders were running (what other requests would feel).
+
+    python -m benchmarks.bench_export_pool --exports 24 --sections 50 --type docx
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import summarize
+from app.services.render_pool import RenderPool
+
+PARAGRAPH = (
+    "**Market growth** in the segment is driven by falling battery costs, "
+    "policy incentives and a maturing charging network across key regions."
+)
+
+
+def make_sections(count: int) -> list:
+    sections = []
+    for i in range(count):
+        body = "\n".join(
+            [PARAGRAPH, "", "- **Cost**: pack prices fell 14% year on year", "- *Range* anxiety is declining", "", PARAGRAPH]
+        )
+        sections.append({"id": str(i), "title": f"Section {i + 1}", "content": body, "order_index": i})
+    return sections
+
+
+async def measure(pool: RenderPool, doc_type: str, sections: list, exports: int) -> dict:
+    max_lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_lag
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    latencies = []
+
+    async def one():
+        started = time.perf_counter()
+        await pool.render(doc_type, "Benchmark Project", sections)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(exports)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick
+
+    result = summarize(latencies, elapsed)
+    result["exports_per_sec"] = result.pop("rps")
+    result["max_event_loop_lag_ms"] = round(max_lag * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--exports", type=int, default=24)
+    parser.add_argument("--sections", type=int, default=50)
+    parser.add_argument("--type", choices=["docx", "pptx"], default="docx")
+    parser.add_argument("--workers", default="0,1,2,4", help="comma separated; 0 renders inline")
+    args = parser.parse_args()
+
+    sections = make_sections(args.sections)
+    results = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        pool = RenderPool(workers=workers, max_queue=args.exports)
+        pool.warm_up()
+        time.sleep(1 if workers else 0)  # let spawned workers finish importing
+        label = "inline" if workers == 0 else f"{workers}_workers"
+        results[label] = asyncio.run(measure(pool, args.type, sections, args.exports))
+        pool.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
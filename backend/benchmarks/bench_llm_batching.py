@@ -0,0 +1,153 @@
+"""
+Gemini calls, tokens and wall time to generate every slide of the decks in
+benchmarks/fixtures/llm_sections.json: one call per section (the old project
+job) versus LLMService.generate_sections_batch in chunks of
+LLM_BATCH_MAX_SECTIONS, and versus concurrent per-slide requests coalesced by
+the batching window (POST /generate/section/{id} fired for a whole deck).
+
+The model is a fake that answers from the recorded per-slide responses. Tokens
+are estimated at 4 characters each; latency is modelled per call as a fixed
+round trip plus time per prompt and completion token. --drop-rate leaves
+entries out of batched answers so the per-section fallback is exercised.
+
+    python -m benchmarks.bench_llm_batching --drop-rate 0.1 --time-scale 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+FIXTURES = Path(__file__).parent / "fixtures" / "llm_sections.json"
+CHARS_PER_TOKEN = 4
+
+
+def tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class RecordedModel:
+    """Stands in for GenerativeModel.generate_content_async, replaying recorded answers"""
+
+    def __init__(self, responses: dict, args):
+        self.responses = responses
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.calls = self.prompt_tokens = self.completion_tokens = 0
+
+    async def generate_content_async(self, prompt, safety_settings=None, generation_config=None, stream=False):
+        titles = re.findall(r'(?:^(\d+)\. |Title: )"([^"]+)"', prompt, re.M)
+        if generation_config:
+            answer = {
+                number: self.responses[title] for number, title in titles
+                if self.rng.random() >= self.args.drop_rate
+            }
+            text = json.dumps(answer)
+        else:
+            text = self.responses[titles[0][1]]
+
+        self.calls += 1
+        self.prompt_tokens += tokens(prompt)
+        self.completion_tokens += tokens(text)
+        latency_ms = (
+            self.args.round_trip_ms
+            + tokens(prompt) * self.args.prompt_token_ms
+            + tokens(text) * self.args.completion_token_ms
+        )
+        await asyncio.sleep(latency_ms / 1000 * self.args.time_scale)
+        return SimpleNamespace(parts=[text], text=text)
+
+    def usage(self) -> dict:
+        return {"calls": self.calls, "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+
+async def per_section(llm, deck: dict, parallelism: int):
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def one(title):
+        async with semaphore:
+            return await llm.generate_section_content(title, deck["topic"], deck["type"], user_id="bench", bypass_cache=True)
+
+    return await asyncio.gather(*(one(slide["title"]) for slide in deck["slides"]))
+
+
+async def job_batched(llm, deck: dict, parallelism: int):
+    titles = [slide["title"] for slide in deck["slides"]]
+    chunk_count = -(-len(titles) // llm.batch_size(deck["type"]))
+    size = -(-len(titles) // chunk_count)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def chunk(part):
+        async with semaphore:
+            return await llm.generate_sections_batch(part, deck["topic"], deck["type"], user_id="bench", bypass_cache=True)
+
+    parts = await asyncio.gather(*(chunk(titles[i:i + size]) for i in range(0, len(titles), size)))
+    return [content for part in parts for content in part]
+
+
+async def windowed(llm, deck: dict, parallelism: int):
+    return await asyncio.gather(*(
+        llm.batch_section_content(deck["topic"], slide["title"], deck["topic"], deck["type"], user_id="bench", bypass_cache=True)
+        for slide in deck["slides"]
+    ))
+
+
+async def run(llm, model: RecordedModel, decks: list, mode, parallelism: int) -> dict:
+    started = time.perf_counter()
+    sections = failed = 0
+    for deck in decks:
+        expected = [llm._clean_response(slide["response"]) for slide in deck["slides"]]
+        results = await mode(llm, deck, parallelism)
+        sections += len(results)
+        failed += sum(1 for got, want in zip(results, expected) if got != want)
+    elapsed = time.perf_counter() - started
+    return {
+        "sections": sections,
+        "mismatched": failed,
+        **model.usage(),
+        "modelled_wall_ms": round(elapsed / model.args.time_scale * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--round-trip-ms", type=float, default=450.0)
+    parser.add_argument("--prompt-token-ms", type=float, default=0.05)
+    parser.add_argument("--completion-token-ms", type=float, default=5.0)
+    parser.add_argument("--time-scale", type=float, default=0.1, help="sleep this fraction of the modelled latency")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench-gemini-key")
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    from app.services.llm_service import LLMService
+
+    decks = json.loads(FIXTURES.read_text())["decks"]
+    responses = {slide["title"]: slide["response"] for deck in decks for slide in deck["slides"]}
+
+    results = {}
+    for name, mode in (("per_section", per_section), ("job_batched", job_batched), ("windowed", windowed)):
+        llm = LLMService()
+        model = RecordedModel(responses, args)
+        llm.provider.model = model
+        parallelism = max(1, min(4, llm.limiter.max_background_per_user))
+        results[name] = asyncio.run(run(llm, model, decks, mode, parallelism))
+
+    baseline = results["per_section"]
+    for name in ("job_batched", "windowed"):
+        result = results[name]
+        baseline_tokens = baseline["prompt_tokens"] + baseline["completion_tokens"]
+        result["token_savings_pct"] = round(100 * (1 - (result["prompt_tokens"] + result["completion_tokens"]) / baseline_tokens), 1)
+        result["prompt_token_savings_pct"] = round(100 * (1 - result["prompt_tokens"] / baseline["prompt_tokens"]), 1)
+        result["latency_savings_pct"] = round(100 * (1 - result["modelled_wall_ms"] / baseline["modelled_wall_ms"]), 1)
+
+    print(json.dumps({"decks": len(decks), "drop_rate": args.drop_rate, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
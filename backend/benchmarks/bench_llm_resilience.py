@@ -0,0 +1,111 @@
+"""
+LLMService behaviour as the upstream degrades, driven by the offline
+FakeProvider: a healthy phase, a degraded one (a share of calls fail with
+503/429 or hang past the attempt timeout), a full outage, and recovery.
+
+Calls arrive open-loop, one every --interval-ms. For each phase: how many
+generate_content calls succeeded, how many failed (503 = retries exhausted or
+breaker open, 504 = deadline), their latency percentiles, and how many upstream
+attempts were made. Latencies are scaled down so a run takes seconds; compare
+with --no-resilience (one attempt, no breaker, no deadline) to see what callers
+experienced before.
+
+    python -m benchmarks.bench_llm_resilience --calls 200 --interval-ms 2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+
+from benchmarks.common import percentile
+
+PHASES = [
+    ("healthy", {"error_rate": 0.0, "hang_rate": 0.0}),
+    ("degraded", {"error_rate": 0.3, "hang_rate": 0.05}),
+    ("outage", {"error_rate": 1.0, "hang_rate": 0.0}),
+    ("recovered", {"error_rate": 0.0, "hang_rate": 0.0}),
+]
+
+
+async def run_phase(llm, calls: int, interval: float, phase: str) -> dict:
+    latencies, outcomes = [], {"ok": 0, "unavailable": 0, "timeout": 0, "error": 0}
+    upstream_before = llm.provider.calls
+
+    async def one(i):
+        await asyncio.sleep(i * interval)
+        started = time.perf_counter()
+        try:
+            await llm.generate_content(f'Topic: "{phase}"\nSlide Title: "Slide {i}"\n\nTask:', bypass_cache=True)
+            outcomes["ok"] += 1
+        except Exception as e:
+            code = getattr(e, "status_code", None)
+            outcomes["timeout" if code == 504 else "unavailable" if code == 503 else "error"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return {
+        **outcomes,
+        "upstream_attempts": llm.provider.calls - upstream_before,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "breaker": llm.breaker.state,
+    }
+
+
+async def run(args) -> dict:
+    from app.services.llm_limiter import ConcurrencyLimiter
+    from app.services.llm_provider import FakeProvider
+    from app.services.llm_resilience import CircuitBreaker, RetryPolicy
+    from app.services.llm_service import LLMService
+
+    provider = FakeProvider(latency_ms=args.latency_ms, ms_per_token=0.2, error_status=503, seed=args.seed)
+    llm = LLMService(provider=provider)
+    llm.limiter = ConcurrencyLimiter(max_concurrency=args.calls, max_queue=args.calls)
+    if args.no_resilience:
+        llm.retry = RetryPolicy(retries=0)
+        llm.breaker = CircuitBreaker(min_calls=10 ** 9)
+    else:
+        # Scaled with the fake's latency so the breaker's cooldown passes during "recovered"
+        llm.retry = RetryPolicy(base=args.latency_ms / 1000, cap=args.latency_ms / 100)
+        llm.breaker = CircuitBreaker(window=5, min_calls=10, cooldown=args.cooldown_s)
+
+    results = {}
+    for phase, faults in PHASES:
+        provider.error_rate = faults["error_rate"]
+        provider.hang_rate = faults["hang_rate"]
+        if phase == "recovered":
+            await asyncio.sleep(args.cooldown_s)
+        results[phase] = await run_phase(llm, args.calls, args.interval_ms / 1000, phase)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=2.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--attempt-timeout-s", type=float, default=0.2)
+    parser.add_argument("--deadline-s", type=float, default=1.0)
+    parser.add_argument("--cooldown-s", type=float, default=0.5)
+    parser.add_argument("--hang-s", type=float, default=5.0, help="how long a hung call blocks without deadlines")
+    parser.add_argument("--no-resilience", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["LLM_ATTEMPT_TIMEOUT"] = str(args.hang_s if args.no_resilience else args.attempt_timeout_s)
+    os.environ["LLM_CALL_DEADLINE"] = str(args.hang_s if args.no_resilience else args.deadline_s)
+
+    # The service logs every failed call; keep stdout to the JSON report
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+    print(json.dumps({"resilience": not args.no_resilience, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
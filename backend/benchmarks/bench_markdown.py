@@ -0,0 +1,112 @@
+"""
+Markdown handling cost per section: the old export path (three uncompiled
+re.sub passes that strip formatting, then split/strip/lstrip per line) versus
+the single-pass tokenizer in app.services.markdown_parser, which also keeps
+bold/italic runs, numbered lists and nesting levels.
+
+The tokenizer does more work than the stripping chain, so the end-to-end .docx
+render of the same corpus (old renderer vs DocGenService) is reported too;
+that is the number exports actually feel.
+
+    python -m benchmarks.bench_markdown --sections 2000 --repeat 5 --render-sections 100
+"""
+import argparse
+import json
+import re
+import time
+
+from docx import Document
+
+from app.services.doc_gen_service import doc_gen_service
+from app.services.markdown_parser import parse_markdown
+
+SECTION = "\n".join([
+    "## Market Overview",
+    "The **electric vehicle** market grew *rapidly* over the last five years, "
+    "driven by falling battery costs and ***policy incentives***.",
+    "",
+    "- **Cost**: pack prices fell 14% year on year",
+    "  - *Range* anxiety is declining",
+    "  - Charging networks are maturing",
+    "- Consumer sentiment improved across key regions",
+    "",
+    "1. Expand charging partnerships",
+    "2. Invest in **solid-state** research",
+    "3. Target fleet operators",
+    "",
+    "In summary, the outlook remains *positive* with **strong** demand signals.",
+])
+
+
+def legacy_lines(text: str) -> list:
+    """The pre-tokenizer pipeline: strip markers, then classify line by line"""
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
+    lines = []
+    for line in text.strip().split('\n'):
+        if line.strip():
+            if line.strip().startswith(('-', '•', '*')):
+                lines.append(("bullet", line.strip().lstrip('-•* ')))
+            else:
+                lines.append(("paragraph", line))
+    return lines
+
+
+def legacy_create_docx(project_title: str, sections: list) -> Document:
+    """The pre-tokenizer DocGenService.create_docx body (without saving)"""
+    doc = Document()
+    doc.add_heading(project_title, 0)
+    for section in sections:
+        doc.add_heading(section["title"], 1)
+        for kind, line in legacy_lines(section["content"]):
+            if kind == "bullet":
+                doc.add_paragraph(line, style='List Bullet')
+            else:
+                doc.add_paragraph(line)
+        doc.add_paragraph()
+    return doc
+
+
+def measure(fn, corpus: list, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "sections_per_sec": round(len(corpus) / best),
+        "us_per_section": round(best / len(corpus) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--render-sections", type=int, default=100)
+    args = parser.parse_args()
+
+    # Distinct strings so the regex engine can't lean on any per-string caching
+    corpus = [f"{SECTION}\n\nSection {i} closing note." for i in range(args.sections)]
+    results = {
+        "legacy_regex_chain": measure(legacy_lines, corpus, args.repeat),
+        "tokenizer": measure(parse_markdown, corpus, args.repeat),
+    }
+    results["parse_speedup"] = round(
+        results["tokenizer"]["sections_per_sec"] / results["legacy_regex_chain"]["sections_per_sec"], 2
+    )
+
+    sections = [{"title": f"Section {i + 1}", "content": text} for i, text in enumerate(corpus[:args.render_sections])]
+    for label, render in (("legacy_docx_render", legacy_create_docx), ("docx_render", doc_gen_service.create_docx)):
+        timing = measure(lambda project: render(project, sections), ["Benchmark Project"], args.repeat)
+        results[label] = {"us_per_section": round(timing["us_per_section"] / len(sections), 1)}
+    results["render_speedup"] = round(
+        results["legacy_docx_render"]["us_per_section"] / results["docx_render"]["us_per_section"], 2
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
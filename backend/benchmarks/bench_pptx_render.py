@@ -0,0 +1,73 @@
+"""
+Slides per second for 100-slide decks: DocGenService.create_pptx (a fresh
+Presentation and python-pptx placeholder calls per slide) versus the cached
+SlideTemplate in app.services.pptx_template (prototype slide XML cloned and
+filled per section). The one-off cost of parsing the template is reported
+separately; pass --template to measure a branded .pptx instead of the default.
+
+    python -m benchmarks.bench_pptx_render --decks 20 --slides 100
+"""
+import argparse
+import json
+import time
+
+from app.services.doc_gen_service import doc_gen_service
+from app.services.pptx_template import SlideTemplate, get_template
+
+SLIDE = "\n".join([
+    "## Key Drivers",
+    "- **Cost**: pack prices fell 14% year on year",
+    "  - *Range* anxiety is declining",
+    "- Charging networks are maturing",
+    "1. Expand charging partnerships",
+    "2. Invest in **solid-state** research",
+])
+
+
+def make_sections(count: int) -> list:
+    return [{"title": f"Slide {i + 1}", "content": SLIDE} for i in range(count)]
+
+
+def measure(render, decks: int, slides: int) -> dict:
+    sections = make_sections(slides)
+    render(sections)  # warm up
+    started = time.perf_counter()
+    size = 0
+    for _ in range(decks):
+        size = len(render(sections).getvalue())
+    elapsed = time.perf_counter() - started
+    return {
+        "ms_per_deck": round(elapsed / decks * 1000, 1),
+        "slides_per_sec": round(decks * (slides + 1) / elapsed, 1),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--decks", type=int, default=20)
+    parser.add_argument("--slides", type=int, default=100)
+    parser.add_argument("--template", default=None, help="a .pptx to use as the template")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    SlideTemplate(args.template)
+    parse_ms = (time.perf_counter() - started) * 1000
+    template = get_template(args.template)
+
+    results = {
+        "python_pptx": measure(
+            lambda sections: doc_gen_service.create_pptx("Benchmark Deck", sections, template=args.template),
+            args.decks, args.slides,
+        ),
+        "template_clone": measure(
+            lambda sections: template.render("Benchmark Deck", sections), args.decks, args.slides
+        ),
+    }
+    results["template_clone"]["template_parse_ms"] = round(parse_ms, 1)
+    results["speedup"] = round(results["template_clone"]["slides_per_sec"] / results["python_pptx"]["slides_per_sec"], 1)
+    print(json.dumps({"decks": args.decks, "slides": args.slides, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
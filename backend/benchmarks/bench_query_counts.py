@@ -0,0 +1,71 @@
+"""
+Database round trips per endpoint, read from the X-DB-Queries response header,
+with the scoped SQL functions (sql/scoped_writes.sql) installed and without
+them (two-step fallback). Gemini is replaced by a canned response.
+
+    python -m benchmarks.bench_query_counts
+"""
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.common import boot_app, mint_token
+from benchmarks.stub_supabase import StubSupabase, install_scoped_rpc
+
+
+class _CannedResponse:
+    parts = [True]
+    text = "Generated **content** for the section."
+
+
+async def _canned_generate(*args, **kwargs):
+    return _CannedResponse()
+
+
+async def count_queries(app, stub: StubSupabase, user_id: str) -> dict:
+    project = stub.insert("projects", {"user_id": user_id, "title": "Queries", "type": "docx", "status": "draft"})
+    section = stub.insert("sections", {"project_id": project["id"], "title": "Intro", "content": "", "order_index": 0})
+    headers = {"Authorization": f"Bearer {mint_token(user_id)}"}
+    calls = [
+        ("GET", f"/projects/{project['id']}/sections", None),
+        ("POST", f"/projects/{project['id']}/sections", {"title": "New", "content": "", "order_index": 1}),
+        ("PATCH", f"/projects/{project['id']}/sections/{section['id']}", {"title": "Intro", "content": "x", "order_index": 0}),
+        ("POST", f"/generate/section/{section['id']}", {"section_id": section["id"], "bypass_cache": True}),
+        ("POST", f"/generate/refine/{section['id']}",
+         {"section_id": section["id"], "refinement_prompt": "Shorter", "bypass_cache": True}),
+    ]
+    counts = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for method, url, body in calls:
+            response = await client.request(method, url, headers=headers, json=body)
+            label = f"{method} {url.replace(project['id'], '{project_id}').replace(section['id'], '{section_id}')}"
+            counts[label] = int(response.headers["x-db-queries"]) if response.status_code < 400 else response.status_code
+    return counts
+
+
+def main():
+    stub = StubSupabase()
+    stub.start()
+    app = boot_app(stub)
+
+    from app.services.llm_service import llm_service
+    from app.services.repository import repository
+    llm_service.provider.model.generate_content_async = _canned_generate
+
+    user_id = "00000000-0000-0000-0000-000000000003"
+    results = {}
+    for mode in ("scoped_rpc", "fallback"):
+        stub.rpc.clear()
+        if mode == "scoped_rpc":
+            install_scoped_rpc(stub)
+        repository.scoped_rpc = True
+        results[mode] = asyncio.run(count_queries(app, stub, user_id))
+
+    stub.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
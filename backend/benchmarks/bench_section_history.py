@@ -0,0 +1,94 @@
+"""
+Section history storage and autosave payload sizes: a full copy per version
+(the old section_history) versus snapshots every HISTORY_SNAPSHOT_INTERVAL
+versions with line diffs in between, plus the time to rebuild a version.
+
+Simulates a ~4 KB section going through a mix of small autosave edits and
+paragraph-level refinements.
+
+    python -m benchmarks.bench_section_history --versions 200
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.section_history import (
+    HISTORY_SNAPSHOT_INTERVAL, apply_delta, build_entry, compaction_bounds, rebuild
+)
+
+PARAGRAPH = (
+    "Battery pack prices fell sharply over the period, which lowered the entry price "
+    "of mid-range models and widened the addressable market.\n"
+)
+
+
+def edit(text: str, rng: random.Random):
+    """Return (new_text, editor_delta or None) for one simulated change"""
+    lines = text.splitlines(keepends=True)
+    if rng.random() < 0.7:
+        # Autosave: a few characters typed somewhere
+        position = rng.randrange(len(text) + 1)
+        typed = rng.choice(["the ", "market ", "rapidly ", ", and "])
+        return text[:position] + typed + text[position:], [[position, position, typed]]
+    # Refinement: one paragraph rewritten
+    index = rng.randrange(len(lines))
+    lines[index] = f"Rewritten paragraph {rng.randrange(10 ** 6)}: " + PARAGRAPH
+    return "".join(lines), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--versions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text = PARAGRAPH * 30
+    texts, rows = {}, []
+    full_bytes = stored_bytes = full_request_bytes = delta_request_bytes = 0
+
+    for version in range(1, args.versions + 1):
+        previous = texts.get(version - 1)
+        if previous is None:
+            new, delta = text, None
+        else:
+            new, delta = edit(previous, rng)
+        entry = build_entry("s", version, "edit", previous, new, delta)
+        rows.append(entry)
+        texts[version] = new
+
+        full_bytes += len(new)
+        stored_bytes += len(entry["content"] or "") + len(json.dumps(entry["delta"] or []))
+        full_request_bytes += len(json.dumps({"content": new}))
+        delta_request_bytes += len(json.dumps({"base_version": version - 1, "delta": delta} if delta else {"content": new}))
+
+    assert all(apply_delta(texts[r["version"] - 1], r["delta"]) == texts[r["version"]] for r in rows if r["kind"] == "diff")
+
+    started = time.perf_counter()
+    for version in texts:
+        window = [r for r in rows if version - HISTORY_SNAPSHOT_INTERVAL < r["version"] <= version]
+        assert rebuild(window, version) == texts[version]
+    rebuild_us = (time.perf_counter() - started) / len(texts) * 1e6
+
+    keep_from, drop_through = compaction_bounds(args.versions)
+    retained = [
+        r for r in rows
+        if r["version"] > drop_through and not (r["kind"] == "diff" and r["version"] < keep_from)
+    ]
+
+    print(json.dumps({
+        "versions": args.versions,
+        "snapshot_interval": HISTORY_SNAPSHOT_INTERVAL,
+        "history_bytes_full_copies": full_bytes,
+        "history_bytes_snapshots_and_diffs": stored_bytes,
+        "history_compression": round(full_bytes / stored_bytes, 1),
+        "rows_after_compaction": len(retained),
+        "autosave_request_bytes_full": full_request_bytes,
+        "autosave_request_bytes_delta": delta_request_bytes,
+        "rebuild_us_per_version": round(rebuild_us, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Shared helpers for the benchmark scripts: booting the FastAPI app against the
+stub Supabase server, minting test JWTs and driving concurrent load.
+
+Run benchmarks from the backend/ directory, e.g. `python -m benchmarks.bench_auth`.
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+import jwt
+
+from benchmarks.stub_supabase import StubSupabase
+
+BENCH_JWT_SECRET = "bench-jwt-secret-with-at-least-32-bytes!!"
+
+
+def boot_app(stub: StubSupabase, **env):
+    """Point the app's settings at the stub server and import main.app"""
+    os.environ["SUPABASE_URL"] = stub.url
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "bench-service-role-key"
+    os.environ.setdefault("GEMINI_API_KEY", "bench-gemini-key")
+    os.environ.setdefault("SUPABASE_JWT_SECRET", BENCH_JWT_SECRET)
+    # Load tests measure the app, not the request limits on /generate
+    os.environ.setdefault("RATE_LIMIT_USER_PER_MINUTE", "0")
+    os.environ.setdefault("RATE_LIMIT_GLOBAL_PER_MINUTE", "0")
+    os.environ.update({k: str(v) for k, v in env.items()})
+
+    from main import app
+    return app
+
+
+def mint_token(user_id: str, email: str = "bench@example.com", ttl: int = 3600,
+               secret: str = BENCH_JWT_SECRET) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": user_id,
+        "email": email,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "iat": now,
+        "exp": now + ttl,
+    }
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run_load(app, method: str, url: str, total: int, concurrency: int,
+                   headers: dict = None, json_body=None) -> dict:
+    """Fire `total` requests at the ASGI app with at most `concurrency` in flight
+
+    Latency is measured from when a request was issued (burst start, or when it
+    got a concurrency slot), so time spent stuck behind a blocked event loop counts.
+    """
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                issued = burst_started if total <= concurrency else time.perf_counter()
+                response = await client.request(method, url, headers=headers, json=json_body)
+                latencies.append(time.perf_counter() - issued)
+                if response.status_code >= 400:
+                    errors += 1
+
+        burst_started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - burst_started
+
+    return summarize(latencies, elapsed, errors)
@@ -0,0 +1,435 @@
+"""
+In-process stand-in for the Supabase auth and PostgREST HTTP APIs.
+
+Only the subset the NexWrit backend uses is implemented: GET /auth/v1/user,
+and select/insert/upsert/update/delete on /rest/v1/<table> with eq/neq/lt/gt/in
+filters, ordering, limit/offset and one level of embedded resources
+("*, projects(*)" or "*, comments(*)"). RPC functions can be registered as
+plain Python callables; install_scoped_rpc() registers Python versions of the
+functions in sql/scoped_writes.sql. Each endpoint can be given an artificial latency to
+model the network hop to a real Supabase project.
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+}
+
+# Column defaults the real schema fills in on insert
+_DEFAULTS = {"sections": {"version": 0}}
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _coerce(raw: str, sample):
+    """Cast a filter literal to the type of the stored column value"""
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        raw = raw[1:-1]
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if raw == "null":
+        return None
+    return raw.strip('"')
+
+
+def _error(message: str, code: str) -> dict:
+    """PostgREST error body (postgrest-py expects all four keys)"""
+    return {"message": message, "code": code, "hint": None, "details": None}
+
+
+def _split_select(select: str) -> list:
+    """Split a select list on top-level commas ("*, sections(*, comments(*))")"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in select:
+        if char == '"':
+            quoted = not quoted
+        elif char == "," and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ""
+            continue
+        elif not quoted:
+            depth += char == "("
+            depth -= char == ")"
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_logic(expr: str):
+    """Parse an `or`/`and` filter body "(a.eq.1,and(b.gt.2,c.lt.3))" into a tree"""
+    items = []
+    for part in _split_select(expr[1:-1]):
+        for op in ("and", "or"):
+            if part.startswith(op + "("):
+                items.append((op, _parse_logic(part[len(op):])))
+                break
+        else:
+            column, _, condition = part.partition(".")
+            items.append(("filter", (column, condition)))
+    return items
+
+
+def _sort(rows: list, order: str) -> list:
+    for clause in reversed(order.split(",")):
+        column, _, direction = clause.partition(".")
+        rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction.startswith("desc"))
+    return rows
+
+
+def _singular(name: str) -> str:
+    return name[:-1] if name.endswith("s") else name
+
+
+class StubSupabase:
+    """Threaded HTTP server holding tables in memory"""
+
+    def __init__(self, auth_latency: float = 0.0, rest_latency: float = 0.0):
+        self.auth_latency = auth_latency
+        self.rest_latency = rest_latency
+        self.tables = {}
+        self.users = {}  # token -> user dict
+        self.rpc = {}  # function name -> callable(stub, params) -> json-able
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --- fixture helpers ---
+    def add_user(self, token: str, user_id: str = None, email: str = "bench@example.com") -> dict:
+        user = {
+            "id": user_id or str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": _now(),
+        }
+        self.users[token] = user
+        return user
+
+    def insert(self, table: str, row: dict) -> dict:
+        row = {**_DEFAULTS.get(table, {}), **row}
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now())
+        with self._lock:
+            self.tables.setdefault(table, []).append(row)
+        return row
+
+    # --- lifecycle ---
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.stub = stub
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+
+    # --- query engine ---
+    def _count(self, key: str):
+        with self._lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def _matches_logic(self, row: dict, op: str, items: list) -> bool:
+        results = (
+            self._matches(row, [value]) if kind == "filter" else self._matches_logic(row, kind, value)
+            for kind, value in items
+        )
+        return any(results) if op == "or" else all(results)
+
+    def _matches(self, row: dict, filters: list) -> bool:
+        for column, expr in filters:
+            if column in ("or", "and"):
+                if not self._matches_logic(row, column, _parse_logic(expr)):
+                    return False
+                continue
+            negate = expr.startswith("not.")
+            if negate:
+                expr = expr[4:]
+            op, _, raw = expr.partition(".")
+            value = row.get(column)
+            if op == "in":
+                options = [_coerce(v, value) for v in raw.strip("()").split(",") if v]
+                ok = value in options
+            elif op == "is":
+                ok = value is None if raw == "null" else value == (raw == "true")
+            elif op in _OPERATORS:
+                ok = _OPERATORS[op](value, _coerce(raw, value))
+            else:
+                ok = True
+            if ok == negate:
+                return False
+        return True
+
+    def _embed(self, table: str, row: dict, select: str, opts: dict = None, prefix: str = "") -> dict:
+        """Project `row` through a select list, resolving embedded resources recursively
+
+        Embedded filters ("projects.user_id=eq.x") narrow the embedded rows; with
+        "!inner" the parent is dropped (None is returned) when nothing matches.
+        """
+        opts = opts or {}
+        parts = _split_select(select) if select else ["*"]
+        plain = [p for p in parts if "(" not in p]
+        if "*" in plain or not plain:
+            out = dict(row)
+        else:
+            out = {k: row.get(k) for k in plain}
+        for part in parts:
+            if "(" not in part:
+                continue
+            head, inner_select = part[: part.index("(")], part[part.index("(") + 1: part.rindex(")")]
+            alias = head.split(":")[0] if ":" in head else None
+            name = head.split(":")[-1].split("!")[0]
+            inner_join = "!inner" in head
+            path = f"{prefix}{name}"
+            filters = [
+                (k[len(path) + 1:], v) for k, v in opts.get("__embedded__", [])
+                if k.startswith(path + ".") and "." not in k[len(path) + 1:]
+                and k[len(path) + 1:] not in ("order", "limit", "offset")
+            ]
+            fk = f"{_singular(name)}_id"
+            if fk in row:
+                # many-to-one: sections -> projects
+                target = next((r for r in self.tables.get(name, []) if r["id"] == row[fk]), None)
+                if target is not None and self._matches(target, filters):
+                    embedded = self._embed(name, target, inner_select, opts, path + ".")
+                else:
+                    embedded = None
+                if inner_join and embedded is None:
+                    return None
+            else:
+                # one-to-many: sections -> comments
+                back = f"{_singular(table)}_id"
+                children = [r for r in self.tables.get(name, []) if r.get(back) == row["id"] and self._matches(r, filters)]
+                if opts.get(f"{path}.order"):
+                    _sort(children, opts[f"{path}.order"])
+                embedded = [self._embed(name, r, inner_select, opts, path + ".") for r in children]
+                embedded = [r for r in embedded if r is not None]
+                if f"{path}.limit" in opts:
+                    embedded = embedded[: int(opts[f"{path}.limit"])]
+                if inner_join and not embedded:
+                    return None
+            out[alias or name] = embedded
+        return out
+
+    def select(self, table: str, params: list) -> list:
+        filters = [(k, v) for k, v in params if k not in _RESERVED_PARAMS and "." not in k]
+        opts = dict(params)
+        opts["__embedded__"] = [(k, v) for k, v in params if "." in k]
+        rows = [r for r in self.tables.get(table, []) if self._matches(r, filters)]
+        if "order" in opts:
+            _sort(rows, opts["order"])
+        rows = [out for out in (self._embed(table, r, opts.get("select", "*"), opts) for r in rows) if out is not None]
+        offset = int(opts.get("offset", 0))
+        rows = rows[offset:]
+        if "limit" in opts:
+            rows = rows[: int(opts["limit"])]
+        return rows
+
+    def write(self, method: str, table: str, params: list, body, prefer: str) -> list:
+        filters = [(k, v) for k, v in params if k not in _RESERVED_PARAMS and "." not in k]
+        opts = dict(params)
+        with self._lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                payload = body if isinstance(body, list) else [body]
+                conflict = opts.get("on_conflict", "id").split(",")
+                out = []
+                for item in payload:
+                    existing = None
+                    if "merge-duplicates" in prefer or "ignore-duplicates" in prefer:
+                        existing = next(
+                            (r for r in rows if all(k in item and r.get(k) == item[k] for k in conflict)), None
+                        )
+                    if existing is not None:
+                        if "merge-duplicates" in prefer:
+                            existing.update(item)
+                        out.append(existing)
+                        continue
+                    row = {**_DEFAULTS.get(table, {}), **item}
+                    row.setdefault("id", str(uuid.uuid4()))
+                    row.setdefault("created_at", _now())
+                    rows.append(row)
+                    out.append(row)
+                return [dict(r) for r in out]
+            matched = [r for r in rows if self._matches(r, filters)]
+            if method == "PATCH":
+                for r in matched:
+                    r.update(body)
+            elif method == "DELETE":
+                self.tables[table] = [r for r in rows if r not in matched]
+            return [dict(r) for r in matched]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    stub: StubSupabase = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload=None):
+        body = json.dumps(payload, default=str).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _handle(self):
+        stub = self.stub
+        parts = urlsplit(self.path)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        path = parts.path
+        body = self._body()  # always drain it, or a stray body corrupts the keep-alive stream
+
+        if path == "/auth/v1/user":
+            stub._count("auth")
+            time.sleep(stub.auth_latency)
+            token = (self.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+            user = stub.users.get(token)
+            if user is None:
+                return self._send(401, {"msg": "invalid JWT", "code": 401})
+            return self._send(200, user)
+
+        if path.startswith("/rest/v1/rpc/"):
+            name = path.rsplit("/", 1)[-1]
+            stub._count(f"rpc:{name}")
+            time.sleep(stub.rest_latency)
+            fn = stub.rpc.get(name)
+            if fn is None:
+                return self._send(404, _error(f"function {name} not found", "PGRST202"))
+            try:
+                return self._send(200, fn(stub, body or dict(params)))
+            except LookupError as e:
+                return self._send(404, _error(str(e), "P0002"))
+
+        if path.startswith("/rest/v1/"):
+            table = path[len("/rest/v1/"):]
+            stub._count(f"{self.command} {table}")
+            time.sleep(stub.rest_latency)
+            if self.command == "GET":
+                rows = stub.select(table, params)
+            else:
+                rows = stub.write(self.command, table, params, body, self.headers.get("Prefer", ""))
+                if "select" in dict(params):
+                    rows = [stub._embed(table, r, dict(params)["select"]) for r in rows]
+            if "vnd.pgrst.object" in (self.headers.get("Accept") or ""):
+                if len(rows) != 1:
+                    return self._send(406, _error("JSON object requested, multiple (or no) rows returned", "PGRST116"))
+                return self._send(200, rows[0])
+            return self._send(200 if self.command != "POST" else 201, rows)
+
+        self._send(404, {"message": "not found"})
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+
+def install_scoped_rpc(stub: StubSupabase):
+    """Register stand-ins for the SQL functions in sql/scoped_writes.sql"""
+
+    def owned(project_id, user_id):
+        return any(p["id"] == project_id and p.get("user_id") == user_id for p in stub.tables.get("projects", []))
+
+    def create_owned_section(stub, params):
+        if not owned(params["p_project_id"], params["p_user_id"]):
+            return []
+        return [stub.insert("sections", {
+            "project_id": params["p_project_id"],
+            "title": params["p_title"],
+            "content": params["p_content"],
+            "order_index": params["p_order_index"],
+        })]
+
+    def update_owned_section(stub, params):
+        if not owned(params["p_project_id"], params["p_user_id"]):
+            return []
+        patch = {k: v for k, v in params["p_patch"].items() if k in ("title", "content")}
+        return stub.write("PATCH", "sections", [("id", f"eq.{params['p_section_id']}"),
+                                                ("project_id", f"eq.{params['p_project_id']}")], patch, "")
+
+    def save_section_content(stub, params):
+        update = {"content": params["p_content"], "version": params["p_expected_version"] + 1}
+        if params.get("p_title"):
+            update["title"] = params["p_title"]
+        updated = stub.write("PATCH", "sections", [("id", f"eq.{params['p_section_id']}"),
+                                                   ("project_id", f"eq.{params['p_project_id']}"),
+                                                   ("version", f"eq.{params['p_expected_version']}")], update, "")
+        for row in updated:
+            history = params["p_history"]
+            stub.insert("section_history", {
+                "section_id": row["id"], "version": row["version"], "kind": history["kind"],
+                "prompt": history["prompt"], "content": history["content"], "delta": history["delta"],
+            })
+        return updated
+
+    def merge_context_digest(stub, params):
+        for project in stub.tables.get("projects", []):
+            if project["id"] == params["p_project_id"] and project.get("user_id") == params["p_user_id"]:
+                digest = {k: v for k, v in (project.get("context_digest") or {}).items()
+                          if k not in params["p_removed"]}
+                digest.update(params["p_entries"])
+                return stub.write("PATCH", "projects", [("id", f"eq.{project['id']}")],
+                                  {"context_digest": digest}, "")
+        return []
+
+    def create_project_with_sections(stub, params):
+        project = stub.insert("projects", {"user_id": params["p_user_id"], "title": params["p_title"],
+                                           "type": params["p_type"], "status": "draft"})
+        sections = [stub.insert("sections", {"project_id": project["id"], "title": title, "content": None,
+                                             "order_index": index})
+                    for index, title in enumerate(params["p_section_titles"])]
+        return {**project, "sections": sections}
+
+    stub.rpc.update({
+        "create_owned_section": create_owned_section,
+        "update_owned_section": update_owned_section,
+        "save_section_content": save_section_content,
+        "merge_context_digest": merge_context_digest,
+        "create_project_with_sections": create_project_with_sections,
+    })
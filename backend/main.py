@@ -1,11 +1,49 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from typing import Optional
+import asyncio
+import hmac
 import os
 
 load_dotenv()
 
-app = FastAPI(title="NexWrit API", description="AI-Assisted Document Authoring Platform Backend")
+# Build the Supabase/LLM clients and open a database connection right after startup,
+# in the background, so the first request usually finds them ready without delaying boot
+WARM_UP_CLIENTS = os.environ.get("WARM_UP_CLIENTS", "true").lower() == "true"
+# When set, GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+async def _warm_up_clients():
+    from app.services.llm_service import get_llm_service
+    from app.services.repository import repository
+    # One after the other: both are mostly imports competing for the GIL, and most
+    # first requests need the database rather than the model
+    for warm_up in (repository.warm_up, lambda: asyncio.to_thread(get_llm_service().warm_up)):
+        try:
+            await warm_up()
+        except Exception as e:
+            print(f"Client warm-up failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.services.render_pool import render_pool
+    # Spawn render workers now so the first export doesn't pay process start-up
+    render_pool.warm_up()
+    warm_up = asyncio.create_task(_warm_up_clients()) if WARM_UP_CLIENTS else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    # Release the Supabase worker threads, pooled HTTP connections and render processes
+    from app.services.repository import repository
+    from app.services import supabase_client
+    repository.shutdown()
+    supabase_client.close()
+    render_pool.shutdown()
+
+app = FastAPI(title="NexWrit API", description="AI-Assisted Document Authoring Platform Backend", lifespan=lifespan)
 
 # CORS Configuration
 origins = [
@@ -20,12 +58,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # So the frontend can back off on 429s and show the remaining daily budget
+    expose_headers=[
+        "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining",
+        "X-Token-Budget-Prompt-Remaining", "X-Token-Budget-Completion-Remaining",
+    ],
 )
 
+from app.middleware.request_scope import RequestScopeMiddleware, query_stats
+
+# Per-request project cache and database round-trip counting (X-DB-Queries header)
+app.add_middleware(RequestScopeMiddleware)
+
+from app.middleware.metrics import MetricsMiddleware
+from app.services.metrics import registry
+
+# Added last so it wraps everything else: request counts/latency, stage histograms, Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to NexWrit API"}
 
+@app.get("/health")
+async def health():
+    """Liveness check plus LLM in-flight/queued counts, cache/batching/breaker/rate limit counters and per-endpoint query counts"""
+    from app.services.llm_service import get_llm_service
+    from app.services.rate_limit import rate_limiter
+    llm_service = get_llm_service()
+    return {
+        "status": "ok",
+        "llm": llm_service.limiter.stats(),
+        "llm_cache": llm_service.cache.stats(),
+        "llm_batching": llm_service.batcher.stats(),
+        "llm_breaker": llm_service.breaker.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "db_queries": query_stats.stats()
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of request, stage, LLM and render metrics"""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Imported eagerly on purpose: routes have to be registered before the app serves (or
+# builds its OpenAPI schema), so deferring these to startup wouldn't bring the first
+# request any closer. What made them slow to import (the Gemini SDK, the supabase client,
+# python-docx/python-pptx) is loaded on first use or by the warm-up above.
 from app.routers import auth, projects, generate, export
 
 app.include_router(auth.router)
@@ -0,0 +1,5 @@
+-- Per-project context digest for section prompts (app/services/project_context.py).
+-- Run once in the Supabase SQL editor; safe to re-run.
+
+-- {section_id: {"version": n, "summary": "..."}}
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS context_digest JSONB;
@@ -0,0 +1,123 @@
+-- Single round-trip, ownership-scoped writes used by app/services/repository.py.
+-- Run once in the Supabase SQL editor after schema.sql. The backend falls back to
+-- plain PostgREST queries (one extra round trip) when these functions are missing.
+--
+-- They take the user id as a parameter, so they are only executable by the
+-- service role the backend connects with, never by anon/authenticated clients.
+
+-- Insert a section only if the project belongs to the user (no row = not found)
+CREATE OR REPLACE FUNCTION create_owned_section(
+  p_project_id UUID,
+  p_user_id UUID,
+  p_title TEXT,
+  p_content TEXT,
+  p_order_index INTEGER
+) RETURNS SETOF sections
+LANGUAGE sql AS $$
+  INSERT INTO sections (project_id, title, content, order_index)
+  SELECT p.id, p_title, p_content, p_order_index
+  FROM projects p
+  WHERE p.id = p_project_id AND p.user_id = p_user_id
+  RETURNING *;
+$$;
+
+-- Patch title/content of a section scoped to an owned project
+CREATE OR REPLACE FUNCTION update_owned_section(
+  p_section_id UUID,
+  p_project_id UUID,
+  p_user_id UUID,
+  p_patch JSONB
+) RETURNS SETOF sections
+LANGUAGE sql AS $$
+  UPDATE sections s SET
+    title = CASE WHEN p_patch ? 'title' THEN p_patch->>'title' ELSE s.title END,
+    content = CASE WHEN p_patch ? 'content' THEN p_patch->>'content' ELSE s.content END,
+    updated_at = NOW()
+  FROM projects p
+  WHERE s.id = p_section_id
+    AND s.project_id = p_project_id
+    AND p.id = s.project_id
+    AND p.user_id = p_user_id
+  RETURNING s.*;
+$$;
+
+-- Store new content as the section's next version plus its history row (built by
+-- app/services/section_history.py) in one transaction. Nothing is written if the
+-- section is no longer at p_expected_version. Requires section_history.sql.
+DROP FUNCTION IF EXISTS save_section_content(UUID, UUID, TEXT, TEXT);
+CREATE OR REPLACE FUNCTION save_section_content(
+  p_section_id UUID,
+  p_project_id UUID,
+  p_expected_version INTEGER,
+  p_title TEXT,
+  p_content TEXT,
+  p_history JSONB
+) RETURNS SETOF sections
+LANGUAGE sql AS $$
+  WITH updated AS (
+    UPDATE sections SET
+      title = COALESCE(p_title, title),
+      content = p_content,
+      version = p_expected_version + 1,
+      updated_at = NOW()
+    WHERE id = p_section_id AND project_id = p_project_id AND version = p_expected_version
+    RETURNING *
+  ), history AS (
+    INSERT INTO section_history (section_id, version, kind, prompt, content, delta)
+    SELECT id, version, p_history->>'kind', p_history->>'prompt', p_history->>'content', p_history->'delta'
+    FROM updated
+  )
+  SELECT * FROM updated;
+$$;
+
+-- Merge changed section entries into an owned project's context digest and drop
+-- removed sections, in one statement so concurrent generations don't overwrite
+-- each other's entries. Requires project_context.sql.
+CREATE OR REPLACE FUNCTION merge_context_digest(
+  p_project_id UUID,
+  p_user_id UUID,
+  p_entries JSONB,
+  p_removed TEXT[]
+) RETURNS SETOF projects
+LANGUAGE sql AS $$
+  UPDATE projects SET
+    context_digest = (COALESCE(context_digest, '{}'::jsonb) - p_removed) || p_entries
+  WHERE id = p_project_id AND user_id = p_user_id
+  RETURNING *;
+$$;
+
+-- Create a project and its empty sections (in the order of p_section_titles) in one
+-- transaction; returns the project row with a "sections" array
+CREATE OR REPLACE FUNCTION create_project_with_sections(
+  p_user_id UUID,
+  p_title TEXT,
+  p_type TEXT,
+  p_section_titles TEXT[]
+) RETURNS JSONB
+LANGUAGE sql AS $$
+  WITH project AS (
+    INSERT INTO projects (user_id, title, type, status)
+    VALUES (p_user_id, p_title, p_type, 'draft')
+    RETURNING *
+  ), created AS (
+    INSERT INTO sections (project_id, title, order_index)
+    SELECT project.id, t.title, t.position - 1
+    FROM project, unnest(p_section_titles) WITH ORDINALITY AS t(title, position)
+    RETURNING *
+  )
+  SELECT to_jsonb(project) || jsonb_build_object(
+    'sections', COALESCE((SELECT jsonb_agg(to_jsonb(c) ORDER BY c.order_index) FROM created c), '[]'::jsonb)
+  )
+  FROM project;
+$$;
+
+REVOKE EXECUTE ON FUNCTION create_owned_section(UUID, UUID, TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION update_owned_section(UUID, UUID, UUID, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION save_section_content(UUID, UUID, INTEGER, TEXT, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION merge_context_digest(UUID, UUID, JSONB, TEXT[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION create_project_with_sections(UUID, TEXT, TEXT, TEXT[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_owned_section(UUID, UUID, TEXT, TEXT, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION update_owned_section(UUID, UUID, UUID, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION save_section_content(UUID, UUID, INTEGER, TEXT, TEXT, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION merge_context_digest(UUID, UUID, JSONB, TEXT[]) TO service_role;
+GRANT EXECUTE ON FUNCTION create_project_with_sections(UUID, TEXT, TEXT, TEXT[]) TO service_role;
@@ -0,0 +1,37 @@
+-- Versioned sections and delta-compressed history (app/services/section_history.py).
+-- Run once in the Supabase SQL editor; safe to re-run.
+
+ALTER TABLE sections ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE section_history
+  ADD COLUMN IF NOT EXISTS version INTEGER,
+  ADD COLUMN IF NOT EXISTS kind TEXT NOT NULL DEFAULT 'snapshot' CHECK (kind IN ('snapshot', 'diff')),
+  ADD COLUMN IF NOT EXISTS delta JSONB;
+ALTER TABLE section_history ALTER COLUMN content DROP NOT NULL;
+
+-- Existing rows are full copies: number them per section in the order they were written
+UPDATE section_history h SET version = n.rn
+FROM (
+  SELECT id, ROW_NUMBER() OVER (PARTITION BY section_id ORDER BY created_at, id) AS rn
+  FROM section_history
+) n
+WHERE h.id = n.id AND h.version IS NULL;
+
+-- Manual edits were never recorded, so snapshot any section whose text differs
+-- from its last history entry; later diffs are taken against this text
+INSERT INTO section_history (section_id, version, kind, prompt, content)
+SELECT s.id, COALESCE(h.version, 0) + 1, 'snapshot', 'Current content', s.content
+FROM sections s
+LEFT JOIN LATERAL (
+  SELECT version, content FROM section_history
+  WHERE section_id = s.id ORDER BY version DESC LIMIT 1
+) h ON TRUE
+WHERE s.content IS NOT NULL AND h.content IS DISTINCT FROM s.content;
+
+UPDATE sections s SET version = COALESCE(
+  (SELECT MAX(version) FROM section_history h WHERE h.section_id = s.id), 0
+);
+
+ALTER TABLE section_history ALTER COLUMN version SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS section_history_section_version
+  ON section_history (section_id, version);
@@ -0,0 +1,129 @@
+"""
+Fixtures for the API tests: the app booted against the stub Supabase server
+from benchmarks/, with Gemini replaced by FakeProvider.
+
+Run from the backend/ directory: `python -m pytest tests`.
+"""
+import asyncio
+import tempfile
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.common import boot_app, mint_token
+from benchmarks.stub_supabase import StubSupabase, install_scoped_rpc
+
+# Booted on import: the app's modules read SUPABASE_URL and friends when test modules import them
+_stub = StubSupabase()
+_stub.start()
+# Exports render inline (no worker processes) into a throwaway artifact directory
+_app = boot_app(_stub, LLM_CACHE_ENABLED="false", EXPORT_RENDER_WORKERS="0",
+                EXPORT_ARTIFACT_DIR=tempfile.mkdtemp(prefix="nexwrit-test-exports-"))
+
+from app.services.llm_provider import LLMProvider, LLMResponse  # noqa: E402
+
+
+class FakeProvider(LLMProvider):
+    """Answers every prompt with `text` after `delay` seconds; `on_generate` runs before each answer"""
+
+    model_name = "fake"
+
+    def __init__(self, text: str = "Generated **content**.", on_generate=None, delay: float = 0.0):
+        self.text = text
+        self.on_generate = on_generate
+        self.delay = delay
+        self.prompts = []
+        self.running = 0
+        self.peak = 0  # most calls running at once
+
+    async def generate(self, prompt: str, json_output: bool = False) -> LLMResponse:
+        self.prompts.append(prompt)
+        if self.on_generate is not None:
+            self.on_generate(prompt)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return LLMResponse(self.text, prompt_tokens=10, completion_tokens=5)
+
+
+@pytest.fixture(scope="session")
+def stub():
+    yield _stub
+    _stub.stop()
+
+
+@pytest.fixture(scope="session")
+def app(stub):
+    return _app
+
+
+@pytest.fixture
+def client(app):
+    # Not entered as a context manager: the tests don't need the render pool started by lifespan
+    return TestClient(app)
+
+
+@pytest.fixture(params=["scoped_rpc", "fallback"])
+def db(request, stub):
+    """The stub with the SQL functions of sql/scoped_writes.sql installed, then without them"""
+    from app.services.repository import repository
+    stub.rpc.clear()
+    if request.param == "scoped_rpc":
+        install_scoped_rpc(stub)
+    repository.scoped_rpc = True
+    return stub
+
+
+@pytest.fixture
+def user(stub):
+    user_id = str(uuid.uuid4())
+    return {"id": user_id, "headers": {"Authorization": f"Bearer {mint_token(user_id)}"}}
+
+
+@pytest.fixture
+def make_section(stub, user):
+    """Insert a project owned by `user` with one section; returns the stub's section row"""
+
+    def make(project_type: str = "docx", **fields) -> dict:
+        project = stub.insert("projects", {"user_id": user["id"], "title": "Tests", "type": project_type,
+                                           "status": "draft"})
+        return stub.insert("sections", {
+            "project_id": project["id"], "title": "Intro", "content": "Original", "order_index": 0, "version": 1,
+            **fields
+        })
+    return make
+
+
+@pytest.fixture
+def history(stub):
+    """(version, prompt) of a section's history rows, oldest first"""
+
+    def rows(section_id: str) -> list:
+        entries = [row for row in stub.tables.get("section_history", []) if row["section_id"] == section_id]
+        return [(row["version"], row["prompt"]) for row in sorted(entries, key=lambda row: row["version"])]
+    return rows
+
+
+@pytest.fixture
+def provider(app):
+    from app.services.llm_service import llm_service
+    previous, llm_service.provider = llm_service._provider, FakeProvider()
+    yield llm_service.provider
+    llm_service.provider = previous
+
+
+@pytest.fixture
+def limits(app, monkeypatch):
+    """Fresh rate limiter state; tests set the limits they exercise"""
+    from app.services.rate_limit import MemoryRateLimitBackend, rate_limiter
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend())
+    monkeypatch.setattr(rate_limiter, "user_rate", 0)
+    monkeypatch.setattr(rate_limiter, "global_rate", 0)
+    monkeypatch.setattr(rate_limiter, "user_budget", (0, 0))
+    monkeypatch.setattr(rate_limiter, "global_budget", (0, 0))
+    return rate_limiter
@@ -0,0 +1,89 @@
+"""Bulk section create and reorder, and projects created from an outline"""
+import pytest
+
+from app.services.repository import repository
+from benchmarks.common import mint_token
+
+
+@pytest.fixture
+def project(stub, user):
+    project = stub.insert("projects", {"user_id": user["id"], "title": "Bulk", "type": "pptx", "status": "draft"})
+    project["sections"] = [
+        stub.insert("sections", {"project_id": project["id"], "title": title, "content": "", "order_index": index})
+        for index, title in enumerate(("A", "B", "C"))
+    ]
+    return project
+
+
+def test_bulk_create(client, stub, user, project):
+    response = client.post(f"/projects/{project['id']}/sections:bulk", headers=user["headers"], json={
+        "sections": [{"title": "D", "order_index": 3}, {"title": "E", "order_index": 4, "content": "Text"}]
+    })
+
+    assert response.status_code == 201
+    assert [(s["title"], s["order_index"], s["content"]) for s in response.json()] == [("D", 3, None), ("E", 4, "Text")]
+    assert len([s for s in stub.tables["sections"] if s["project_id"] == project["id"]]) == 5
+
+
+def test_bulk_create_in_someone_elses_project_is_404(client, stub, project):
+    headers = {"Authorization": f"Bearer {mint_token('00000000-0000-0000-0000-00000000beef')}"}
+
+    response = client.post(f"/projects/{project['id']}/sections:bulk", headers=headers,
+                           json={"sections": [{"title": "X", "order_index": 0}]})
+
+    assert response.status_code == 404
+
+
+def test_reorder_moves_listed_sections_first(client, user, project):
+    a, b, c = (s["id"] for s in project["sections"])
+
+    response = client.patch(f"/projects/{project['id']}/sections:reorder", headers=user["headers"],
+                            json={"section_ids": [c, a]})
+
+    assert response.status_code == 200
+    assert [s["id"] for s in response.json()] == [c, a, b]
+    assert [s["order_index"] for s in sorted(project["sections"], key=lambda s: s["title"])] == [1, 2, 0]
+
+
+@pytest.mark.parametrize("ids, detail", [
+    (lambda a, b, c: [a, a], "Duplicate section ids"),
+    (lambda a, b, c: [a, "00000000-0000-0000-0000-000000000000"], "Sections not in this project"),
+])
+def test_reorder_rejects_bad_lists(client, user, project, ids, detail):
+    response = client.patch(f"/projects/{project['id']}/sections:reorder", headers=user["headers"],
+                            json={"section_ids": ids(*(s["id"] for s in project["sections"]))})
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith(detail)
+
+
+def test_from_outline_creates_sections_in_order(client, db, user):
+    response = client.post("/projects/from-outline", headers=user["headers"],
+                           json={"title": "Deck", "type": "pptx", "outline": ["One", "Two", "Three"]})
+
+    assert response.status_code == 201
+    project = response.json()
+    assert [(s["title"], s["order_index"]) for s in project["sections"]] == [("One", 0), ("Two", 1), ("Three", 2)]
+    assert {s["project_id"] for s in project["sections"]} == {project["id"]}
+
+
+def test_from_outline_leaves_no_project_when_sections_fail(client, db, stub, user, monkeypatch):
+    stub.rpc.clear()  # two-step path; the SQL function writes both in one transaction
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("insert failed")
+    monkeypatch.setattr(repository, "create_sections", fail)
+
+    response = client.post("/projects/from-outline", headers=user["headers"],
+                           json={"title": "Orphan", "type": "pptx", "outline": ["One"]})
+
+    assert response.status_code == 500
+    assert not [p for p in stub.tables["projects"] if p["user_id"] == user["id"]]
+
+
+@pytest.mark.parametrize("num_sections", [0, 51])
+def test_from_outline_bounds_num_sections(client, user, num_sections):
+    response = client.post("/projects/from-outline", headers=user["headers"],
+                           json={"title": "Deck", "type": "pptx", "num_sections": num_sections})
+
+    assert response.status_code == 422
@@ -0,0 +1,85 @@
+"""Export ETags and the render cache"""
+import io
+import zipfile
+
+import pytest
+
+from app.services.render_pool import render_pool
+from benchmarks.common import mint_token
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Titles of the documents actually rendered (cache misses)"""
+    rendered = []
+    render = render_pool.render
+
+    async def counting(doc_type, title, sections, template=None):
+        rendered.append(title)
+        return await render(doc_type, title, sections, template)
+    monkeypatch.setattr(render_pool, "render", counting)
+    return rendered
+
+
+def export(client, user, section, etag=None):
+    headers = {**user["headers"], **({"If-None-Match": etag} if etag else {})}
+    return client.get(f"/export/{section['project_id']}", headers=headers)
+
+
+def test_unchanged_presentation_is_served_from_cache(client, user, make_section, renders):
+    section = make_section("pptx", content="- One\n- Two")
+
+    first = export(client, user, section)
+    second = export(client, user, section)
+
+    assert first.status_code == second.status_code == 200
+    assert zipfile.is_zipfile(io.BytesIO(first.content))
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert len(renders) == 1
+    # The versions query alone identifies the cached file
+    assert (first.headers["X-DB-Queries"], second.headers["X-DB-Queries"]) == ("2", "1")
+
+
+def test_matching_etag_returns_304(client, user, make_section, renders):
+    section = make_section("pptx", content="- One")
+    etag = export(client, user, section).headers["ETag"]
+
+    response = export(client, user, section, etag=etag)
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert len(renders) == 1
+
+
+def test_section_edit_changes_the_etag_and_rerenders(client, user, make_section, renders):
+    section = make_section("pptx", content="- One")
+    etag = export(client, user, section).headers["ETag"]
+
+    patched = client.patch(f"/projects/{section['project_id']}/sections/{section['id']}", headers=user["headers"],
+                           json={"content": "- Changed"})
+    response = export(client, user, section, etag=etag)
+
+    assert patched.status_code == 200
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(renders) == 2
+
+
+def test_streamed_document_has_etag_and_304(client, user, make_section):
+    section = make_section("docx", content="# Heading\n\nBody text.")
+
+    first = export(client, user, section)
+    again = export(client, user, section, etag=first.headers["ETag"])
+
+    assert first.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(first.content)) as document:
+        assert "Body text." in document.read("word/document.xml").decode()
+    assert again.status_code == 304
+
+
+def test_export_of_someone_elses_project_is_404(client, make_section):
+    section = make_section("pptx")
+    headers = {"Authorization": f"Bearer {mint_token('00000000-0000-0000-0000-00000000beef')}"}
+
+    assert client.get(f"/export/{section['project_id']}", headers=headers).status_code == 404
@@ -0,0 +1,79 @@
+"""Background export jobs and their on-disk artifacts"""
+import asyncio
+import io
+import os
+import zipfile
+
+import httpx
+
+from app.services.artifact_store import artifact_store
+from app.services.render_pool import render_pool
+from benchmarks.common import mint_token
+
+
+def run_export_jobs(app, user, project_id: str, count: int = 1) -> list:
+    """Start `count` export jobs one after another and wait for each; returns (job id, final response) pairs"""
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            finished = []
+            for _ in range(count):
+                started = await client.post(f"/export/{project_id}/jobs", headers=user["headers"])
+                assert started.status_code == 202
+                for _ in range(200):
+                    response = await client.get(f"/export/jobs/{started.json()['id']}", headers=user["headers"])
+                    if response.status_code != 202:
+                        break
+                    await asyncio.sleep(0.01)
+                finished.append((started.json()["id"], response))
+            return finished
+
+    return asyncio.run(run())
+
+
+def test_export_job_serves_the_rendered_file(app, user, make_section):
+    section = make_section("pptx", content="- One\n- Two")
+
+    (_, response), = run_export_jobs(app, user, section["project_id"])
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.openxmlformats-officedocument.presentationml")
+    assert response.headers["ETag"]
+    assert zipfile.is_zipfile(io.BytesIO(response.content))
+
+
+def test_unchanged_project_reuses_its_artifact(app, user, make_section, monkeypatch):
+    section = make_section("docx", content="Body")
+    rendered = []
+    render_to_file = render_pool.render_to_file
+
+    async def counting(doc_type, title, sections, path, template=None):
+        rendered.append(path)
+        return await render_to_file(doc_type, title, sections, path, template)
+    monkeypatch.setattr(render_pool, "render_to_file", counting)
+
+    (_, first), (_, second) = run_export_jobs(app, user, section["project_id"], count=2)
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.content == second.content
+    assert len(rendered) == 1
+
+
+def test_expired_artifact_is_410(app, client, user, make_section):
+    section = make_section("pptx", content="- One")
+    (job_id, response), = run_export_jobs(app, user, section["project_id"])
+    assert response.status_code == 200
+
+    # Pruned before the client came back for it
+    os.remove(artifact_store.local_path(response.headers["ETag"].strip('"') + ".pptx"))
+
+    assert client.get(f"/export/jobs/{job_id}", headers=user["headers"]).status_code == 410
+
+
+def test_jobs_of_other_users_are_404(client, user, make_section):
+    section = make_section("pptx")
+    started = client.post(f"/export/{section['project_id']}/jobs", headers=user["headers"]).json()
+    other = {"Authorization": f"Bearer {mint_token('00000000-0000-0000-0000-00000000beef')}"}
+
+    assert client.get(f"/export/jobs/{started['id']}", headers=other).status_code == 404
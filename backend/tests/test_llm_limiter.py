@@ -0,0 +1,79 @@
+"""Per-user caps of the model call scheduler"""
+import asyncio
+
+import pytest
+
+from app.routers.generate import BATCH_GENERATION_PARALLELISM, _generate_project_sections
+from app.services.job_service import Job
+from app.services.llm_limiter import BACKGROUND, OUTLINE, ConcurrencyLimiter, LLMCapacityError, llm_lane
+from app.services.llm_service import llm_service
+
+
+async def hold(limiter: ConcurrencyLimiter, lane: str, user_id: str, release: asyncio.Event):
+    with llm_lane(lane):
+        async with limiter.slot(user_id):
+            await release.wait()
+
+
+def test_interactive_and_outline_calls_share_the_per_user_cap():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=8, max_per_user=2, max_background_per_user=2)
+        release = asyncio.Event()
+        held = [asyncio.create_task(hold(limiter, lane, "u", release)) for lane in (OUTLINE, "interactive")]
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(LLMCapacityError) as refused:
+                async with limiter.slot("u"):
+                    pass
+            async with limiter.slot("someone-else"):
+                pass
+        finally:
+            release.set()
+            await asyncio.gather(*held)
+        return refused.value, limiter
+
+    refused, limiter = asyncio.run(run())
+
+    assert refused.status_code == 429
+    assert limiter.per_user == {}
+
+
+def test_background_calls_have_their_own_per_user_cap():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=8, max_per_user=1, max_background_per_user=2)
+        release = asyncio.Event()
+        held = [asyncio.create_task(hold(limiter, BACKGROUND, "u", release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        try:
+            # The user's job holds its whole allowance; an interactive call still goes through
+            async with limiter.slot("u"):
+                pass
+            with pytest.raises(LLMCapacityError):
+                with llm_lane(BACKGROUND):
+                    async with limiter.slot("u"):
+                        pass
+            active = limiter.stats()["active_users"]
+        finally:
+            release.set()
+            await asyncio.gather(*held)
+        return active
+
+    assert asyncio.run(run()) == 1
+
+
+def test_project_job_runs_its_chunks_concurrently(stub, user, provider):
+    provider.delay = 0.05
+    project = stub.insert("projects", {"user_id": user["id"], "title": "Fan out", "type": "docx", "status": "draft"})
+    sections = [
+        stub.insert("sections", {"project_id": project["id"], "title": f"Part {i}", "content": "",
+                                 "order_index": i, "version": 1})
+        for i in range(4)
+    ]
+    job = Job("generate_project", user["id"], total=len(sections))
+
+    result = asyncio.run(_generate_project_sections(job, llm_service, dict(project), [dict(s) for s in sections],
+                                                    user["id"], bypass_cache=True))
+
+    assert len(result["generated"]) == 4
+    # One model call per docx section, all in flight together
+    assert provider.peak == min(4, BATCH_GENERATION_PARALLELISM, llm_service.limiter.max_background_per_user)
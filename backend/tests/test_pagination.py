@@ -0,0 +1,103 @@
+"""Cursor pagination, field projection and ETags of the project and section listings"""
+import base64
+import json
+
+import pytest
+
+from app.services.pagination import decode_cursor, keyset_filter
+
+
+def pages(client, user, url: str, limit: int, **params) -> list:
+    """Every page of a listing, following X-Next-Cursor"""
+    result, cursor = [], None
+    while True:
+        response = client.get(url, headers=user["headers"],
+                              params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        result.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return result
+
+
+def cursor_of(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def projects(stub, user):
+    return [stub.insert("projects", {"user_id": user["id"], "title": f"P{i}", "type": "docx", "status": "draft"})
+            for i in range(5)]
+
+
+def test_projects_page_newest_first(client, user, projects):
+    result = pages(client, user, "/projects", limit=2)
+
+    assert [len(page) for page in result] == [2, 2, 1]
+    assert [p["title"] for page in result for p in page] == ["P4", "P3", "P2", "P1", "P0"]
+
+
+def test_sections_page_in_order(client, stub, user, make_section):
+    first = make_section()
+    for index in range(1, 5):
+        stub.insert("sections", {"project_id": first["project_id"], "title": f"S{index}", "content": "",
+                                 "order_index": index})
+
+    result = pages(client, user, f"/projects/{first['project_id']}/sections", limit=3)
+
+    assert [[s["order_index"] for s in page] for page in result] == [[0, 1, 2], [3, 4]]
+
+
+def test_fields_project_columns(client, user, projects):
+    response = client.get("/projects", headers=user["headers"], params={"fields": "id,title", "limit": 1})
+
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "title"}
+    assert response.headers["X-Next-Cursor"]
+
+
+def test_unknown_field_is_400(client, user):
+    response = client.get("/projects", headers=user["headers"], params={"fields": "id,context_digest"})
+
+    assert response.status_code == 400
+
+
+def test_etag_returns_304_until_something_changes(client, stub, user, projects):
+    etag = client.get("/projects", headers=user["headers"]).headers["ETag"]
+
+    assert client.get("/projects", headers={**user["headers"], "If-None-Match": etag}).status_code == 304
+    stub.insert("projects", {"user_id": user["id"], "title": "New", "type": "pptx", "status": "draft"})
+    assert client.get("/projects", headers={**user["headers"], "If-None-Match": etag}).status_code == 200
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    cursor_of(["2024-01-01T00:00:00+00:00"]),
+    cursor_of(['x",id.neq.0', "3f1c1e2a-1d2b-4c3d-8e9f-0a1b2c3d4e5f"]),
+    cursor_of(["2024-01-01T00:00:00+00:00", "not-a-uuid"]),
+])
+def test_malformed_project_cursor_is_400(client, user, cursor):
+    response = client.get("/projects", headers=user["headers"], params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("values", [["1", "3f1c1e2a-1d2b-4c3d-8e9f-0a1b2c3d4e5f"],
+                                    [True, "3f1c1e2a-1d2b-4c3d-8e9f-0a1b2c3d4e5f"]])
+def test_section_cursor_needs_an_integer_order_index(client, user, make_section, values):
+    section = make_section()
+
+    response = client.get(f"/projects/{section['project_id']}/sections", headers=user["headers"],
+                          params={"cursor": cursor_of(values)})
+
+    assert response.status_code == 400
+
+
+def test_keyset_filter_quotes_values():
+    values = decode_cursor(cursor_of([3, "3F1C1E2A-1D2B-4C3D-8E9F-0A1B2C3D4E5F"]), ("order_index", "id"))
+
+    assert keyset_filter(("order_index", "id"), values) == (
+        'order_index.gt."3",'
+        'and(order_index.eq."3",id.gt."3f1c1e2a-1d2b-4c3d-8e9f-0a1b2c3d4e5f")'
+    )
@@ -0,0 +1,73 @@
+"""Project context digests and their explicit caching by the Gemini provider"""
+import asyncio
+from collections import OrderedDict
+
+from app.services.llm_provider import LLM_CONTEXT_CACHE_MIN_TOKENS, GeminiProvider, LLMResponse, _tokens
+from app.services.project_context import PROJECT_CONTEXT_MAX_CHARS, render_digest, summarize
+
+
+class _Model:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type("Response", (), {"parts": [True], "text": "ok", "usage_metadata": None})()
+
+
+def gemini_without_client() -> GeminiProvider:
+    """A GeminiProvider with the SDK calls replaced, so no API key or network is needed"""
+    provider = GeminiProvider.__new__(GeminiProvider)
+    provider.model_name = "gemini-test"
+    provider.safety_settings = {}
+    provider.model = _Model()
+    provider._context_models = OrderedDict()
+    provider._context_pending = {}
+    provider.uploads = []
+    cached = _Model()
+
+    def create_context_model(context):
+        provider.uploads.append(context)
+        return cached
+    provider._create_context_model = create_context_model
+    provider.cached_model = cached
+    return provider
+
+
+def large_project_digest(count: int = 120) -> str:
+    project = {"title": "Handbook", "type": "docx"}
+    sections = [{"id": str(i), "title": f"Chapter {i}", "version": 1} for i in range(count)]
+    entries = {s["id"]: {"version": 1, "summary": summarize("Details of the chapter. " * 20)} for s in sections}
+    return render_digest(project, sections, entries)
+
+
+def test_digest_cap_can_reach_the_explicit_cache_threshold():
+    assert _tokens("x" * PROJECT_CONTEXT_MAX_CHARS) >= LLM_CONTEXT_CACHE_MIN_TOKENS
+
+
+def test_large_project_digest_is_cached_explicitly():
+    provider = gemini_without_client()
+    digest = large_project_digest()
+    assert len(digest) <= PROJECT_CONTEXT_MAX_CHARS
+    assert _tokens(digest) >= LLM_CONTEXT_CACHE_MIN_TOKENS
+
+    async def run():
+        return await asyncio.gather(*(provider.generate_with_context(digest, f"Write part {i}") for i in range(3)))
+
+    responses = asyncio.run(run())
+
+    assert responses == [LLMResponse("ok")] * 3
+    # Uploaded once; the prompts go to the cached model without the digest
+    assert provider.uploads == [digest]
+    assert provider.cached_model.prompts == ["Write part 0", "Write part 1", "Write part 2"]
+    assert provider.model.prompts == []
+
+
+def test_small_digest_is_sent_inline():
+    provider = gemini_without_client()
+    digest = large_project_digest(count=3)
+
+    asyncio.run(provider.generate_with_context(digest, "Write"))
+
+    assert provider.uploads == []
+    assert provider.model.prompts == [digest + "Write"]
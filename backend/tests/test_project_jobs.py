@@ -0,0 +1,90 @@
+"""Whole-project generation jobs"""
+import asyncio
+
+import httpx
+
+from app.routers.generate import _generate_project_sections
+from app.services.job_service import Job, JobManager
+from app.services.llm_service import llm_service
+
+
+def test_project_job_keeps_edit_made_while_it_runs(db, stub, user, provider, make_section, history):
+    first = make_section()
+    project = next(p for p in stub.tables["projects"] if p["id"] == first["project_id"])
+    second = stub.insert("sections", {
+        "project_id": project["id"], "title": "Body", "content": "", "order_index": 1, "version": 1
+    })
+    loaded = [dict(first), dict(second)]
+
+    def edit_first(prompt):
+        # The user saves the section after the job loaded it, before the job writes it
+        if first["version"] == 1:
+            first.update(content="Manual edit", version=2)
+            stub.insert("section_history", {"section_id": first["id"], "version": 2, "kind": "snapshot",
+                                            "prompt": "Edit", "content": "Manual edit", "delta": None})
+
+    provider.on_generate = edit_first
+    job = Job("generate_project", user["id"], total=2)
+
+    result = asyncio.run(_generate_project_sections(job, llm_service, dict(project), loaded, user["id"],
+                                                    bypass_cache=True))
+
+    assert result == {"generated": [first["id"], second["id"]], "failed": []}
+    assert (job.completed, job.failed) == (2, 0)
+    assert first["content"] == provider.text and first["version"] == 3
+    assert history(first["id"]) == [(2, "Edit"), (3, "Initial Generation")]
+    assert history(second["id"]) == [(2, "Initial Generation")]
+
+
+def test_project_job_reports_sections_deleted_while_it_runs(db, stub, user, provider, make_section):
+    section = make_section()
+    project = next(p for p in stub.tables["projects"] if p["id"] == section["project_id"])
+    provider.on_generate = lambda prompt: stub.tables["sections"].remove(section)
+    job = Job("generate_project", user["id"], total=1)
+
+    result = asyncio.run(_generate_project_sections(job, llm_service, dict(project), [dict(section)], user["id"],
+                                                    bypass_cache=True))
+
+    assert result == {"generated": [], "failed": [section["id"]]}
+    assert job.failed == 1
+    assert job.errors[section["id"]] == "Section was deleted"
+
+
+def test_project_job_over_the_api(app, user, provider, make_section):
+    section = make_section(content="")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = await client.post(f"/generate/project/{section['project_id']}", headers=user["headers"],
+                                        json={"bypass_cache": True})
+            assert started.status_code == 202
+            for _ in range(100):
+                job = (await client.get(f"/generate/jobs/{started.json()['id']}", headers=user["headers"])).json()
+                if job["status"] not in ("pending", "running"):
+                    return job
+                await asyncio.sleep(0.01)
+
+    job = asyncio.run(run())
+
+    assert job["status"] == "completed"
+    assert (job["completed"], job["failed"]) == (1, 0)
+    assert section["content"] == provider.text
+
+
+def test_cancelled_job_ends_failed():
+    manager = JobManager()
+
+    async def run():
+        job = manager.create("generate_project", "user", total=1)
+        manager.start(job, lambda job: asyncio.sleep(30))
+        await asyncio.sleep(0)
+        for task in list(manager._tasks):
+            task.cancel()
+        await asyncio.gather(*manager._tasks, return_exceptions=True)
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == "failed"
+    assert job.error == "Job was cancelled"
+    assert job.finished_at is not None
@@ -0,0 +1,106 @@
+"""Request buckets and daily token budgets on the routes that call the model"""
+import asyncio
+
+import pytest
+
+from app.services.rate_limit import _today
+from benchmarks.common import mint_token
+
+
+@pytest.fixture
+def section(make_section):
+    return make_section(content="")
+
+
+def generate(client, user, section):
+    return client.post(f"/generate/section/{section['id']}", headers=user["headers"],
+                       json={"section_id": section["id"], "bypass_cache": True})
+
+
+def test_burst_then_429_with_retry_after(client, user, section, provider, limits):
+    limits.user_rate, limits.user_burst = 1 / 60, 2
+
+    first, second, third = (generate(client, user, section) for _ in range(3))
+
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert (first.headers["X-RateLimit-Remaining"], second.headers["X-RateLimit-Remaining"]) == ("1", "0")
+    assert third.status_code == 429
+    assert 1 <= int(third.headers["Retry-After"]) <= 60
+    assert len(provider.prompts) == 2
+
+
+def test_limits_are_per_user(client, user, section, provider, limits, stub):
+    limits.user_rate, limits.user_burst = 1 / 60, 1
+    other = {**user, "id": "00000000-0000-0000-0000-0000000000aa"}
+    other["headers"] = {"Authorization": f"Bearer {mint_token(other['id'])}"}
+    other_project = stub.insert("projects", {"user_id": other["id"], "title": "Other", "type": "docx"})
+    other_section = stub.insert("sections", {"project_id": other_project["id"], "title": "Intro", "content": "",
+                                             "order_index": 0})
+
+    assert generate(client, user, section).status_code == 200
+    assert generate(client, user, section).status_code == 429
+    assert generate(client, other, other_section).status_code == 200
+
+
+def test_model_tokens_count_against_the_daily_budget(client, user, section, provider, limits):
+    limits.user_budget = (15, 0)
+
+    first = generate(client, user, section)
+    second = generate(client, user, section)
+    refused = generate(client, user, section)
+
+    assert first.headers["X-Token-Budget-Prompt-Remaining"] == "15"
+    assert second.headers["X-Token-Budget-Prompt-Remaining"] == "5"
+    assert refused.status_code == 429
+    assert refused.json()["detail"] == "Daily AI usage limit reached"
+    assert int(refused.headers["Retry-After"]) > 0
+    assert asyncio.run(limits.backend.usage(f"user:{user['id']}", _today())) == (20, 10)
+
+
+def test_outline_generation_in_from_outline_is_limited(client, user, provider, limits):
+    limits.user_rate, limits.user_burst = 1 / 60, 1
+    provider.text = "Intro\nBody\nConclusion"
+    body = {"title": "Deck", "type": "pptx", "topic": "Testing", "num_sections": 3}
+
+    created = client.post("/projects/from-outline", headers=user["headers"], json=body)
+    refused = client.post("/projects/from-outline", headers=user["headers"], json=body)
+
+    assert created.status_code == 201
+    assert [s["title"] for s in created.json()["sections"]] == ["Intro", "Body", "Conclusion"]
+    assert refused.status_code == 429
+    assert "Retry-After" in refused.headers
+    assert asyncio.run(limits.backend.usage(f"user:{user['id']}", _today())) == (10, 5)
+
+
+def test_explicit_outline_is_not_limited(client, user, provider, limits):
+    limits.user_rate, limits.user_burst = 1 / 60, 1
+    body = {"title": "Deck", "type": "pptx", "outline": ["One", "Two"]}
+
+    responses = [client.post("/projects/from-outline", headers=user["headers"], json=body) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert provider.prompts == []
+
+
+def test_refused_requests_get_their_quota_back(client, user, section, provider, limits):
+    limits.user_rate, limits.user_burst = 1 / 60, 1
+    missing = "00000000-0000-0000-0000-000000000000"
+
+    for _ in range(3):
+        response = client.post(f"/generate/section/{missing}", headers=user["headers"],
+                               json={"section_id": missing, "bypass_cache": True})
+        assert response.status_code == 404
+
+    assert generate(client, user, section).status_code == 200
+    assert generate(client, user, section).status_code == 429
+
+
+def test_someone_elses_section_does_not_spend_quota(client, user, section, provider, limits):
+    limits.user_rate, limits.user_burst = 1 / 60, 1
+    other = {"Authorization": f"Bearer {mint_token('00000000-0000-0000-0000-00000000beef')}"}
+
+    assert client.post(f"/generate/section/{section['id']}", headers=other,
+                       json={"section_id": section["id"], "bypass_cache": True}).status_code == 404
+    assert client.post(f"/generate/section/{section['id']}", headers=other,
+                       json={"section_id": section["id"], "bypass_cache": True}).status_code == 404
+    assert provider.prompts == []
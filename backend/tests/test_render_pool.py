@@ -0,0 +1,57 @@
+"""The export render pool: a stuck or crashed render doesn't take other renders down"""
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.render_pool import RenderPool
+
+
+def sleep_render(doc_type: str, title: str, sections: list, seconds: float) -> bytes:
+    time.sleep(seconds)
+    return title.encode()
+
+
+def crash_render(doc_type: str, title: str, sections: list) -> bytes:
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = RenderPool(workers=2, timeout=2.0, max_queue=8)
+    yield pool
+    pool.shutdown()
+
+
+def test_timeout_leaves_other_renders_running(pool):
+    async def run():
+        pool.warm_up()
+        stuck = asyncio.ensure_future(pool._submit(sleep_render, "docx", "stuck", [], 30))
+        # Still running on the old pool when the stuck render times out at 2 s
+        await asyncio.sleep(1.5)
+        other = asyncio.ensure_future(pool._submit(sleep_render, "docx", "other", [], 1.0))
+        results = await asyncio.gather(stuck, other, return_exceptions=True)
+        after = await pool._submit(sleep_render, "docx", "after", [], 0)
+        return results, after
+
+    (stuck, other), after = asyncio.run(run())
+
+    assert isinstance(stuck, HTTPException) and stuck.status_code == 504
+    assert other == b"other"
+    assert after == b"after"
+    assert not pool._retired and not pool._in_flight
+
+
+def test_crashed_worker_returns_503_and_pool_recovers(pool):
+    async def run():
+        with pytest.raises(HTTPException) as failed:
+            await pool._submit(crash_render, "docx", "crash", [])
+        return failed.value, await pool._submit(sleep_render, "docx", "after", [], 0)
+
+    failed, after = asyncio.run(run())
+
+    assert failed.status_code == 503
+    assert failed.headers["Retry-After"]
+    assert after == b"after"
@@ -0,0 +1,68 @@
+"""Optimistic version checks on section writes"""
+import asyncio
+
+from app.services.repository import repository
+
+
+def test_save_bumps_version_and_records_history(db, make_section, history):
+    section = make_section()
+
+    saved = asyncio.run(repository.save_section_content(dict(section), "First draft", "Generate"))
+
+    assert saved["version"] == 2
+    assert section["content"] == "First draft"
+    assert history(section["id"]) == [(2, "Generate")]
+
+
+def test_stale_save_is_rejected(db, make_section, history):
+    section = make_section()
+    stale = dict(section)
+    asyncio.run(repository.save_section_content(dict(section), "Manual edit", "Edit"))
+
+    assert asyncio.run(repository.save_section_content(stale, "Generated", "Generate")) is None
+    assert section["content"] == "Manual edit"
+    assert section["version"] == 2
+    assert history(section["id"]) == [(2, "Edit")]
+
+
+def test_stale_save_with_rebase_writes_on_top(db, make_section, history):
+    section = make_section()
+    stale = dict(section)
+    asyncio.run(repository.save_section_content(dict(section), "Manual edit", "Edit"))
+
+    saved = asyncio.run(repository.save_section_content(stale, "Generated", "Generate", rebase=True))
+
+    assert saved["version"] == 3
+    assert section["content"] == "Generated"
+    assert history(section["id"]) == [(2, "Edit"), (3, "Generate")]
+
+
+def test_rebase_of_deleted_section_returns_none(db, make_section):
+    section = make_section()
+    stale = dict(section)
+    db.tables["sections"].remove(section)
+
+    assert asyncio.run(repository.save_section_content(stale, "Generated", "Generate", rebase=True)) is None
+
+
+def test_stale_base_version_returns_409(client, db, user, make_section):
+    section = make_section()
+    asyncio.run(repository.save_section_content(dict(section), "Theirs", "Edit"))
+
+    response = client.patch(f"/projects/{section['project_id']}/sections/{section['id']}",
+                            headers=user["headers"], json={"content": "Mine", "base_version": 1})
+
+    assert response.status_code == 409
+    assert section["content"] == "Theirs"
+
+
+def test_delta_save_applies_to_base_version(client, db, user, make_section, history):
+    section = make_section()
+
+    response = client.patch(f"/projects/{section['project_id']}/sections/{section['id']}",
+                            headers=user["headers"], json={"delta": [[0, 8, "Updated"]], "base_version": 1})
+
+    assert response.status_code == 200
+    assert section["content"] == "Updated"
+    assert section["version"] == 2
+    assert len(history(section["id"])) == 1
@@ -0,0 +1,134 @@
+"""Refining part of a section: span resolution, splicing and the refine endpoint"""
+import asyncio
+
+import pytest
+
+from app.services.repository import repository
+from app.services.section_spans import SpanError, paragraph_ranges, resolve_span, splice
+
+CONTENT = "# Title\n\nFirst paragraph.\n\n- Point one\n- Point two\n"
+
+
+def test_paragraphs_are_non_blank_lines():
+    assert [CONTENT[start:end] for start, end in paragraph_ranges(CONTENT)] == [
+        "# Title", "First paragraph.", "- Point one", "- Point two"
+    ]
+
+
+def test_paragraph_span_covers_first_to_last_index():
+    span = resolve_span(CONTENT, paragraphs=[3, 2])
+
+    assert span.text == "- Point one\n- Point two"
+    assert span.before == "# Title\n\nFirst paragraph.\n\n"
+    assert span.after == "\n"
+
+
+def test_context_is_whole_lines_within_the_limit():
+    span = resolve_span(CONTENT, paragraphs=[1], context_chars=5)
+
+    assert span.text == "First paragraph."
+    assert span.before == "\n"
+    assert span.after == "\n"
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"char_range": (0, 3), "paragraphs": [0]},
+    {"paragraphs": [4]},
+    {"paragraphs": [-1]},
+    {"char_range": (5, 5)},
+    {"char_range": (0, len(CONTENT) + 1)},
+    {"char_range": (7, 9)},  # only blank lines
+])
+def test_invalid_spans_are_rejected(kwargs):
+    with pytest.raises(SpanError):
+        resolve_span(CONTENT, **kwargs)
+
+
+def test_splice_keeps_surrounding_text_and_strips_echoed_context():
+    span = resolve_span(CONTENT, paragraphs=[1])
+
+    text, delta = splice(CONTENT, span, "# Title\n\nBetter paragraph.\n\n- Point one\n- Point two")
+
+    assert text == CONTENT.replace("First paragraph.", "Better paragraph.")
+    assert delta == [[span.start, span.end, "Better paragraph."]]
+
+
+def test_splice_rejects_empty_rewrite():
+    with pytest.raises(SpanError):
+        splice(CONTENT, resolve_span(CONTENT, paragraphs=[1]), "   ")
+
+
+def _refine(client, user, section, **body):
+    return client.post(f"/generate/refine/{section['id']}", headers=user["headers"],
+                       json={"section_id": section["id"], "refinement_prompt": "Tighten", **body})
+
+
+def test_paragraph_refine_rewrites_only_that_paragraph(client, db, user, make_section, provider, history):
+    section = make_section(content=CONTENT)
+    provider.text = "Better paragraph."
+
+    response = _refine(client, user, section, paragraphs=[1], base_version=1)
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert section["content"] == CONTENT.replace("First paragraph.", "Better paragraph.")
+    assert history(section["id"]) == [(2, "Tighten")]
+    # Only the passage and its context were sent
+    assert "Passage:\nFirst paragraph." in provider.prompts[-1]
+
+
+def test_char_range_refine(client, db, user, make_section, provider):
+    section = make_section(content=CONTENT)
+    start = CONTENT.index("Point two")
+    provider.text = "Point 2"
+
+    response = _refine(client, user, section, span=[start, start + len("Point two")])
+
+    assert response.status_code == 200
+    assert section["content"] == CONTENT.replace("Point two", "Point 2")
+
+
+def test_stale_base_version_returns_409(client, db, user, make_section, provider):
+    section = make_section(content=CONTENT)
+    asyncio.run(repository.save_section_content(dict(section), CONTENT + "More\n", "Edit"))
+
+    response = _refine(client, user, section, paragraphs=[1], base_version=1)
+
+    assert response.status_code == 409
+    assert provider.prompts == []
+    assert section["content"] == CONTENT + "More\n"
+
+
+def test_section_changed_during_refine_returns_409(client, db, user, make_section, provider):
+    section = make_section(content=CONTENT)
+
+    def edit_meanwhile(prompt):
+        section["content"], section["version"] = "Rewritten elsewhere", 2
+    provider.on_generate = edit_meanwhile
+    provider.text = "Better paragraph."
+
+    response = _refine(client, user, section, paragraphs=[1])
+
+    assert response.status_code == 409
+    assert section["content"] == "Rewritten elsewhere"
+
+
+def test_out_of_range_paragraph_returns_400(client, db, user, make_section, provider):
+    section = make_section(content=CONTENT)
+
+    response = _refine(client, user, section, paragraphs=[9])
+
+    assert response.status_code == 400
+    assert "out of range" in response.json()["detail"]
+    assert provider.prompts == []
+
+
+def test_empty_rewrite_returns_502_and_saves_nothing(client, db, user, make_section, provider):
+    section = make_section(content=CONTENT)
+    provider.text = "   "
+
+    response = _refine(client, user, section, paragraphs=[1])
+
+    assert response.status_code == 502
+    assert section["content"] == CONTENT and section["version"] == 1